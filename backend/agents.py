@@ -1,161 +1,211 @@
 import asyncio
-import re
 import random
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
 import logging
+import os
 from scapy.all import sniff, IP, TCP, UDP, Raw, get_if_list
 import json
 
+from anomaly import AnomalyAgent
+from reputation import ReputationAgent, ReputationDB
+from packets import PacketRecord, as_record
+from rules import Rule, RuleSet, truncated_finding
+
 logger = logging.getLogger(__name__)
 
+# Agents sleep for a random interval to mimic model inference time on the
+# dashboard. Sharded workers and offline tools turn this off.
+SIMULATE_LATENCY = os.getenv("NETSENTINEL_SIMULATE_LATENCY", "1") != "0"
+
+async def simulated_delay(low: float, high: float):
+    """Sleep for a random interval when simulated latency is enabled"""
+    if SIMULATE_LATENCY:
+        await asyncio.sleep(random.uniform(low, high))
+
+# Confidence added to a signature match at anomaly score 1.0
+ANOMALY_CONFIDENCE_BOOST = 10
+# Confidence added to other findings when the source is on a blocklist
+REPUTATION_CONFIDENCE_BOOST = 15
+
+def match_packet(rules: RuleSet, agent: str, packet: PacketRecord) -> Tuple[Optional[Rule], Optional[str], int]:
+    """`first_match` on the payload, or the stream scan result when the body was scanned at capture"""
+    if packet.body_scan is None:
+        return rules.first_match(packet.payload)
+    scan = packet.body_scan.get(agent)
+    if scan is None:
+        # Capture skipped the body scan: only the head kept in `payload` is checked, the rest counts as truncated
+        rule, matched, truncated = rules.first_match(packet.payload)
+        return rule, matched, truncated if rule else len(rules.rules)
+    index, matched, truncated = scan
+    return (rules.rules[index] if index is not None else None), matched, truncated
+
 class XSSAgent:
     """Agent specialized in detecting Cross-Site Scripting attacks"""
     
-    XSS_PATTERNS = [
-        r'<script[^>]*>.*?</script>',
-        r'javascript:',
-        r'on\w+\s*=',
-        r'<iframe[^>]*>',
-        r'<img[^>]*onerror\s*=',
-        r'alert\s*\(',
-        r'document\.cookie',
-        r'eval\s*\(',
-        r'<svg[^>]*onload\s*=',
-        r'<body[^>]*onload\s*='
-    ]
+    # Rule names are the original expressions; stages are their linear-time rewrites (see rules.Rule)
+    XSS_RULES = RuleSet([
+        Rule(r'<script[^>]*>.*?</script>', [r'<script', r'>', r'</script>'], barriers=['>', '\n']),
+        Rule(r'javascript:', [r'javascript:']),
+        Rule(r'on\w+\s*=', [r'on(?=\w)', r'='], barriers=[r'[^\w\s]|(?<!\s)\s+\w']),
+        Rule(r'<iframe[^>]*>', [r'<iframe', r'>']),
+        Rule(r'<img[^>]*onerror\s*=', [r'<img', r'onerror(?=[\s=])', r'='], barriers=['>', r'\S']),
+        Rule(r'alert\s*\(', [r'alert(?=[\s(])', r'\('], barriers=[r'\S']),
+        Rule(r'document\.cookie', [r'document\.cookie']),
+        Rule(r'eval\s*\(', [r'eval(?=[\s(])', r'\('], barriers=[r'\S']),
+        Rule(r'<svg[^>]*onload\s*=', [r'<svg', r'onload(?=[\s=])', r'='], barriers=['>', r'\S']),
+        Rule(r'<body[^>]*onload\s*=', [r'<body', r'onload(?=[\s=])', r'='], barriers=['>', r'\S'])
+    ])
     
-    async def analyze(self, packet_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def analyze(self, packet: PacketRecord) -> Dict[str, Any]:
         """Analyze packet for XSS patterns"""
-        await asyncio.sleep(random.uniform(0.1, 0.3))
+        await simulated_delay(0.1, 0.3)
         
-        payload = packet_data.get("payload", "")
+        payload = packet.payload
         threat_detected = False
         confidence = 0
         finding = "No XSS patterns detected"
         
+        truncated = 0
         if payload:
-            for pattern in self.XSS_PATTERNS:
-                if re.search(pattern, payload, re.IGNORECASE):
-                    threat_detected = True
-                    confidence = random.uniform(75, 95)
-                    finding = f"XSS pattern detected: {pattern[:30]}..."
-                    break
+            rule, _, truncated = match_packet(self.XSS_RULES, "XSS", packet)
+            if rule:
+                threat_detected = True
+                confidence = random.uniform(75, 95)
+                finding = f"XSS pattern detected: {rule.name[:30]}..."
+            elif truncated:
+                finding = truncated_finding(truncated)
         
         return {
             "agent": "XSS",
             "threat_detected": threat_detected,
             "confidence": confidence,
             "finding": finding,
-            "timestamp": datetime.now().isoformat()
+            "scan_truncated": truncated
         }
 
 class SQLInjectionAgent:
     """Agent specialized in detecting SQL Injection attacks"""
     
-    SQL_PATTERNS = [
-        r"('\s*OR\s*'1'\s*=\s*'1)",
-        r"('\s*OR\s*1\s*=\s*1)",
-        r"(;\s*DROP\s+TABLE)",
-        r"(;\s*DELETE\s+FROM)",
-        r"(UNION\s+SELECT)",
-        r"(SELECT\s+.*\s+FROM\s+.*\s+WHERE)",
-        r"('\s*;\s*--)",
-        r"(1\s*=\s*1\s*--)",
-        r"(admin'\s*--)",
-        r"('\s*OR\s*'a'\s*=\s*'a)",
-        r"(EXEC\s+\w+)",
-        r"(EXECUTE\s+IMMEDIATE)",
-        r"(SELECT\s+COUNT\(\*\))",
-        r"(WAITFOR\s+DELAY)",
-        r"(BENCHMARK\s*\()",
-        r"(SLEEP\s*\()"
-    ]
+    SQL_RULES = RuleSet([
+        Rule(r"('\s*OR\s*'1'\s*=\s*'1)", [r"'(?=[\sO])", r"OR(?=[\s'])", r"'1'(?=[\s=])", r"=(?=[\s'])", r"'1"], barriers=[r"\S"] * 4),
+        Rule(r"('\s*OR\s*1\s*=\s*1)", [r"'(?=[\sO])", r"OR(?=[\s1])", r"1(?=[\s=])", r"=(?=[\s1])", r"1"], barriers=[r"\S"] * 4),
+        Rule(r"(;\s*DROP\s+TABLE)", [r";(?=[\sD])", r"DROP\s(?=[\sT])", r"TABLE"], barriers=[r"\S"] * 2),
+        Rule(r"(;\s*DELETE\s+FROM)", [r";(?=[\sD])", r"DELETE\s(?=[\sF])", r"FROM"], barriers=[r"\S"] * 2),
+        Rule(r"(UNION\s+SELECT)", [r"UNION\s(?=[\sS])", r"SELECT"], barriers=[r"\S"]),
+        Rule(r"(SELECT\s+.*\s+FROM\s+.*\s+WHERE)", [r"SELECT\s", r"\s+FROM\s", r"\s+WHERE"], barriers=["\n", "\n"],
+             lead=r"\s*"),
+        Rule(r"('\s*;\s*--)", [r"'(?=[\s;])", r";(?=[\s-])", r"--"], barriers=[r"\S"] * 2),
+        Rule(r"(1\s*=\s*1\s*--)", [r"1(?=[\s=])", r"=(?=[\s1])", r"1(?=[\s-])", r"--"], barriers=[r"\S"] * 3),
+        Rule(r"(admin'\s*--)", [r"admin'(?=[\s-])", r"--"], barriers=[r"\S"]),
+        Rule(r"('\s*OR\s*'a'\s*=\s*'a)", [r"'(?=[\sO])", r"OR(?=[\s'])", r"'a'(?=[\s=])", r"=(?=[\s'])", r"'a"], barriers=[r"\S"] * 4),
+        Rule(r"(EXEC\s+\w+)", [r"EXEC\s(?=[\s\w])", r"\w"], barriers=[r"\S"]),
+        Rule(r"(EXECUTE\s+IMMEDIATE)", [r"EXECUTE\s(?=[\sI])", r"IMMEDIATE"], barriers=[r"\S"]),
+        Rule(r"(SELECT\s+COUNT\(\*\))", [r"SELECT\s(?=[\sC])", r"COUNT\(\*\)"], barriers=[r"\S"]),
+        Rule(r"(WAITFOR\s+DELAY)", [r"WAITFOR\s(?=[\sD])", r"DELAY"], barriers=[r"\S"]),
+        Rule(r"(BENCHMARK\s*\()", [r"BENCHMARK(?=[\s(])", r"\("], barriers=[r"\S"]),
+        Rule(r"(SLEEP\s*\()", [r"SLEEP(?=[\s(])", r"\("], barriers=[r"\S"])
+    ])
     
-    async def analyze(self, packet_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def analyze(self, packet: PacketRecord) -> Dict[str, Any]:
         """Analyze packet for SQL Injection patterns"""
-        await asyncio.sleep(random.uniform(0.1, 0.3))
+        await simulated_delay(0.1, 0.3)
         
-        payload = packet_data.get("payload", "")
+        payload = packet.payload
         threat_detected = False
         confidence = 0
         finding = "No SQL injection patterns detected"
         
+        truncated = 0
         if payload:
-            for pattern in self.SQL_PATTERNS:
-                match = re.search(pattern, payload, re.IGNORECASE)
-                if match:
-                    threat_detected = True
-                    confidence = random.uniform(80, 98)
-                    finding = f"SQL injection detected: {match.group()[:50]}..."
-                    break
+            rule, matched, truncated = match_packet(self.SQL_RULES, "SQLInjection", packet)
+            if rule:
+                threat_detected = True
+                confidence = random.uniform(80, 98)
+                finding = f"SQL injection detected: {matched[:50]}..."
+            elif truncated:
+                finding = truncated_finding(truncated)
         
         return {
             "agent": "SQLInjection",
             "threat_detected": threat_detected,
             "confidence": confidence,
             "finding": finding,
-            "timestamp": datetime.now().isoformat()
+            "scan_truncated": truncated
         }
 
 class PayloadAgent:
     """Agent specialized in deep packet payload analysis"""
     
-    MALICIOUS_PATTERNS = [
-        r'\.\./',
-        r'/etc/passwd',
-        r'/etc/shadow',
-        r'cmd\.exe',
-        r'powershell',
-        r'nc\s+-e',
-        r'bash\s+-i',
-        r'/bin/sh',
-        r'wget\s+http',
-        r'curl\s+http.*\|\s*sh',
-        r'base64\s+-d',
-        r'python\s+-c',
-        r'<%\s*eval',
-        r'system\s*\(',
-        r'exec\s*\('
-    ]
+    MALICIOUS_RULES = RuleSet([
+        Rule(r'\.\./', [r'\.\./']),
+        Rule(r'/etc/passwd', [r'/etc/passwd']),
+        Rule(r'/etc/shadow', [r'/etc/shadow']),
+        Rule(r'cmd\.exe', [r'cmd\.exe']),
+        Rule(r'powershell', [r'powershell']),
+        Rule(r'nc\s+-e', [r'nc\s(?=[\s-])', r'-e'], barriers=[r'\S']),
+        Rule(r'bash\s+-i', [r'bash\s(?=[\s-])', r'-i'], barriers=[r'\S']),
+        Rule(r'/bin/sh', [r'/bin/sh']),
+        Rule(r'wget\s+http', [r'wget\s(?=[\sh])', r'http'], barriers=[r'\S']),
+        Rule(r'curl\s+http.*\|\s*sh', [r'curl\s(?=[\sh])', r'http', r'\|(?=[\ss])', r'sh'], barriers=[r'\S', '\n', r'\S']),
+        Rule(r'base64\s+-d', [r'base64\s(?=[\s-])', r'-d'], barriers=[r'\S']),
+        Rule(r'python\s+-c', [r'python\s(?=[\s-])', r'-c'], barriers=[r'\S']),
+        Rule(r'<%\s*eval', [r'<%(?=[\se])', r'eval'], barriers=[r'\S']),
+        Rule(r'system\s*\(', [r'system(?=[\s(])', r'\('], barriers=[r'\S']),
+        Rule(r'exec\s*\(', [r'exec(?=[\s(])', r'\('], barriers=[r'\S'])
+    ])
     
-    async def analyze(self, packet_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def analyze(self, packet: PacketRecord) -> Dict[str, Any]:
         """Perform deep packet inspection"""
-        await asyncio.sleep(random.uniform(0.2, 0.4))
+        await simulated_delay(0.2, 0.4)
         
-        payload = packet_data.get("payload", "")
+        payload = packet.payload
         threat_detected = False
         confidence = 0
         finding = "Payload analysis complete - no threats"
+        truncated = 0
         
         if payload:
-            if len(payload) > 1000:
+            # Streamed bodies were too large to keep, so `payload` holds only their head
+            if len(payload) > 1000 or packet.body_scan is not None:
                 confidence = random.uniform(30, 50)
                 finding = "Unusually large payload detected"
             
-            for pattern in self.MALICIOUS_PATTERNS:
-                if re.search(pattern, payload, re.IGNORECASE):
-                    threat_detected = True
-                    confidence = random.uniform(70, 90)
-                    finding = f"Suspicious payload pattern: {pattern}"
-                    break
+            rule, _, truncated = match_packet(self.MALICIOUS_RULES, "Payload", packet)
+            if rule:
+                threat_detected = True
+                confidence = random.uniform(70, 90)
+                finding = f"Suspicious payload pattern: {rule.name}"
+            elif truncated:
+                finding = truncated_finding(truncated)
         
         return {
             "agent": "Payload",
             "threat_detected": threat_detected,
             "confidence": confidence,
             "finding": finding,
-            "timestamp": datetime.now().isoformat()
+            "scan_truncated": truncated
         }
 
+# Rule sets by agent name, for profiling
+RULE_SETS = {
+    "XSS": XSSAgent.XSS_RULES,
+    "SQLInjection": SQLInjectionAgent.SQL_RULES,
+    "Payload": PayloadAgent.MALICIOUS_RULES
+}
+
 class ThreatSynthesizer:
     """Synthesizes findings from multiple agents into unified threat assessment"""
     
     async def synthesize(self, agent_results: List[Dict[str, Any]]) -> Dict[str, Any]:
         """Combine agent findings into final threat determination"""
-        await asyncio.sleep(random.uniform(0.05, 0.1))
+        await simulated_delay(0.05, 0.1)
         
         threats = [r for r in agent_results if r["threat_detected"]]
+        anomaly_score = max((r.get("anomaly_score", 0) for r in agent_results), default=0)
+        listing = next((r["listing"] for r in agent_results if r.get("listing")), None)
+        # Rules a budget cut short: reported alongside the verdict, never counted towards it
+        scan_truncated = sum(r.get("scan_truncated", 0) for r in agent_results)
         
         if not threats:
             return {
@@ -164,10 +214,19 @@ class ThreatSynthesizer:
                 "confidence": 0,
                 "threat_type": "none",
                 "description": "No threats detected",
-                "remediation": "Continue monitoring"
+                "remediation": "Continue monitoring",
+                "anomaly_score": anomaly_score,
+                "reputation": None,
+                "scan_truncated": scan_truncated
             }
         
         max_confidence = max(t["confidence"] for t in threats)
+        # Unusual traffic corroborates a signature match
+        if len(threats) > 1 or threats[0]["agent"] != "Anomaly":
+            max_confidence = min(99, max_confidence + ANOMALY_CONFIDENCE_BOOST * anomaly_score)
+        # A listed source corroborates whatever else was found
+        if listing and len(threats) > 1:
+            max_confidence = min(99, max_confidence + REPUTATION_CONFIDENCE_BOOST)
         threat_types = [t["agent"] for t in threats]
         
         severity = "low"
@@ -183,7 +242,9 @@ class ThreatSynthesizer:
         remediation_steps = {
             "XSS": "Enable XSS protection headers, validate and sanitize all user inputs",
             "SQLInjection": "Use parameterized queries, implement input validation",
-            "Payload": "Implement deep packet inspection, update firewall rules"
+            "Payload": "Implement deep packet inspection, update firewall rules",
+            "Anomaly": "Rate-limit the source and review traffic against the port/path baseline",
+            "Reputation": "Block the listed source range at the perimeter"
         }
         
         remediation = " | ".join([remediation_steps.get(t, "") for t in threat_types if t in remediation_steps])
@@ -195,7 +256,57 @@ class ThreatSynthesizer:
             "threat_type": threat_type,
             "description": f"Multiple agents detected threats: {', '.join([t['finding'] for t in threats])}",
             "remediation": remediation,
-            "agent_count": len(threats)
+            "agent_count": len(threats),
+            "anomaly_score": anomaly_score,
+            "reputation": listing,
+            "scan_truncated": scan_truncated
+        }
+
+class ThreatAnalyzer:
+    """Runs the specialist agents over a packet and synthesizes a verdict"""
+    
+    def __init__(self, reputation: Optional[ReputationDB] = None):
+        self.xss_agent = XSSAgent()
+        self.sql_agent = SQLInjectionAgent()
+        self.payload_agent = PayloadAgent()
+        self.anomaly_agent = AnomalyAgent()
+        self.reputation_agent = ReputationAgent(reputation)
+        self.synthesizer = ThreatSynthesizer()
+    
+    async def analyze(self, packet: PacketRecord) -> Dict[str, Any]:
+        """Return the per-agent results and the synthesized threat for a packet"""
+        packet = as_record(packet)
+        reputation = self.reputation_agent.check(packet)
+        listing = reputation["listing"]
+        if listing and listing["fast_track"]:
+            # Known-bad sources skip the payload scan entirely
+            results = [self._skipped(agent) for agent in ("XSS", "SQLInjection", "Payload", "Anomaly")]
+            results.append(reputation)
+        else:
+            results = list(await asyncio.gather(
+                self.xss_agent.analyze(packet),
+                self.sql_agent.analyze(packet),
+                self.payload_agent.analyze(packet),
+                self.anomaly_agent.analyze(packet)
+            ))
+            results.append(reputation)
+        # One timestamp per verdict instead of one per agent
+        timestamp = datetime.now().isoformat()
+        for result in results:
+            result["timestamp"] = timestamp
+        synthesis = await self.synthesizer.synthesize(results)
+        return {
+            "results": results,
+            "synthesis": synthesis
+        }
+    
+    def _skipped(self, agent: str) -> Dict[str, Any]:
+        return {
+            "agent": agent,
+            "threat_detected": False,
+            "confidence": 0,
+            "finding": "Skipped: source is on a fast-track blocklist",
+            "skipped": True
         }
 
 class PacketCapture:
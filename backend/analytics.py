@@ -0,0 +1,167 @@
+import ipaddress
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+import numpy as np
+
+from packets import PacketRecord, ipv4_int
+
+# Protocols get a small integer code; anything unlisted is OTHER
+PROTOCOLS = ["OTHER", "TCP", "UDP", "HTTP", "HTTPS", "ICMP", "SMB", "RDP", "DNS"]
+# Lookups take the packet's protocol as-is, so both spellings are keys
+PROTOCOL_CODES = {spelling: code for code, name in enumerate(PROTOCOLS) for spelling in (name, name.lower())}
+
+# Packet size histogram edges in bytes
+SIZE_BUCKETS = np.array([0, 64, 128, 256, 512, 1024, 1500, 4096, 16384, 65536, 1 << 20, 1 << 32], dtype=np.float64)
+
+# Largest values the dst_port and size columns hold
+MAX_PORT = np.iinfo(np.uint16).max
+MAX_SIZE = np.iinfo(np.uint32).max
+
+def int_to_ip(value: int) -> str:
+    return str(ipaddress.IPv4Address(int(value))) if value else "unknown"
+
+class PacketWindow:
+    """Fixed-capacity columnar ring of recent packets for vectorized aggregation"""
+
+    def __init__(self, capacity: int = 1_000_000, flush_size: int = 1024):
+        self.capacity = capacity
+        self.flush_size = flush_size
+        self.timestamp = np.zeros(capacity, dtype=np.float64)
+        self.src_ip = np.zeros(capacity, dtype=np.uint32)
+        self.dst_ip = np.zeros(capacity, dtype=np.uint32)
+        self.dst_port = np.zeros(capacity, dtype=np.uint16)
+        self.protocol = np.zeros(capacity, dtype=np.uint8)
+        self.size = np.zeros(capacity, dtype=np.uint32)
+        self.threat = np.zeros(capacity, dtype=np.bool_)
+        self.head = 0
+        self.count = 0
+        self._pending: Deque[tuple] = deque()
+        self._lock = threading.Lock()
+
+    def append(self, packet: PacketRecord, is_threat: bool = False, now: Optional[float] = None):
+        # Values the columns can't hold are stored as unknown (port 0) or clamped, never left to fail a whole flush
+        port = packet.dst_port or 0
+        size = packet.size or 0
+        self._pending.append((
+            now if now is not None else time.time(),
+            ipv4_int(packet.src_ip),
+            ipv4_int(packet.dst_ip),
+            port if 0 <= port <= MAX_PORT else 0,
+            PROTOCOL_CODES.get(packet.protocol, 0),
+            min(max(size, 0), MAX_SIZE),
+            is_threat
+        ))
+        # Never wait on a running query from the pipeline; the next append retries
+        if len(self._pending) >= self.flush_size and self._lock.acquire(blocking=False):
+            try:
+                self._flush_locked()
+            finally:
+                self._lock.release()
+
+    def flush(self):
+        """Copy pending packets into the ring columns"""
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        popleft = self._pending.popleft
+        pending = [popleft() for _ in range(len(self._pending))]
+        if not pending:
+            return
+        if len(pending) > self.capacity:
+            pending = pending[-self.capacity:]
+
+        columns = list(zip(*pending))
+        n = len(pending)
+        first = min(n, self.capacity - self.head)
+        for target, values, dtype in (
+            (self.timestamp, columns[0], np.float64),
+            (self.src_ip, columns[1], np.uint32),
+            (self.dst_ip, columns[2], np.uint32),
+            (self.dst_port, columns[3], np.uint16),
+            (self.protocol, columns[4], np.uint8),
+            (self.size, columns[5], np.uint32),
+            (self.threat, columns[6], np.bool_),
+        ):
+            array = np.asarray(values, dtype=dtype)
+            target[self.head:self.head + first] = array[:first]
+            target[:n - first] = array[first:]
+
+        self.head = (self.head + n) % self.capacity
+        self.count = min(self.capacity, self.count + n)
+
+    def _mask(self, window_seconds: float, now: Optional[float] = None) -> np.ndarray:
+        now = now if now is not None else time.time()
+        valid = self.timestamp[:self.count] if self.count < self.capacity else self.timestamp
+        return valid >= now - window_seconds
+
+    def _column(self, column: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        return column[:len(mask)][mask]
+
+    def bytes_by_protocol(self, mask: np.ndarray) -> Dict[str, Dict[str, int]]:
+        protocols = self._column(self.protocol, mask)
+        sizes = self._column(self.size, mask)
+        packets = np.bincount(protocols, minlength=len(PROTOCOLS))
+        total_bytes = np.bincount(protocols, weights=sizes, minlength=len(PROTOCOLS))
+        return {
+            PROTOCOLS[code]: {"packets": int(packets[code]), "bytes": int(total_bytes[code])}
+            for code in np.nonzero(packets)[0]
+        }
+
+    def port_histogram(self, mask: np.ndarray, top: int) -> List[Dict[str, int]]:
+        counts = np.bincount(self._column(self.dst_port, mask), minlength=65536)
+        ports = np.argpartition(counts, -top)[-top:]
+        ports = ports[np.argsort(counts[ports])[::-1]]
+        return [{"port": int(port), "packets": int(counts[port])} for port in ports if counts[port]]
+
+    def size_distribution(self, mask: np.ndarray) -> List[Dict[str, Any]]:
+        counts, edges = np.histogram(self._column(self.size, mask), bins=SIZE_BUCKETS)
+        return [
+            {"min": int(edges[i]), "max": int(edges[i + 1]), "packets": int(counts[i])}
+            for i in range(len(counts))
+        ]
+
+    def top_sources(self, mask: np.ndarray, top: int) -> List[Dict[str, Any]]:
+        sources = self._column(self.src_ip, mask)
+        threats = self._column(self.threat, mask)
+        if not len(sources):
+            return []
+        # Sorting is the expensive step, so only the threat subset gets a second pass
+        ips, counts = np.unique(sources, return_counts=True)
+        top = min(top, len(ips))
+        order = np.argpartition(counts, -top)[-top:]
+        order = order[np.argsort(counts[order])[::-1]]
+        threat_ips, threat_counts = np.unique(sources[threats], return_counts=True)
+        positions = np.searchsorted(threat_ips, ips[order])
+        result = []
+        for i, position in zip(order, positions):
+            hit = position < len(threat_ips) and threat_ips[position] == ips[i]
+            result.append({
+                "source_ip": int_to_ip(ips[i]),
+                "packets": int(counts[i]),
+                "threats": int(threat_counts[position]) if hit else 0
+            })
+        return result
+
+    def summary(self, window_seconds: float = 300, top: int = 10, now: Optional[float] = None) -> Dict[str, Any]:
+        """All dashboard aggregates over the last `window_seconds`"""
+        started = time.perf_counter()
+        with self._lock:
+            self._flush_locked()
+            mask = self._mask(window_seconds, now)
+            sizes = self._column(self.size, mask)
+            result = {
+                "window_seconds": window_seconds,
+                "packets": int(mask.sum()),
+                "bytes": int(sizes.sum(dtype=np.uint64)),
+                "threats": int(self._column(self.threat, mask).sum()),
+                "protocols": self.bytes_by_protocol(mask),
+                "top_ports": self.port_histogram(mask, top),
+                "packet_sizes": self.size_distribution(mask),
+                "top_sources": self.top_sources(mask, top)
+            }
+        result["query_ms"] = (time.perf_counter() - started) * 1000
+        return result
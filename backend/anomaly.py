@@ -0,0 +1,192 @@
+import asyncio
+import logging
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from packets import NS_PER_SECOND, PacketRecord
+
+logger = logging.getLogger(__name__)
+
+FEATURES = ("size", "rate", "inter_arrival")
+FEATURE_LABELS = ("Packet size", "Request rate", "Inter-arrival time")
+# Which tail of each feature is suspicious: 0 both, 1 only high values, -1 only low values
+FEATURE_TAILS = np.array([0, 1, -1])
+# Variance floors so a perfectly steady baseline doesn't turn jitter into huge z-scores
+VARIANCE_FLOOR = np.array([32.0 ** 2, 0.5 ** 2, 0.001 ** 2])
+# Standard deviation is never assumed smaller than this fraction of the mean
+RELATIVE_FLOOR = 0.1
+
+EWMA_ALPHA = 0.05
+# Samples a baseline needs before it is allowed to flag anything
+WARMUP_SAMPLES = 20
+# Gaps shorter than this are treated as simultaneous arrivals
+MIN_INTERVAL = 0.001
+# Score = 1 - exp(-z / Z_SCALE), so a 4 sigma outlier scores ~0.63
+Z_SCALE = 4.0
+ANOMALY_THRESHOLD = 0.75
+# An anomaly on its own is at most a medium-severity finding
+MAX_CONFIDENCE = 70.0
+# Distinct (port, path) baselines; beyond this, new paths share one baseline per port
+MAX_KEYS = 65536
+# Packets scored together at most, so one huge burst can't stall the event loop
+MAX_BATCH = 512
+
+class AnomalyBaselines:
+    """EWMA mean/variance of size, rate and inter-arrival time per destination port and path"""
+
+    def __init__(self, capacity: int = 1024, alpha: float = EWMA_ALPHA, max_keys: int = MAX_KEYS):
+        self.alpha = alpha
+        self.max_keys = max_keys
+        self.keys: Dict[Tuple[int, Any], int] = {}
+        self.mean = np.zeros((capacity, len(FEATURES)))
+        self.var = np.zeros((capacity, len(FEATURES)))
+        self.seen = np.zeros((capacity, len(FEATURES)), dtype=np.int64)
+        self.last_seen = np.full(capacity, np.nan)
+
+    def _grow(self):
+        capacity = len(self.mean) * 2
+        pad = capacity - len(self.mean)
+        self.mean = np.vstack([self.mean, np.zeros((pad, len(FEATURES)))])
+        self.var = np.vstack([self.var, np.zeros((pad, len(FEATURES)))])
+        self.seen = np.vstack([self.seen, np.zeros((pad, len(FEATURES)), dtype=np.int64)])
+        self.last_seen = np.concatenate([self.last_seen, np.full(pad, np.nan)])
+
+    def slot(self, packet: PacketRecord) -> int:
+        key = (packet.dst_port or 0, packet.path or "")
+        slot = self.keys.get(key)
+        if slot is not None:
+            return slot
+        if len(self.keys) >= self.max_keys:
+            key = (key[0], None)
+            slot = self.keys.get(key)
+            if slot is not None:
+                return slot
+        slot = len(self.keys)
+        if slot >= len(self.mean):
+            self._grow()
+        self.keys[key] = slot
+        return slot
+
+    def score(self, packets: List[PacketRecord]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return (slots, per-feature z-scores, anomaly scores) for a batch and update the baselines"""
+        n = len(packets)
+        slots = np.fromiter((self.slot(p) for p in packets), dtype=np.intp, count=n)
+        sizes = np.fromiter((p.size or 0 for p in packets), dtype=np.float64, count=n)
+        times = np.fromiter((p.timestamp_ns for p in packets), dtype=np.float64, count=n) / NS_PER_SECOND
+
+        # Inter-arrival: order by key then time and diff each packet against the one before it
+        # on the same key; the first of each key diffs against that key's last batch
+        order = np.lexsort((times, slots))
+        sorted_slots, sorted_times = slots[order], times[order]
+        first = np.ones(n, dtype=np.bool_)
+        first[1:] = sorted_slots[1:] != sorted_slots[:-1]
+        previous = np.empty(n)
+        previous[1:] = sorted_times[:-1]
+        previous[first] = self.last_seen[sorted_slots[first]]
+        intervals = np.empty(n)
+        with np.errstate(invalid="ignore"):
+            intervals[order] = np.maximum(sorted_times - previous, MIN_INTERVAL)
+        last = np.ones(n, dtype=np.bool_)
+        last[:-1] = first[1:]
+        self.last_seen[sorted_slots[last]] = sorted_times[last]
+
+        values = np.column_stack([sizes, 1.0 / intervals, intervals])
+        valid = ~np.isnan(values)
+
+        mean, var = self.mean[slots], self.var[slots]
+        floor = np.maximum(VARIANCE_FLOOR, (RELATIVE_FLOOR * mean) ** 2)
+        with np.errstate(invalid="ignore"):
+            z = (values - mean) / np.sqrt(np.maximum(var, floor))
+            z = np.where(FEATURE_TAILS == 0, np.abs(z), np.maximum(z * FEATURE_TAILS, 0))
+        z[~valid | (self.seen[slots] < WARMUP_SAMPLES)] = 0
+
+        self._update(slots, values, valid)
+        scores = 1 - np.exp(-z.max(axis=1) / Z_SCALE)
+        return slots, z, scores
+
+    def _update(self, slots: np.ndarray, values: np.ndarray, valid: np.ndarray):
+        """Fold a batch into the baselines: n samples on a key move its EWMA as n single steps would"""
+        keys = len(self.keys)
+        for feature in range(len(FEATURES)):
+            mask = valid[:, feature]
+            feature_slots = slots[mask]
+            x = values[mask, feature]
+            counts = np.bincount(feature_slots, minlength=keys)
+            touched = np.nonzero(counts)[0]
+            if not len(touched):
+                continue
+            count = counts[touched]
+            batch_mean = np.bincount(feature_slots, weights=x, minlength=keys)[touched] / count
+            deviation = np.bincount(feature_slots, weights=(x - self.mean[feature_slots, feature]) ** 2,
+                                    minlength=keys)[touched] / count
+
+            # Plain running average until the EWMA weight takes over, so early baselines aren't biased to 0
+            seen = self.seen[touched, feature]
+            weight = np.maximum(1 - (1 - self.alpha) ** count, count / (seen + count))
+            current = self.mean[touched, feature]
+            self.mean[touched, feature] = current + weight * (batch_mean - current)
+            self.var[touched, feature] = (1 - weight) * (self.var[touched, feature] + weight * deviation)
+            self.seen[touched, feature] = seen + count
+
+class AnomalyAgent:
+    """Agent specialized in volumetric and behavioral outliers against per-port/path baselines"""
+
+    def __init__(self):
+        self.baselines = AnomalyBaselines()
+        self._pending: List[Tuple[PacketRecord, asyncio.Future]] = []
+
+    async def analyze(self, packet: PacketRecord) -> Dict[str, Any]:
+        """Queue the packet for the next vectorized batch and wait for its result"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((packet, future))
+        # Everything queued in this loop iteration is scored together
+        if len(self._pending) == 1:
+            loop.call_soon(self._score_pending)
+        elif len(self._pending) >= MAX_BATCH:
+            self._score_pending()
+        return await future
+
+    def _score_pending(self):
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        try:
+            results = self.score_batch([packet for packet, _ in pending])
+        except Exception as e:
+            logger.error(f"Error scoring anomaly batch: {e}")
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(pending, results):
+            if not future.done():
+                future.set_result(result)
+
+    def score_batch(self, packets: List[PacketRecord]) -> List[Dict[str, Any]]:
+        """Score packets in one pass and return an agent result for each"""
+        slots, z, scores = self.baselines.score(packets)
+        features = z.argmax(axis=1)
+        peaks = z.max(axis=1)
+        seen = self.baselines.seen[slots, 0]
+
+        results = []
+        for i, packet in enumerate(packets):
+            score = float(scores[i])
+            threat_detected = score >= ANOMALY_THRESHOLD
+            if threat_detected:
+                finding = (f"{FEATURE_LABELS[features[i]]} outlier on port {packet.dst_port} "
+                           f"{packet.path or ''} (z={peaks[i]:.1f})")
+            elif seen[i] <= WARMUP_SAMPLES:
+                finding = "Learning traffic baseline"
+            else:
+                finding = "Traffic within baseline"
+            results.append({
+                "agent": "Anomaly",
+                "threat_detected": threat_detected,
+                "confidence": score * MAX_CONFIDENCE if threat_detected else 0,
+                "anomaly_score": round(score, 3),
+                "finding": finding
+            })
+        return results
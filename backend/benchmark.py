@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""Offline performance benchmarks for the detection agents, pipeline and websocket fan-out"""
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import random
+import string
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+import agents
+from agents import (
+    XSSAgent,
+    SQLInjectionAgent,
+    PayloadAgent,
+    ThreatAnalyzer,
+    PacketCapture
+)
+from anomaly import AnomalyAgent
+from packets import PacketRecord, encode_ip
+from traffic_simulator import TrafficSimulator
+from websocket_server import WebSocketServer
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_CLIENT_COUNTS = [1, 10, 100, 1000]
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an unsorted list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+def _from_simulator(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a TrafficSimulator record to the backend packet shape"""
+    payload = record.get("payload") or f"{record.get('method', 'GET')} {record.get('path', '/')}"
+    return {
+        "src_ip": record["source_ip"],
+        "dst_ip": record["dest_ip"],
+        "src_port": record["source_port"],
+        "dst_port": record["dest_port"],
+        "protocol": record["protocol"],
+        "payload": payload,
+        "size": len(payload)
+    }
+
+def _from_ws_server(message: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a WebSocketServer message to the backend packet shape"""
+    data = message["data"]
+    return {
+        "src_ip": data["source"],
+        "dst_ip": data["destination"],
+        "src_port": random.randint(1024, 65535),
+        "dst_port": data["port"],
+        "protocol": data["protocol"],
+        "payload": data["payload"],
+        "size": len(data["payload"])
+    }
+
+def _large_payload(size: int, attack: str = "") -> str:
+    """Benign-looking form data of roughly `size` bytes, optionally ending in an attack"""
+    filler = "".join(random.choices(string.ascii_letters + string.digits + "&= ", k=size))
+    return filler + attack
+
+def build_corpus(size: int, large_payloads: int = 20) -> List[Tuple[Dict[str, Any], bool]]:
+    """Labeled (packet, is_malicious) corpus drawn from every traffic generator in the repo"""
+    capture = PacketCapture()
+    simulator = TrafficSimulator()
+    ws_server = WebSocketServer()
+
+    generators = [
+        lambda: ({"src_ip": capture._random_ip(), "dst_ip": "10.0.0.5", "protocol": "HTTP",
+                  "payload": capture._generate_normal_payload()}, False),
+        lambda: ({"src_ip": capture._random_ip(), "dst_ip": "10.0.0.5", "protocol": "HTTP",
+                  "payload": capture._generate_malicious_payload()}, True),
+        lambda: (_from_simulator(simulator.generate_normal_traffic()), False),
+        lambda: (_from_simulator(simulator.generate_sql_injection_attack()), True),
+        lambda: (_from_simulator(simulator.generate_xss_attack()), True),
+        lambda: (_from_simulator(simulator.generate_malware_payload()), True),
+        lambda: (_from_ws_server(ws_server.generate_normal_traffic()), False),
+        lambda: (_from_ws_server(ws_server.generate_sql_injection()), True),
+        lambda: (_from_ws_server(ws_server.generate_xss_attack()), True),
+    ]
+
+    corpus = [random.choice(generators)() for _ in range(size)]
+
+    for i in range(large_payloads):
+        attack = random.choice(["", "<script>alert(1)</script>", "'; DROP TABLE users; --"]) if i % 2 else ""
+        payload = _large_payload(random.choice([64 * 1024, 256 * 1024, 1024 * 1024]), attack)
+        corpus.append(({"src_ip": capture._random_ip(), "dst_ip": "10.0.0.5", "protocol": "HTTP",
+                        "payload": payload, "size": len(payload)}, bool(attack)))
+
+    for i, (packet, _) in enumerate(corpus):
+        packet["id"] = f"bench_{i}"
+        packet.setdefault("size", len(packet["payload"]))
+        packet.setdefault("timestamp", datetime.now().isoformat())
+    return corpus
+
+async def bench_agents(corpus: List[Tuple[Dict[str, Any], bool]]) -> Dict[str, Any]:
+    """Scan throughput and detection counts for each agent and for the combined analyzer"""
+    results = {}
+    total_bytes = sum(len(packet["payload"]) for packet, _ in corpus)
+    analyzer = ThreatAnalyzer()
+    corpus = [(PacketRecord.from_dict(packet), malicious) for packet, malicious in corpus]
+
+    candidates = {
+        "xss": XSSAgent().analyze,
+        "sql_injection": SQLInjectionAgent().analyze,
+        "payload": PayloadAgent().analyze,
+        "anomaly": AnomalyAgent().analyze,
+    }
+
+    for name, analyze in candidates.items():
+        counts = {"true_positive": 0, "false_positive": 0, "false_negative": 0}
+        start = time.perf_counter()
+        for packet, malicious in corpus:
+            detected = (await analyze(packet))["threat_detected"]
+            if detected and malicious:
+                counts["true_positive"] += 1
+            elif detected:
+                counts["false_positive"] += 1
+            elif malicious:
+                counts["false_negative"] += 1
+        elapsed = time.perf_counter() - start
+        results[name] = {
+            "packets_per_sec": len(corpus) / elapsed,
+            "mb_per_sec": total_bytes / elapsed / 1e6,
+            **counts
+        }
+
+    counts = {"true_positive": 0, "false_positive": 0, "false_negative": 0}
+    start = time.perf_counter()
+    for packet, malicious in corpus:
+        detected = (await analyzer.analyze(packet))["synthesis"]["is_threat"]
+        if detected and malicious:
+            counts["true_positive"] += 1
+        elif detected:
+            counts["false_positive"] += 1
+        elif malicious:
+            counts["false_negative"] += 1
+    elapsed = time.perf_counter() - start
+    results["combined"] = {
+        "packets_per_sec": len(corpus) / elapsed,
+        "mb_per_sec": total_bytes / elapsed / 1e6,
+        **counts
+    }
+    return results
+
+class FakeWebSocket:
+    """Stands in for a starlette WebSocket; counts what send_json/send_text would put on the wire and records arrivals"""
+
+    def __init__(self, record_completions: bool = False):
+        self.bytes_sent = 0
+        self.messages = 0
+        self.record_completions = record_completions
+        self.completed: Dict[str, float] = {}
+
+    async def send_json(self, message: Dict[str, Any]):
+        await self.send_text(json.dumps(message))
+
+    async def send_text(self, text: str):
+        self.bytes_sent += len(text)
+        self.messages += 1
+        if self.record_completions and '"type": "agent_analysis_complete"' in text:
+            message = json.loads(text)
+            self.completed[message["data"]["packet_id"]] = time.perf_counter()
+
+async def bench_pipeline(corpus: List[Tuple[Dict[str, Any], bool]], timeout: float = 300) -> Dict[str, Any]:
+    """End-to-end packets/s and queue-to-verdict latency through threat_processor"""
+    import main
+
+    main.PROCESSOR_PACING = 0
+    client = FakeWebSocket(record_completions=True)
+    main.manager.active_connections = [client]
+
+    enqueued = {}
+    processor = asyncio.create_task(main.threat_processor())
+    start = time.perf_counter()
+    for packet, _ in corpus:
+        packet = PacketRecord.from_dict(packet)
+        enqueued[packet.id] = time.perf_counter()
+        main.manager.packet_queue.put_nowait(packet)
+
+    deadline = start + timeout
+    while len(client.completed) < len(corpus) and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    processor.cancel()
+    main.manager.active_connections = []
+
+    latencies_ms = [(client.completed[pid] - enqueued[pid]) * 1000 for pid in client.completed]
+    return {
+        "packets": len(client.completed),
+        "packets_per_sec": len(client.completed) / elapsed,
+        "latency_p50_ms": percentile(latencies_ms, 50),
+        "latency_p99_ms": percentile(latencies_ms, 99),
+        "broadcast_bytes": client.bytes_sent
+    }
+
+async def bench_broadcast(iterations: int = 200) -> Dict[str, Any]:
+    """Cost of ConnectionManager.broadcast as the number of dashboards grows"""
+    from main import ConnectionManager
+
+    message = {
+        "type": "packet_log",
+        "data": {
+            "id": "pkt_bench",
+            "timestamp": datetime.now().isoformat(),
+            "source_ip": "45.142.114.231",
+            "dest_ip": "10.0.0.5",
+            "protocol": "HTTP",
+            "size": 120,
+            "payload": "username=admin' OR '1'='1' --&password=x",
+            "threat": True
+        }
+    }
+
+    results = {}
+    for client_count in BROADCAST_CLIENT_COUNTS:
+        manager = ConnectionManager()
+        manager.active_connections = [FakeWebSocket() for _ in range(client_count)]
+        rounds = max(5, min(iterations, iterations * 10 // client_count))
+        start = time.perf_counter()
+        for _ in range(rounds):
+            await manager.broadcast(message)
+        elapsed = time.perf_counter() - start
+        results[str(client_count)] = {
+            "broadcast_us": elapsed / rounds * 1e6,
+            "per_client_us": elapsed / rounds / client_count * 1e6
+        }
+    return results
+
+def _build_dict_packet(packet: Dict[str, Any], src_ip: str) -> Dict[str, Any]:
+    """A packet the way the capture path built them before PacketRecord"""
+    return {
+        "id": packet["id"],
+        "src_ip": src_ip,
+        "dst_ip": "10.0.0.5",
+        "src_port": 51234,
+        "dst_port": 8080,
+        "protocol": "HTTP",
+        "method": "POST",
+        "path": "/login",
+        "payload": packet["payload"],
+        "size": len(packet["payload"]),
+        "timestamp": datetime.now().isoformat()
+    }
+
+def _build_record_packet(packet: Dict[str, Any], src_ip: str) -> PacketRecord:
+    return PacketRecord(
+        id=packet["id"],
+        src_ip=encode_ip(src_ip),
+        dst_ip=encode_ip("10.0.0.5"),
+        src_port=51234,
+        dst_port=8080,
+        protocol="HTTP",
+        method="POST",
+        path="/login",
+        payload=packet["payload"]
+    )
+
+def bench_records(corpus: List[Tuple[Dict[str, Any], bool]]) -> Dict[str, Any]:
+    """Build cost and retained memory per packet for the dict shape versus PacketRecord"""
+    packets = [packet for packet, _ in corpus]
+    sources = [packet["src_ip"].encode() for packet in packets]
+    results = {}
+    for name, build in (("dict", _build_dict_packet), ("record", _build_record_packet)):
+        start = time.perf_counter()
+        for packet, source in zip(packets, sources):
+            build(packet, source.decode())
+        elapsed = time.perf_counter() - start
+
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        built = [build(packet, source.decode()) for packet, source in zip(packets, sources)]
+        retained = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        del built
+
+        results[name] = {
+            "build_us": elapsed / len(packets) * 1e6,
+            "retained_bytes": retained / len(packets)
+        }
+    return results
+
+def _flatten(results: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Print metric changes against a baseline and return the names of regressions"""
+    current = _flatten(results["results"])
+    previous = _flatten(baseline["results"])
+    regressions = []
+
+    for name in sorted(current):
+        if name not in previous or not previous[name]:
+            continue
+        if name.endswith(("_per_sec", "_ms", "_us", "_bytes")):
+            change = (current[name] - previous[name]) / previous[name]
+            higher_is_better = name.endswith("_per_sec")
+            worse = -change if higher_is_better else change
+            flag = "REGRESSION" if worse > threshold else ""
+            if flag:
+                regressions.append(name)
+            print(f"{name:50s} {previous[name]:14.2f} -> {current[name]:14.2f} ({change:+.1%}) {flag}")
+    return regressions
+
+async def run(args) -> Dict[str, Any]:
+    random.seed(args.seed)
+    agents.SIMULATE_LATENCY = False
+    corpus = build_corpus(args.corpus_size, args.large_payloads)
+
+    results = {}
+    if "agents" in args.suites:
+        results["agents"] = await bench_agents(corpus)
+    if "pipeline" in args.suites:
+        results["pipeline"] = await bench_pipeline(corpus)
+    if "broadcast" in args.suites:
+        results["broadcast"] = await bench_broadcast()
+    if "records" in args.suites:
+        results["records"] = bench_records(corpus)
+
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "corpus_size": len(corpus),
+        "seed": args.seed,
+        "results": results
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="NetSentinel offline benchmarks")
+    parser.add_argument("--suites", nargs="+", default=["agents", "pipeline", "broadcast", "records"],
+                        choices=["agents", "pipeline", "broadcast", "records"])
+    parser.add_argument("--corpus-size", type=int, default=2000)
+    parser.add_argument("--large-payloads", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1337)
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--baseline", help="Compare against a previous JSON result")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative change counted as a regression (default 10%%)")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    report = asyncio.run(run(args))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions and args.fail_on_regression:
+            print(f"{len(regressions)} metric(s) regressed beyond {args.threshold:.0%}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,101 @@
-from sqlalchemy import create_engine, MetaData
+from sqlalchemy import create_engine, MetaData, inspect, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from collections import deque
+import logging
 import os
+import time
+
+logger = logging.getLogger(__name__)
 
 DATABASE_URL = "sqlite+aiosqlite:///./netsentinel.db"
 SYNC_DATABASE_URL = "sqlite:///./netsentinel.db"
 
-engine = create_async_engine(DATABASE_URL, echo=False)
-sync_engine = create_engine(SYNC_DATABASE_URL, echo=False)
+# Applied to every new SQLite connection. WAL lets API reads run alongside the
+# pipeline's batch writers; mmap and a larger page cache keep hot indexes in memory.
+SQLITE_PRAGMAS = {
+    # Only takes effect on a new database, where it must come before anything else; retention then frees pages
+    "auto_vacuum": "INCREMENTAL",
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "cache_size": -64000,
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
+
+# Queries slower than this are logged and kept in QueryTimer.slow_queries
+SLOW_QUERY_SECONDS = 0.1
+
+# aiosqlite defaults to NullPool, which opens a connection (and re-runs the pragmas) per checkout
+engine = create_async_engine(
+    DATABASE_URL,
+    echo=False,
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=8,
+    max_overflow=8,
+    pool_timeout=10
+)
+sync_engine = create_engine(SYNC_DATABASE_URL, echo=False, pool_size=4, max_overflow=4)
+
+def _apply_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name} = {value}")
+    cursor.close()
+
+class QueryTimer:
+    """Times every statement on the engines it is attached to"""
+    
+    def __init__(self, slow_threshold: float = SLOW_QUERY_SECONDS):
+        self.slow_threshold = slow_threshold
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.slow_count = 0
+        self.slow_queries = deque(maxlen=20)
+    
+    def attach(self, sync_engine_):
+        event.listen(sync_engine_, "before_cursor_execute", self._before)
+        event.listen(sync_engine_, "after_cursor_execute", self._after)
+        event.listen(sync_engine_, "handle_error", self._error)
+    
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+    
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        self.count += 1
+        self.total_seconds += elapsed
+        self.max_seconds = max(self.max_seconds, elapsed)
+        if elapsed >= self.slow_threshold:
+            self.slow_count += 1
+            self.slow_queries.append({"statement": statement[:200], "seconds": elapsed})
+            logger.warning(f"Slow query ({elapsed * 1000:.0f} ms): {statement[:200]}")
+    
+    def _error(self, context):
+        # A failed statement never reaches _after; drop its start time so later timings stay paired
+        if context.connection is not None and context.statement is not None:
+            starts = context.connection.info.get("query_start")
+            if starts:
+                starts.pop()
+    
+    def snapshot(self):
+        return {
+            "queries": self.count,
+            "total_seconds": self.total_seconds,
+            "avg_ms": self.total_seconds / self.count * 1000 if self.count else 0.0,
+            "max_ms": self.max_seconds * 1000,
+            "slow_queries": self.slow_count,
+            "recent_slow": list(self.slow_queries)
+        }
+
+query_timer = QueryTimer()
+for _engine in (engine.sync_engine, sync_engine):
+    event.listen(_engine, "connect", _apply_pragmas)
+    query_timer.attach(_engine)
 
 AsyncSessionLocal = sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
@@ -19,9 +106,24 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=sync_engine)
 Base = declarative_base()
 metadata = MetaData()
 
+def _upgrade_schema(conn):
+    """Add columns and indexes introduced after a table was first created"""
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=conn.dialect)
+                conn.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}')
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
 async def init_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_upgrade_schema)
 
 def get_db():
     db = SessionLocal()
@@ -4,42 +4,236 @@ from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 import asyncio
 import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Optional
+from typing import Any, Dict, List, Optional, Set
 import sqlite3
 import hashlib
 import random
 import httpx
+from urllib.parse import unquote_plus, unquote_to_bytes
+
+from packets import PacketRecord, encode_ip
+from enforcement import BlockTable, BlockMiddleware
+from logins import LoginMonitor
+from health import PROBE_USER_AGENT
+from agents import RULE_SETS
+from rules import STREAM_MAX_BYTES
 
 logger = logging.getLogger(__name__)
 
 # Global variable to hold manager reference
 manager = None
+# Sources denied at the door; fed by backend verdicts
+block_table = BlockTable()
+login_monitor = LoginMonitor()
 
-async def notify_backend(packet_data: dict, threat_type: Optional[str] = None):
-    """Send packet data to the main backend for processing"""
-    global manager
-    if manager:
-        # Put packet in the queue for processing
-        await manager.packet_queue.put(packet_data)
-        manager.stats["packets_analyzed"] += 1
+# Most of a request body the capture middleware keeps for analysis
+MAX_CAPTURED_BODY = 64 * 1024
+# Bodies scanned at once; one arriving while every slot is busy is left unscanned instead of waiting
+MAX_CONCURRENT_BODY_SCANS = 2
+BODY_SCAN_SLOTS = threading.BoundedSemaphore(MAX_CONCURRENT_BODY_SCANS)
+BODY_SCAN_POOL = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_BODY_SCANS, thread_name_prefix="body-scan")
+# Address the monitored site is reported under
+SITE_IP = encode_ip("10.0.0.5")
+
+def notify_backend(packet: PacketRecord, threat_type: Optional[str] = None) -> bool:
+    """Hand packet data to the main backend without waiting on it"""
+    if not manager:
+        return False
+    
+    packet.threat_hint = threat_type
+    try:
+        manager.packet_queue.put_nowait(packet)
+    except asyncio.QueueFull:
+        manager.stats["packets_dropped"] += 1
+        return False
+    
+    manager.stats["packets_analyzed"] += 1
+    return True
+
+class BodyScanner:
+    """Scans a body too large to capture through every agent's rules on BODY_SCAN_POOL, never holding the upload"""
+    
+    def __init__(self, head: str, form: bool):
+        self.scans = {agent: rules.stream() for agent, rules in RULE_SETS.items()}
+        self.form = form
+        self.pending = b""
+        self.size = 0
+        self.chunks: deque = deque()
+        self.queued = 0
+        self.failed = False
+        self.scanning: Optional[asyncio.Future] = None
+        # Every slot busy: leave the body unscanned rather than make the upload wait
+        self.skipped = not BODY_SCAN_SLOTS.acquire(blocking=False)
+        if not self.skipped:
+            self.feed(head.encode("utf-8") + b" ")
+            self.size = 0
+    
+    def feed(self, chunk: bytes):
+        """Queue the next chunk for scanning; never waits"""
+        self.size += len(chunk)
+        # Once past STREAM_MAX_BYTES the scan reports the rest as truncated, so queueing stops there: a scan that
+        # falls behind its upload holds at most that much
+        if self.skipped or self.failed or self.queued > STREAM_MAX_BYTES:
+            return
+        self.chunks.append(chunk)
+        self.queued += len(chunk)
+        if self.scanning is None or self.scanning.done():
+            self.scanning = asyncio.get_running_loop().run_in_executor(BODY_SCAN_POOL, self._drain)
+            self.scanning.add_done_callback(self._check)
+    
+    def _check(self, future: asyncio.Future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"Error scanning request body: {future.exception()}")
+            self.failed = True
+    
+    def _drain(self):
+        while self.chunks:
+            chunk = self.chunks.popleft()
+            if not self.decided:
+                self._scan(self._decode(chunk))
+    
+    @property
+    def decided(self) -> bool:
+        return all(scan.decided for scan in self.scans.values())
+    
+    def _decode(self, chunk: bytes) -> bytes:
+        if not self.form:
+            return chunk
+        data = self.pending + chunk
+        # Hold back a %XX escape split across chunks
+        split = data.find(b"%", len(data) - 2)
+        self.pending, data = (data[split:], data[:split]) if split != -1 else (b"", data)
+        return unquote_to_bytes(data.replace(b"+", b" "))
+    
+    def _scan(self, data: bytes):
+        for scan in self.scans.values():
+            scan.feed(data)
+    
+    def _close(self) -> Dict[str, Any]:
+        self._drain()
+        if self.pending:
+            self._scan(self.pending.replace(b"+", b" "))
+        return {agent: scan.close() for agent, scan in self.scans.items()}
+    
+    async def finish(self) -> Dict[str, Any]:
+        """Per-agent (rule index, matched text, truncated rules) as `PacketRecord.body_scan`; empty if skipped"""
+        if self.skipped:
+            return {}
+        try:
+            if self.scanning is not None:
+                await asyncio.wait([self.scanning])
+            if self.failed:
+                return {}
+            return await asyncio.get_running_loop().run_in_executor(BODY_SCAN_POOL, self._close)
+        except Exception as e:
+            logger.error(f"Error scanning request body: {e}")
+            return {}
+        finally:
+            BODY_SCAN_SLOTS.release()
+
+def request_packet_id(headers: dict) -> str:
+    """Packet id for a request; honours X-Request-ID so load tests can match verdicts to requests"""
+    return headers.get("x-request-id") or f"pkt_{datetime.now().timestamp()}_{random.randint(1000, 9999)}"
+
+class PacketCaptureMiddleware:
+    """ASGI middleware that reports every request to the monitored app to NetSentinel"""
+    
+    def __init__(self, app):
+        self.app = app
+        self.submissions: Set[asyncio.Task] = set()
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
         
-        # Broadcast packet log immediately
-        packet_log = {
-            "id": f"pkt_{datetime.now().timestamp()}_{random.randint(1000, 9999)}",
-            "timestamp": packet_data["timestamp"],
-            "source_ip": packet_data["src_ip"],
-            "dest_ip": packet_data["dst_ip"],
-            "protocol": packet_data["protocol"],
-            "size": packet_data["size"],
-            "payload": packet_data.get("payload", "")[:200],
-            "threat": threat_type is not None
-        }
+        body = bytearray()
+        scanner: Optional[BodyScanner] = None
         
-        await manager.broadcast({
-            "type": "packet_log",
-            "data": packet_log
-        })
+        async def capture_receive():
+            nonlocal scanner
+            message = await receive()
+            if message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                if scanner is None and len(body) + len(chunk) > MAX_CAPTURED_BODY:
+                    # Too large to keep whole: keep the head and stream everything past it through the rules
+                    scanner = BodyScanner(" ".join(self._request_line(scope)), self._is_form(scope))
+                    scanner.feed(bytes(body))
+                if scanner is not None:
+                    scanner.feed(chunk)
+                if len(body) < MAX_CAPTURED_BODY:
+                    body.extend(chunk[:MAX_CAPTURED_BODY - len(body)])
+            return message
+        
+        try:
+            await self.app(scope, capture_receive, send)
+        finally:
+            submit = self._submit(scope, bytes(body), scanner)
+            if scanner is None:
+                await submit
+            else:
+                # The scan may still be catching up; queue the packet once it has, without holding the request
+                task = asyncio.create_task(submit)
+                self.submissions.add(task)
+                task.add_done_callback(self.submissions.discard)
+    
+    @staticmethod
+    def _is_local_probe(scope) -> bool:
+        """NetSentinel's own health probes aren't visitor traffic; only trusted from loopback"""
+        client = scope.get("client")
+        if not client or client[0] not in ("127.0.0.1", "::1"):
+            return False
+        return (b"user-agent", PROBE_USER_AGENT.encode()) in scope.get("headers", [])
+    
+    @staticmethod
+    def _request_line(scope) -> List[str]:
+        parts = [scope["path"]]
+        if scope.get("query_string"):
+            parts.append(unquote_plus(scope["query_string"].decode("latin-1")))
+        return parts
+    
+    @staticmethod
+    def _is_form(scope) -> bool:
+        for key, value in scope.get("headers", []):
+            if key == b"content-type":
+                return value.startswith(b"application/x-www-form-urlencoded")
+        return False
+    
+    async def _submit(self, scope, body: bytes, scanner: Optional[BodyScanner] = None):
+        # Finished even for probes, so the scan slot is given back
+        body_scan = await scanner.finish() if scanner else None
+        if self._is_local_probe(scope):
+            return
+        headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope.get("headers", [])}
+        client = scope.get("client")
+        
+        parts = self._request_line(scope)
+        if body:
+            text = body.decode("utf-8", errors="replace")
+            if self._is_form(scope):
+                text = unquote_plus(text)
+            parts.append(text)
+        payload = " ".join(parts)
+        
+        packet = PacketRecord(
+            id=request_packet_id(headers),
+            src_ip=encode_ip(client[0] if client else "127.0.0.1"),
+            dst_ip=SITE_IP,
+            src_port=client[1] if client else random.randint(40000, 60000),
+            dst_port=8080,
+            protocol="HTTP",
+            method=scope["method"],
+            path=scope["path"],
+            payload=payload,
+            size=len(payload) + scanner.size - len(body) if scanner else None
+        )
+        packet.body_scan = body_scan
+        threat_type = scope.get("state", {}).get("threat_type")
+        notify_backend(packet, threat_type)
 
 dummy_app = FastAPI(title="Vulnerable Demo Site")
 
@@ -50,6 +244,9 @@ dummy_app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+dummy_app.add_middleware(PacketCaptureMiddleware)
+# Added last so it runs first, ahead of capture and every handler
+dummy_app.add_middleware(BlockMiddleware, table=block_table)
 
 HTML_TEMPLATE = """
 <!DOCTYPE html>
@@ -196,22 +393,12 @@ async def login(request: Request, username: str = Form(...), password: str = For
     
     logger.warning(f"SQL Injection attempt detected: {vulnerable_query}")
     
-    # Send packet data to NetSentinel
-    packet_data = {
-        "src_ip": request.client.host if request.client else "127.0.0.1",
-        "dst_ip": "10.0.0.5",
-        "src_port": request.client.port if request.client else random.randint(40000, 60000),
-        "dst_port": 8080,
-        "protocol": "HTTP",
-        "payload": f"username={username}&password={password}",
-        "size": len(f"username={username}&password={password}"),
-        "timestamp": datetime.now().isoformat()
-    }
-    
-    # Send to the main backend for processing
-    await notify_backend(packet_data, "SQL_INJECTION" if "' OR '" in username or "' OR '" in password else None)
-    
-    if "' OR '" in username or "' OR '" in password:
+    request.state.threat_type = "SQL_INJECTION" if "' OR '" in username or "' OR '" in password else None
+    success = "' OR '" in username or "' OR '" in password
+    login_monitor.record(username, request.client.host if request.client else "unknown", success, password,
+                         request.headers.get("user-agent"))
+    
+    if success:
         return JSONResponse({
             "status": "success",
             "message": "SQL Injection successful! NetSentinel should detect this.",
@@ -231,20 +418,8 @@ async def search(request: Request, q: str):
     
     vulnerable_query = f"SELECT * FROM products WHERE name LIKE '%{q}%'"
     
-    # Send packet data to NetSentinel
-    packet_data = {
-        "src_ip": request.client.host if request.client else "127.0.0.1",
-        "dst_ip": "10.0.0.5",
-        "src_port": request.client.port if request.client else random.randint(40000, 60000),
-        "dst_port": 8080,
-        "protocol": "HTTP",
-        "payload": f"search={q}",
-        "size": len(f"search={q}"),
-        "timestamp": datetime.now().isoformat()
-    }
-    
     threat_detected = "DROP" in q.upper() or "DELETE" in q.upper() or "UNION" in q.upper()
-    await notify_backend(packet_data, "SQL_INJECTION" if threat_detected else None)
+    request.state.threat_type = "SQL_INJECTION" if threat_detected else None
     
     if threat_detected:
         return JSONResponse({
@@ -268,20 +443,8 @@ async def search(request: Request, q: str):
 async def post_comment(request: Request, name: str = Form(...), comment: str = Form(...)):
     """Vulnerable comment endpoint - XSS"""
     
-    # Send packet data to NetSentinel
-    packet_data = {
-        "src_ip": request.client.host if request.client else "127.0.0.1",
-        "dst_ip": "10.0.0.5",
-        "src_port": request.client.port if request.client else random.randint(40000, 60000),
-        "dst_port": 8080,
-        "protocol": "HTTP",
-        "payload": f"name={name}&comment={comment}",
-        "size": len(f"name={name}&comment={comment}"),
-        "timestamp": datetime.now().isoformat()
-    }
-    
     threat_detected = "<script>" in comment.lower() or "javascript:" in comment.lower()
-    await notify_backend(packet_data, "XSS" if threat_detected else None)
+    request.state.threat_type = "XSS" if threat_detected else None
     
     if threat_detected:
         return JSONResponse({
@@ -306,20 +469,8 @@ async def post_comment(request: Request, name: str = Form(...), comment: str = F
 async def view_file(request: Request, file: str):
     """Vulnerable file viewer - Path Traversal"""
     
-    # Send packet data to NetSentinel
-    packet_data = {
-        "src_ip": request.client.host if request.client else "127.0.0.1",
-        "dst_ip": "10.0.0.5",
-        "src_port": request.client.port if request.client else random.randint(40000, 60000),
-        "dst_port": 8080,
-        "protocol": "HTTP",
-        "payload": f"file={file}",
-        "size": len(f"file={file}"),
-        "timestamp": datetime.now().isoformat()
-    }
-    
     threat_detected = ".." in file or "/etc/" in file or "/windows/" in file
-    await notify_backend(packet_data, "PATH_TRAVERSAL" if threat_detected else None)
+    request.state.threat_type = "PATH_TRAVERSAL" if threat_detected else None
     
     if threat_detected:
         return JSONResponse({
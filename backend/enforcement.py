@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Verdict severities that block the source automatically
+BLOCK_SEVERITIES = ("high", "critical")
+# First block lasts this long; each repeat offence doubles it up to MAX_BLOCK_SECONDS
+BLOCK_SECONDS = 300
+MAX_BLOCK_SECONDS = 24 * 3600
+# Offence history is forgotten after this long without a new block
+OFFENCE_MEMORY_SECONDS = 24 * 3600
+# Addresses never blocked automatically; loopback by default so local demos and load tests keep working
+BLOCK_ALLOWLIST = {ip.strip() for ip in os.getenv("NETSENTINEL_BLOCK_ALLOWLIST", "127.0.0.1,::1").split(",") if ip.strip()}
+
+BLOCKED_BODY = b'{"detail":"Forbidden"}'
+
+class BlockTable:
+    """Source addresses currently denied at the monitored app, with expiry"""
+
+    def __init__(self, allowlist=BLOCK_ALLOWLIST):
+        self.allowlist = set(allowlist)
+        self.blocks: Dict[str, Dict[str, Any]] = {}
+        self.offences: Dict[str, tuple] = {}
+        self.requests_blocked = 0
+
+    def is_blocked(self, ip: Optional[str]) -> bool:
+        entry = self.blocks.get(ip)
+        if entry is None:
+            return False
+        if entry["expires"] is not None and entry["expires"] <= time.time():
+            del self.blocks[ip]
+            return False
+        entry["hits"] += 1
+        self.requests_blocked += 1
+        return True
+
+    def block(self, ip: str, seconds: Optional[float] = None, reason: str = "manual", manual: bool = True) -> Optional[Dict[str, Any]]:
+        """Block an address; `seconds=None` escalates by offence count, 0 blocks until removed"""
+        if not ip or (not manual and ip in self.allowlist):
+            return None
+        now = time.time()
+        strikes, last = self.offences.get(ip, (0, 0))
+        strikes = strikes + 1 if now - last < OFFENCE_MEMORY_SECONDS else 1
+        self.offences[ip] = (strikes, now)
+        if seconds is None:
+            seconds = min(MAX_BLOCK_SECONDS, BLOCK_SECONDS * 2 ** (strikes - 1))
+
+        existing = self.blocks.get(ip)
+        expires = now + seconds if seconds else None
+        if existing and (existing["expires"] is None or (expires and existing["expires"] >= expires)):
+            return existing
+        self.blocks[ip] = {
+            "ip": ip,
+            "reason": reason,
+            "blocked_at": now,
+            "expires": expires,
+            "strikes": strikes,
+            "hits": existing["hits"] if existing else 0
+        }
+        logger.warning(f"Blocked {ip} for {seconds or 'unlimited'}s: {reason}")
+        return self.blocks[ip]
+
+    def apply_verdict(self, ip: Optional[str], verdict: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Block the source of a high-severity verdict"""
+        if verdict.get("severity") not in BLOCK_SEVERITIES:
+            return None
+        entry = self.blocks.get(ip)
+        if entry and (entry["expires"] is None or entry["expires"] > time.time()):
+            return None
+        return self.block(ip, reason=f"{verdict['severity']} {verdict.get('threat_type')}", manual=False)
+
+    def unblock(self, ip: str) -> bool:
+        return self.blocks.pop(ip, None) is not None
+
+    def prune(self):
+        now = time.time()
+        for ip in [ip for ip, entry in self.blocks.items() if entry["expires"] is not None and entry["expires"] <= now]:
+            del self.blocks[ip]
+        for ip in [ip for ip, (_, last) in self.offences.items() if now - last >= OFFENCE_MEMORY_SECONDS]:
+            del self.offences[ip]
+
+    def active(self) -> List[Dict[str, Any]]:
+        self.prune()
+        return sorted(self.blocks.values(), key=lambda entry: entry["blocked_at"], reverse=True)
+
+    async def run(self, interval: float = 30):
+        """Drop expired blocks and stale offence history so the table stays bounded"""
+        while True:
+            try:
+                self.prune()
+                await asyncio.sleep(interval)
+
+            except Exception as e:
+                logger.error(f"Error pruning block table: {e}")
+                await asyncio.sleep(interval)
+
+class BlockMiddleware:
+    """ASGI middleware that rejects blocked clients before anything else runs"""
+
+    def __init__(self, app, table: BlockTable):
+        self.app = app
+        self.table = table
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            client = scope.get("client")
+            if client and self.table.is_blocked(client[0]):
+                await send({
+                    "type": "http.response.start",
+                    "status": 403,
+                    "headers": [(b"content-type", b"application/json"),
+                                (b"content-length", str(len(BLOCKED_BODY)).encode())]
+                })
+                await send({"type": "http.response.body", "body": BLOCKED_BODY})
+                return
+        await self.app(scope, receive, send)
@@ -0,0 +1,99 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy import select
+
+from database import sync_engine
+from models import PacketLog, ThreatDetection
+
+# Rows fetched from the cursor per round trip
+EXPORT_FETCH_SIZE = 1000
+# Output is flushed to the client roughly this often
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+EXPORT_TABLES = {
+    "packets": {
+        "model": PacketLog,
+        "filters": ("source_ip", "dest_ip", "protocol", "dest_port")
+    },
+    "threats": {
+        "model": ThreatDetection,
+        "filters": ("source_ip", "dest_ip", "threat_type", "severity")
+    }
+}
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv"
+}
+
+def _json_default(value: Any):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+def _ndjson_chunks(columns: List[str], rows: Iterator[tuple]) -> Iterator[str]:
+    buffer = []
+    size = 0
+    for row in rows:
+        line = json.dumps(dict(zip(columns, row)), default=_json_default)
+        buffer.append(line)
+        size += len(line) + 1
+        if size >= EXPORT_CHUNK_BYTES:
+            yield "\n".join(buffer) + "\n"
+            buffer, size = [], 0
+    if buffer:
+        yield "\n".join(buffer) + "\n"
+
+def _csv_chunks(columns: List[str], rows: Iterator[tuple]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow([value.isoformat() if isinstance(value, datetime) else value for value in row])
+        if buffer.tell() >= EXPORT_CHUNK_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def export_rows(table: str, fmt: str = "ndjson", start: Optional[datetime] = None, end: Optional[datetime] = None,
+                filters: Optional[Dict[str, Any]] = None, limit: Optional[int] = None,
+                gzip: bool = False) -> Iterator[bytes]:
+    """Stream a table as NDJSON or CSV bytes from a server-side cursor"""
+    model = EXPORT_TABLES[table]["model"]
+    columns = [column.name for column in model.__table__.columns]
+
+    query = select(*model.__table__.columns).order_by(model.timestamp)
+    if start:
+        query = query.where(model.timestamp >= start)
+    if end:
+        query = query.where(model.timestamp < end)
+    for name, value in (filters or {}).items():
+        if value is not None:
+            query = query.where(getattr(model, name) == value)
+    if limit:
+        query = query.limit(limit)
+
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if gzip else None
+
+    with sync_engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=EXPORT_FETCH_SIZE).execute(query)
+        rows = (tuple(row) for row in result)
+        chunks = _csv_chunks(columns, rows) if fmt == "csv" else _ndjson_chunks(columns, rows)
+
+        for chunk in chunks:
+            data = chunk.encode()
+            if compressor:
+                data = compressor.compress(data)
+                if not data:
+                    continue
+            yield data
+
+    if compressor:
+        yield compressor.flush()
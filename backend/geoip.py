@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+import argparse
+import csv
+import ipaddress
+import logging
+import mmap
+import os
+import struct
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from packets import IPV6_FLAG
+
+logger = logging.getLogger(__name__)
+
+GEOIP_DB = os.getenv("NETSENTINEL_GEOIP_DB", "./geoip/geoip.bin")
+
+MAGIC = b"NSGEOIP1"
+# magic, record count, string table offset, string table size
+HEADER = struct.Struct("<8sIII")
+# first address, last address, ASN, ISO country code, reserved, org name offset in the string table; records are
+# sorted by first address and don't overlap, and org names are NUL-terminated UTF-8
+RECORD = struct.Struct("<III2sHI")
+RECORD_START = struct.Struct("<I")
+
+# Addresses whose lookup result is kept in memory
+LRU_SIZE = 65536
+# Each source is resolved at most once per window
+ENRICH_WINDOW = 60
+# A window is cut short after this many distinct sources so a scan can't grow it without bound
+MAX_WINDOW_SOURCES = 100000
+
+class GeoIPDatabase:
+    """Read-only, memory-mapped IPv4 range database"""
+
+    def __init__(self, path: str, cache_size: int = LRU_SIZE):
+        self.path = path
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[int, Optional[Dict[str, Any]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < HEADER.size:
+            raise ValueError(f"{path} is too small to be a GeoIP database")
+        magic, self.count, self._strings, strings_size = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a NetSentinel GeoIP database")
+        if HEADER.size + self.count * RECORD.size > self._strings or self._strings + strings_size > len(self._map):
+            raise ValueError(f"{path} is truncated")
+
+    def _find(self, address: int) -> Optional[Dict[str, Any]]:
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if RECORD_START.unpack_from(self._map, HEADER.size + middle * RECORD.size)[0] <= address:
+                low = middle + 1
+            else:
+                high = middle
+        if not low:
+            return None
+        first, last, asn, country, _, org_offset = RECORD.unpack_from(self._map, HEADER.size + (low - 1) * RECORD.size)
+        if address > last:
+            return None
+        start = self._strings + org_offset
+        return {
+            "country": country.decode("ascii"),
+            "asn": asn,
+            "as_org": self._map[start:self._map.find(b"\0", start)].decode("utf-8", errors="replace")
+        }
+
+    def lookup(self, address: int) -> Optional[Dict[str, Any]]:
+        """Origin of an IPv4 address as an int, or None if no range covers it"""
+        if address in self._cache:
+            self.hits += 1
+            self._cache.move_to_end(address)
+            return self._cache[address]
+        self.misses += 1
+        result = self._find(address)
+        self._cache[address] = result
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return result
+
+    def close(self):
+        self._map.close()
+
+def build_database(ranges: List[Tuple[int, int, str, int, str]], path: str):
+    """Write (first, last, country, asn, org) IPv4 ranges in the GeoIPDatabase format"""
+    ranges = sorted(ranges)
+    for previous, current in zip(ranges, ranges[1:]):
+        if current[0] <= previous[1]:
+            raise ValueError(f"Overlapping ranges starting at {ipaddress.IPv4Address(current[0])}")
+
+    strings = bytearray()
+    offsets: Dict[str, int] = {}
+    records = bytearray()
+    for first, last, country, asn, org in ranges:
+        if org not in offsets:
+            offsets[org] = len(strings)
+            strings += org.encode() + b"\0"
+        records += RECORD.pack(first, last, asn, country.upper().encode("ascii")[:2].ljust(2), 0, offsets[org])
+
+    strings_offset = HEADER.size + len(records)
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(ranges), strings_offset, len(strings)))
+        f.write(records)
+        f.write(strings)
+    # Readers that already mapped the old file keep using it until they reopen
+    os.replace(temporary, path)
+
+def read_ranges_csv(path: str) -> List[Tuple[int, int, str, int, str]]:
+    """Ranges from a CSV with columns network (CIDR or first-last), country, asn, as_org"""
+    ranges = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(line for line in f if not line.startswith("#")):
+            network = row["network"].strip()
+            if "-" in network:
+                first, last = (int(ipaddress.IPv4Address(part.strip())) for part in network.split("-", 1))
+            else:
+                block = ipaddress.IPv4Network(network, strict=False)
+                first, last = int(block.network_address), int(block.broadcast_address)
+            ranges.append((first, last, row["country"].strip(), int(row["asn"]), row["as_org"].strip()))
+    return ranges
+
+class GeoEnricher:
+    """Attaches country/ASN to threat sources, resolving each source at most once per window"""
+
+    def __init__(self, path: str = GEOIP_DB, window_seconds: float = ENRICH_WINDOW):
+        self.path = path
+        self.window_seconds = window_seconds
+        self.db: Optional[GeoIPDatabase] = None
+        self._window: Dict[int, Optional[Dict[str, Any]]] = {}
+        self._window_start = time.monotonic()
+        self.enriched = 0
+        self.window_hits = 0
+
+    def open(self):
+        if not os.path.exists(self.path):
+            logger.info(f"No GeoIP database at {self.path}; threat origins will not be enriched")
+            return
+        try:
+            self.db = GeoIPDatabase(self.path)
+            logger.info(f"Loaded GeoIP database with {self.db.count} ranges")
+        except (OSError, ValueError) as e:
+            logger.error(f"Error opening GeoIP database: {e}")
+
+    def enrich(self, address: Union[int, str, None]) -> Optional[Dict[str, Any]]:
+        """Origin for an address in PacketRecord encoding, or None if unknown"""
+        if self.db is None or not isinstance(address, int) or address >= IPV6_FLAG:
+            return None
+        now = time.monotonic()
+        if now - self._window_start >= self.window_seconds or len(self._window) >= MAX_WINDOW_SOURCES:
+            self._window = {}
+            self._window_start = now
+        if address in self._window:
+            self.window_hits += 1
+            return self._window[address]
+        self.enriched += 1
+        origin = self._window[address] = self.db.lookup(address)
+        return origin
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "database": self.path if self.db else None,
+            "ranges": self.db.count if self.db else 0,
+            "enriched": self.enriched,
+            "window_hits": self.window_hits,
+            "cache_hits": self.db.hits if self.db else 0,
+            "cache_misses": self.db.misses if self.db else 0
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query a NetSentinel GeoIP/ASN database")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Convert a CSV of ranges into the binary format")
+    build.add_argument("csv")
+    build.add_argument("output")
+    lookup = commands.add_parser("lookup", help="Resolve addresses against a database")
+    lookup.add_argument("database")
+    lookup.add_argument("addresses", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        ranges = read_ranges_csv(args.csv)
+        build_database(ranges, args.output)
+        print(f"Wrote {len(ranges)} ranges to {args.output}")
+    else:
+        db = GeoIPDatabase(args.database)
+        for address in args.addresses:
+            print(address, db.lookup(int(ipaddress.IPv4Address(address))))
+
+if __name__ == "__main__":
+    main()
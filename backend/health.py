@@ -0,0 +1,194 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+HEALTH_TARGETS = os.getenv("NETSENTINEL_HEALTH_TARGETS", "./health_targets.json")
+
+# Per-target defaults; each can be overridden in the targets file
+DEFAULT_INTERVAL = 10.0
+DEFAULT_TIMEOUT = 2.0
+# Each wait is the interval scaled by a random factor in [1 - jitter, 1 + jitter] so probes don't synchronize
+DEFAULT_JITTER = 0.2
+# p95 above this marks a reachable target as degraded
+DEFAULT_DEGRADED_MS = 500.0
+
+# Probes kept per target for percentiles and error rate
+SAMPLE_WINDOW = 120
+# Consecutive failures before a target is reported down rather than degraded
+DOWN_AFTER_FAILURES = 2
+# Error rate over the window above which a reachable target is degraded
+DEGRADED_ERROR_RATE = 0.1
+# Probes in flight at once across all targets, and pooled connections to share between them
+MAX_CONCURRENT_PROBES = 100
+
+# Sent on every HTTP probe so the monitored app can tell probes from visitors
+PROBE_USER_AGENT = "NetSentinel-HealthProbe/1.0"
+
+# Used when no targets file exists: the local dummy site is enough to exercise every path
+DEFAULT_TARGETS = [
+    {"id": "dummy-site", "name": "Dummy site", "url": "http://127.0.0.1:8080/", "interval": 5},
+    {"id": "dummy-site-admin", "name": "Dummy site admin", "url": "http://127.0.0.1:8080/api/admin", "interval": 5},
+    {"id": "dummy-site-tcp", "name": "Dummy site TCP", "url": "tcp://127.0.0.1:8080", "interval": 5}
+]
+
+def percentile(ordered: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return None
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))], 2)
+
+def load_targets(path: str = HEALTH_TARGETS) -> List[Dict[str, Any]]:
+    """Targets from a JSON list of {id, name, url, ...}; url is http(s):// or tcp://host:port, TargetHealth reads the rest"""
+    if not os.path.exists(path):
+        return [dict(target) for target in DEFAULT_TARGETS]
+    with open(path, encoding="utf-8") as f:
+        targets = json.load(f)
+    for target in targets:
+        if urlsplit(target["url"]).scheme not in ("http", "https", "tcp"):
+            raise ValueError(f"Unsupported health target {target['url']}")
+        target.setdefault("id", target["url"])
+        target.setdefault("name", target["id"])
+    return targets
+
+class TargetHealth:
+    """Rolling probe results for one target"""
+
+    def __init__(self, target: Dict[str, Any]):
+        self.target = target
+        self.id = target["id"][:50]
+        self.name = target.get("name", self.id)[:100]
+        self.interval = float(target.get("interval", DEFAULT_INTERVAL))
+        self.timeout = float(target.get("timeout", DEFAULT_TIMEOUT))
+        self.jitter = float(target.get("jitter", DEFAULT_JITTER))
+        self.degraded_ms = float(target.get("degraded_ms", DEFAULT_DEGRADED_MS))
+        # HTTP statuses of 400 and up that still count as healthy, e.g. 401 from an endpoint behind a login
+        self.expected_status = set(target.get("expected_status", ()))
+        # (latency in ms, ok) per probe; failed probes count toward the error rate only
+        self.samples: Deque[tuple] = deque(maxlen=SAMPLE_WINDOW)
+        self.checks = 0
+        self.successes = 0
+        self.consecutive_failures = 0
+        self.last_check: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def record(self, latency_ms: float, ok: bool, error: Optional[str] = None):
+        self.samples.append((latency_ms, ok))
+        self.checks += 1
+        self.last_check = time.time()
+        if ok:
+            self.successes += 1
+            self.consecutive_failures = 0
+            self.last_error = None
+        else:
+            self.consecutive_failures += 1
+            self.last_error = error
+
+    def snapshot(self) -> Dict[str, Any]:
+        latencies = sorted(latency for latency, ok in self.samples if ok)
+        errors = sum(1 for _, ok in self.samples if not ok)
+        error_rate = errors / len(self.samples) if self.samples else 0.0
+        p95 = percentile(latencies, 95)
+        if not self.checks:
+            status = "unknown"
+        elif self.consecutive_failures >= DOWN_AFTER_FAILURES:
+            status = "down"
+        elif self.consecutive_failures or error_rate > DEGRADED_ERROR_RATE or (p95 or 0) > self.degraded_ms:
+            status = "degraded"
+        else:
+            status = "up"
+        return {
+            "server_id": self.id,
+            "server_name": self.name,
+            "url": self.target["url"],
+            "status": status,
+            "latency": round(self.samples[-1][0], 2) if self.samples and self.samples[-1][1] else None,
+            "latency_p50": percentile(latencies, 50),
+            "latency_p95": p95,
+            "latency_p99": percentile(latencies, 99),
+            "error_rate": round(error_rate, 4),
+            "uptime": round(100 * self.successes / self.checks, 2) if self.checks else None,
+            "checks": self.checks,
+            "last_check": datetime.fromtimestamp(self.last_check).isoformat() if self.last_check else None,
+            "last_error": self.last_error
+        }
+
+class HealthProber:
+    """Probes HTTP and TCP targets concurrently, each on its own jittered schedule"""
+
+    def __init__(self, targets: Optional[List[Dict[str, Any]]] = None, max_concurrent: int = MAX_CONCURRENT_PROBES):
+        self.targets = [TargetHealth(target) for target in (targets if targets is not None else load_targets())]
+        self.max_concurrent = max_concurrent
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def probe(self, state: TargetHealth):
+        url = state.target["url"]
+        started = time.perf_counter()
+        try:
+            async with self._semaphore:
+                started = time.perf_counter()
+                if url.startswith("tcp://"):
+                    address = urlsplit(url)
+                    _, writer = await asyncio.wait_for(asyncio.open_connection(address.hostname, address.port),
+                                                       state.timeout)
+                    writer.close()
+                    await writer.wait_closed()
+                    ok, error = True, None
+                else:
+                    response = await self._client.get(url, timeout=state.timeout)
+                    ok = response.status_code < 400 or response.status_code in state.expected_status
+                    error = None if ok else f"HTTP {response.status_code}"
+        except (asyncio.TimeoutError, httpx.TimeoutException):
+            ok, error = False, "timeout"
+        except (OSError, httpx.HTTPError) as e:
+            ok, error = False, str(e) or type(e).__name__
+        state.record((time.perf_counter() - started) * 1000, ok, error)
+
+    async def _run_target(self, state: TargetHealth):
+        # Spread the first probes over one interval instead of firing them all at startup
+        await asyncio.sleep(random.uniform(0, state.interval))
+        while True:
+            try:
+                await self.probe(state)
+                await asyncio.sleep(state.interval * random.uniform(1 - state.jitter, 1 + state.jitter))
+
+            except Exception as e:
+                logger.error(f"Error probing {state.id}: {e}")
+                await asyncio.sleep(state.interval)
+
+    async def run(self):
+        if not self.targets:
+            return
+        limits = httpx.Limits(max_connections=self.max_concurrent, max_keepalive_connections=self.max_concurrent)
+        self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        async with httpx.AsyncClient(limits=limits, headers={"User-Agent": PROBE_USER_AGENT}) as client:
+            self._client = client
+            logger.info(f"Probing {len(self.targets)} health targets")
+            await asyncio.gather(*(self._run_target(state) for state in self.targets))
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        return [state.snapshot() for state in self.targets]
+
+    @staticmethod
+    def rows(snapshot: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """`server_health` rows for every probed target in a snapshot"""
+        return [{
+            "server_id": health["server_id"],
+            "server_name": health["server_name"],
+            "status": health["status"],
+            "latency": health["latency_p50"],
+            "last_check": datetime.fromisoformat(health["last_check"]),
+            "uptime": health["uptime"],
+            "error_rate": health["error_rate"]
+        } for health in snapshot if health["last_check"]]
@@ -0,0 +1,110 @@
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+SEVERITY_RANK = {"none": 0, "low": 1, "medium": 2, "high": 3, "critical": 4}
+
+class Incident:
+    """A run of matching threat alerts collapsed into one record"""
+
+    __slots__ = ("id", "source_ip", "threat_type", "dest_ip", "count",
+                 "first_seen", "last_seen", "peak_severity", "peak_confidence",
+                 "last_alert")
+
+    def __init__(self, source_ip: str, threat_type: str, dest_ip: str, alert: Dict[str, Any], now: float):
+        self.id = str(uuid.uuid4())
+        self.source_ip = source_ip
+        self.threat_type = threat_type
+        self.dest_ip = dest_ip
+        self.count = 0
+        self.first_seen = now
+        self.last_seen = now
+        self.peak_severity = "none"
+        self.peak_confidence = 0.0
+        self.last_alert = alert
+
+    def add(self, alert: Dict[str, Any], now: float):
+        self.count += 1
+        self.last_seen = now
+        self.last_alert = alert
+        if SEVERITY_RANK.get(alert["severity"], 0) > SEVERITY_RANK.get(self.peak_severity, 0):
+            self.peak_severity = alert["severity"]
+        self.peak_confidence = max(self.peak_confidence, alert.get("confidence", 0))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "source_ip": self.source_ip,
+            "type": self.threat_type,
+            "dest_ip": self.dest_ip,
+            "count": self.count,
+            "first_seen": datetime.fromtimestamp(self.first_seen).isoformat(),
+            "last_seen": datetime.fromtimestamp(self.last_seen).isoformat(),
+            "severity": self.peak_severity,
+            "confidence": self.peak_confidence,
+            "description": self.last_alert.get("description", ""),
+            "remediation": self.last_alert.get("remediation", "")
+        }
+
+class IncidentAggregator:
+    """Collapses threat alerts by (source_ip, threat_type, dest) within a sliding window"""
+
+    def __init__(self, window_seconds: float = 60.0, max_incidents: int = 10000):
+        self.window_seconds = window_seconds
+        self.max_incidents = max_incidents
+        self.incidents: "OrderedDict[Tuple[str, str, str], Incident]" = OrderedDict()
+        # Incidents with hits since the last flush, and updates of incidents dropped before they were flushed
+        self._dirty: Dict[Tuple[str, str, str], Incident] = {}
+        self._dropped_updates: List[Dict[str, Any]] = []
+
+    def record(self, alert: Dict[str, Any], dest_ip: str, now: Optional[float] = None) -> Tuple[Incident, bool]:
+        """Fold an alert into its incident, returning the incident and whether it is new"""
+        now = now if now is not None else time.time()
+        key = (alert["source_ip"], alert["type"], dest_ip)
+        incident = self.incidents.get(key)
+        is_new = incident is None or now - incident.last_seen > self.window_seconds
+
+        if is_new:
+            if incident is not None:
+                self._drop(key)
+            if len(self.incidents) >= self.max_incidents:
+                self.expire(now)
+            incident = Incident(key[0], key[1], key[2], alert, now)
+            self.incidents[key] = incident
+
+        incident.add(alert, now)
+        self.incidents.move_to_end(key)
+        # The opening alert is broadcast as-is, so only later hits need an update
+        if not is_new:
+            self._dirty[key] = incident
+        return incident, is_new
+
+    def _drop(self, key: Tuple[str, str, str]):
+        incident = self.incidents.pop(key)
+        if self._dirty.pop(key, None) is not None:
+            self._dropped_updates.append(incident.to_dict())
+
+    def flush(self) -> List[Dict[str, Any]]:
+        """Return incidents that changed since the last flush"""
+        updates = self._dropped_updates + [incident.to_dict() for incident in self._dirty.values()]
+        self._dropped_updates = []
+        self._dirty = {}
+        return updates
+
+    def expire(self, now: Optional[float] = None) -> int:
+        """Drop incidents that have been quiet for longer than the window, and the least recently seen while full"""
+        now = now if now is not None else time.time()
+        dropped = 0
+        while self.incidents:
+            key, incident = next(iter(self.incidents.items()))
+            if now - incident.last_seen <= self.window_seconds and len(self.incidents) < self.max_incidents:
+                break
+            self._drop(key)
+            dropped += 1
+        return dropped
+
+    def active(self) -> List[Dict[str, Any]]:
+        """All incidents still inside the window, most recent first"""
+        return [incident.to_dict() for incident in reversed(self.incidents.values())]
@@ -0,0 +1,113 @@
+import json
+import zlib
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+
+from packets import PacketRecord
+
+# Longest NDJSON line accepted; anything longer is counted invalid and skipped
+MAX_RECORD_BYTES = 256 * 1024
+# Largest block handed back by the gzip decoder at once
+DECOMPRESS_BLOCK = 1024 * 1024
+
+REQUIRED_FIELDS = ("src_ip", "dst_ip")
+# Inclusive range of each integer field; sizes stop where the analytics columns do
+INT_FIELDS = {"src_port": (0, 65535), "dst_port": (0, 65535), "size": (0, 2 ** 32 - 1)}
+
+class NDJSONDecoder:
+    """Incrementally splits a byte stream into newline-delimited JSON records"""
+
+    def __init__(self, gzip: bool = False, max_record_bytes: int = MAX_RECORD_BYTES):
+        self.buffer = bytearray()
+        self.max_record_bytes = max_record_bytes
+        self.oversized = 0
+        self._skipping = False
+        self._inflater = zlib.decompressobj(16 + zlib.MAX_WBITS) if gzip else None
+
+    def _inflate(self, chunk: bytes) -> Iterator[bytes]:
+        data = self._inflater.decompress(chunk, DECOMPRESS_BLOCK)
+        yield data
+        while self._inflater.unconsumed_tail:
+            yield self._inflater.decompress(self._inflater.unconsumed_tail, DECOMPRESS_BLOCK)
+
+    def feed(self, chunk: bytes) -> Iterator[bytes]:
+        """Yield every complete line available after adding `chunk`"""
+        blocks = self._inflate(chunk) if self._inflater else (chunk,)
+        for block in blocks:
+            self.buffer.extend(block)
+            yield from self._lines()
+
+    def close(self) -> Iterator[bytes]:
+        """Yield the final line if the stream did not end with a newline"""
+        if self._inflater:
+            self.buffer.extend(self._inflater.flush())
+            yield from self._lines()
+        if self.buffer and not self._skipping:
+            yield bytes(self.buffer)
+        self.buffer.clear()
+
+    def _lines(self) -> Iterator[bytes]:
+        start = 0
+        while True:
+            end = self.buffer.find(b"\n", start)
+            if end < 0:
+                break
+            if self._skipping:
+                self._skipping = False
+            elif end > start:
+                yield bytes(self.buffer[start:end])
+            start = end + 1
+        del self.buffer[:start]
+
+        if len(self.buffer) > self.max_record_bytes:
+            # Drop the rest of this line without holding it in memory
+            self.oversized += 1 if not self._skipping else 0
+            self._skipping = True
+            self.buffer.clear()
+
+def validate_packet(record: Any) -> Optional[PacketRecord]:
+    """Return the record as a pipeline packet, or None if it is not a usable packet"""
+    if not isinstance(record, dict):
+        return None
+    for field in REQUIRED_FIELDS:
+        if not isinstance(record.get(field), str):
+            return None
+    for field, (low, high) in INT_FIELDS.items():
+        if field in record:
+            value = record[field]
+            # bool is an int subclass, but true/false is no port or size
+            if not isinstance(value, int) or isinstance(value, bool) or not low <= value <= high:
+                return None
+
+    payload = record.get("payload", "")
+    if not isinstance(payload, str):
+        return None
+
+    record.setdefault("protocol", "TCP")
+    return PacketRecord.from_dict(record)
+
+async def parse_ndjson(stream: AsyncIterator[bytes], gzip: bool = False, counts: Dict[str, int] = None) -> AsyncIterator[PacketRecord]:
+    """Yield validated packets from an NDJSON body as it arrives, counting rejects in `counts`"""
+    decoder = NDJSONDecoder(gzip=gzip)
+    counts = counts if counts is not None else {}
+    counts.setdefault("invalid", 0)
+
+    def decode(lines: Iterator[bytes]) -> Iterator[PacketRecord]:
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                packet = validate_packet(json.loads(line))
+            except ValueError:
+                packet = None
+            if packet is None:
+                counts["invalid"] += 1
+            else:
+                yield packet
+
+    async for chunk in stream:
+        for packet in decode(decoder.feed(chunk)):
+            yield packet
+    for packet in decode(decoder.close()):
+        yield packet
+    counts["invalid"] += decoder.oversized
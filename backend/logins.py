@@ -0,0 +1,228 @@
+import hashlib
+import time
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+# Failures are counted over this sliding window
+LOGIN_WINDOW_SECONDS = 300
+# Granularity of the window; expiry happens a bucket at a time
+LOGIN_BUCKET_SECONDS = 10
+# Keys tracked per counter; beyond this new keys are ignored until old ones expire
+MAX_TRACKED_KEYS = 200000
+
+# Failed logins for one username before it is treated as brute-forced
+BRUTE_FORCE_FAILURES = 10
+# Distinct sources failing on one username before it is a distributed attack
+DISTRIBUTED_SOURCES = 5
+# Distinct usernames failing from one source before it is spraying or stuffing
+SPRAY_USERNAMES = 10
+# Spraying reuses a few passwords across many users; more distinct passwords than this share means stuffing
+SPRAY_PASSWORD_RATIO = 0.25
+# Failed logins from one source regardless of username
+SOURCE_FAILURES = 50
+
+# type, severity, confidence, remediation
+LOGIN_THREATS = {
+    "brute_force": ("BruteForce", "high", 85.0,
+                    "Lock out or rate-limit the account and require MFA"),
+    "distributed_brute_force": ("DistributedBruteForce", "high", 80.0,
+                                "Lock out the account, require MFA and review the source ranges"),
+    "password_spraying": ("PasswordSpraying", "high", 85.0,
+                          "Block the source, enforce password policy and require MFA"),
+    "credential_stuffing": ("CredentialStuffing", "high", 90.0,
+                            "Block the source, check the usernames against breach corpora and force resets"),
+    "excessive_failures": ("LoginFlood", "medium", 70.0,
+                           "Rate-limit the login endpoint for this source"),
+    "success_after_failures": ("CredentialCompromise", "critical", 92.0,
+                               "Reset the account's credentials, revoke its sessions and investigate the source")
+}
+
+class SlidingWindowCounter:
+    """Per-key event counts over a sliding window of fixed time buckets"""
+
+    def __init__(self, window_seconds: float = LOGIN_WINDOW_SECONDS, bucket_seconds: float = LOGIN_BUCKET_SECONDS,
+                 max_keys: int = MAX_TRACKED_KEYS, on_expire: Optional[Callable[[Hashable], None]] = None):
+        self.bucket_seconds = bucket_seconds
+        self.bucket_count = max(1, int(window_seconds // bucket_seconds))
+        self.max_keys = max_keys
+        self.on_expire = on_expire
+        self.buckets: Deque[Tuple[int, Dict[Hashable, int]]] = deque()
+        self.totals: Dict[Hashable, int] = {}
+
+    def _advance(self, now: float) -> int:
+        bucket_id = int(now // self.bucket_seconds)
+        while self.buckets and self.buckets[0][0] <= bucket_id - self.bucket_count:
+            _, counts = self.buckets.popleft()
+            for key, count in counts.items():
+                remaining = self.totals[key] - count
+                if remaining:
+                    self.totals[key] = remaining
+                else:
+                    del self.totals[key]
+                    if self.on_expire:
+                        self.on_expire(key)
+        if not self.buckets or self.buckets[-1][0] != bucket_id:
+            self.buckets.append((bucket_id, {}))
+        return bucket_id
+
+    def add(self, key: Hashable, now: float) -> int:
+        """Count one event; returns the key's total in the window, or 0 if the key could not be tracked"""
+        self._advance(now)
+        total = self.totals.get(key, 0)
+        if not total and len(self.totals) >= self.max_keys:
+            return 0
+        counts = self.buckets[-1][1]
+        counts[key] = counts.get(key, 0) + 1
+        self.totals[key] = total + 1
+        return total + 1
+
+    def get(self, key: Hashable, now: Optional[float] = None) -> int:
+        if now is not None:
+            self._advance(now)
+        return self.totals.get(key, 0)
+
+    def expire(self, now: float):
+        self._advance(now)
+
+class DistinctCounter:
+    """Distinct second elements per first element, driven by a pair counter's first sighting and expiry"""
+
+    def __init__(self, window_seconds: float, bucket_seconds: float, max_keys: int):
+        self.counts: Dict[Hashable, int] = {}
+        self.pairs = SlidingWindowCounter(window_seconds, bucket_seconds, max_keys, on_expire=self._expired)
+
+    def _expired(self, pair: Tuple[Hashable, Hashable]):
+        remaining = self.counts[pair[0]] - 1
+        if remaining:
+            self.counts[pair[0]] = remaining
+        else:
+            del self.counts[pair[0]]
+
+    def add(self, key: Hashable, value: Hashable, now: float) -> int:
+        """Record value under key; returns how many distinct values key has in the window"""
+        if self.pairs.add((key, value), now) == 1:
+            self.counts[key] = self.counts.get(key, 0) + 1
+        return self.counts.get(key, 0)
+
+    def get(self, key: Hashable) -> int:
+        return self.counts.get(key, 0)
+
+    def expire(self, now: float):
+        self.pairs.expire(now)
+
+class LoginMonitor:
+    """Tracks login attempts in memory and flags brute force, spraying and stuffing without touching the DB"""
+
+    def __init__(self, window_seconds: float = LOGIN_WINDOW_SECONDS, bucket_seconds: float = LOGIN_BUCKET_SECONDS,
+                 max_keys: int = MAX_TRACKED_KEYS, max_buffer: int = 50000):
+        self.window_seconds = window_seconds
+        counter = lambda: SlidingWindowCounter(window_seconds, bucket_seconds, max_keys)
+        distinct = lambda: DistinctCounter(window_seconds, bucket_seconds, max_keys)
+        self.user_failures = counter()
+        self.source_failures = counter()
+        self.source_users = distinct()
+        self.source_passwords = distinct()
+        self.user_sources = distinct()
+        self.max_buffer = max_buffer
+        self.attempts: List[Dict[str, Any]] = []
+        self.alerts: List[Dict[str, Any]] = []
+        self._alerted: Dict[Tuple[str, str], float] = {}
+        self.total_attempts = 0
+        self.dropped = 0
+
+    def record(self, username: str, source_ip: str, success: bool, password: str = "",
+               user_agent: Optional[str] = None, now: Optional[float] = None) -> List[str]:
+        """Account for one login attempt and return the threat indicators it triggered"""
+        now = now if now is not None else time.time()
+        self.total_attempts += 1
+        indicators = []
+
+        if success:
+            failures = self.user_failures.get(username, now)
+            if failures >= BRUTE_FORCE_FAILURES:
+                indicators.append("success_after_failures")
+                self._raise("success_after_failures", username, source_ip, now,
+                            f"Successful login for '{username}' after {failures} failures in the last "
+                            f"{self.window_seconds // 60:.0f} minutes")
+        else:
+            user_failures = self.user_failures.add(username, now)
+            source_failures = self.source_failures.add(source_ip, now)
+            users = self.source_users.add(source_ip, username, now)
+            # Only a digest is kept, to tell spraying (few passwords) from stuffing (one per account)
+            passwords = self.source_passwords.add(source_ip, hashlib.blake2b(password.encode(), digest_size=8).digest(), now)
+            sources = self.user_sources.add(username, source_ip, now)
+
+            if user_failures >= BRUTE_FORCE_FAILURES:
+                indicators.append("brute_force")
+                self._raise("brute_force", username, source_ip, now,
+                            f"{user_failures} failed logins for '{username}' in the last "
+                            f"{self.window_seconds // 60:.0f} minutes")
+            if sources >= DISTRIBUTED_SOURCES:
+                indicators.append("distributed_brute_force")
+                self._raise("distributed_brute_force", username, source_ip, now,
+                            f"Failed logins for '{username}' from {sources} different sources")
+            if users >= SPRAY_USERNAMES:
+                kind = "password_spraying" if passwords <= users * SPRAY_PASSWORD_RATIO else "credential_stuffing"
+                indicators.append(kind)
+                self._raise(kind, source_ip, source_ip, now,
+                            f"{source_ip} failed logins for {users} usernames with {passwords} distinct passwords")
+            if source_failures >= SOURCE_FAILURES:
+                indicators.append("excessive_failures")
+                self._raise("excessive_failures", source_ip, source_ip, now,
+                            f"{source_failures} failed logins from {source_ip}")
+
+        if len(self.attempts) < self.max_buffer:
+            self.attempts.append({
+                "timestamp": datetime.fromtimestamp(now),
+                "username": username[:100],
+                "source_ip": source_ip,
+                "user_agent": user_agent,
+                "success": success,
+                "suspicious": bool(indicators),
+                "threat_indicators": indicators or None
+            })
+        else:
+            self.dropped += 1
+        return indicators
+
+    def _raise(self, kind: str, subject: str, source_ip: str, now: float, description: str):
+        """Queue one alert per indicator and subject per window"""
+        last = self._alerted.get((kind, subject))
+        if last is not None and now - last < self.window_seconds:
+            return
+        self._alerted[(kind, subject)] = now
+        threat_type, severity, confidence, remediation = LOGIN_THREATS[kind]
+        self.alerts.append({
+            "id": str(uuid.uuid4()),
+            "timestamp": datetime.fromtimestamp(now).isoformat(),
+            "severity": severity,
+            "type": threat_type,
+            "description": description,
+            "source_ip": source_ip,
+            "packet_id": None,
+            "confidence": confidence,
+            "remediation": remediation,
+            "indicator": kind,
+            "subject": subject
+        })
+
+    def drain(self, now: Optional[float] = None) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """Take buffered attempt rows and alerts, and expire idle window state"""
+        now = now if now is not None else time.time()
+        attempts, self.attempts = self.attempts, []
+        alerts, self.alerts = self.alerts, []
+        for counter in (self.user_failures, self.source_failures, self.source_users, self.source_passwords,
+                        self.user_sources):
+            counter.expire(now)
+        self._alerted = {key: at for key, at in self._alerted.items() if now - at < self.window_seconds}
+        return attempts, alerts
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "attempts": self.total_attempts,
+            "tracked_usernames": len(self.user_failures.totals),
+            "tracked_sources": len(self.source_failures.totals),
+            "dropped": self.dropped
+        }
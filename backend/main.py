@@ -1,77 +1,225 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Depends
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from typing import List, Dict, Any, Optional
 import asyncio
 import json
 import logging
 from datetime import datetime, timedelta
+from collections import deque
+from itertools import islice
 import random
+import time
 import uuid
+import zlib
 from contextlib import asynccontextmanager
 
-from database import init_db, get_db
-from models import PacketLog, ThreatDetection, NetworkStats, ServerHealth
+from database import init_db, query_timer
+from repository import recent_packets, recent_threats, threat_origins
 from agents import (
-    XSSAgent,
-    SQLInjectionAgent,
-    PayloadAgent,
-    ThreatSynthesizer,
-    PacketCapture
+    ThreatAnalyzer,
+    PacketCapture,
+    RULE_SETS
 )
-from dummy_site import create_dummy_site
-import sqlalchemy.orm as orm
+from sharding import DetectionShardPool, DETECTION_SHARDS, SHARD_BATCH_SIZE
+from incidents import IncidentAggregator
+from dummy_site import create_dummy_site, block_table, login_monitor, SITE_IP
+from ingest import parse_ndjson
+from persistence import PersistenceWriter
+from export import export_rows, EXPORT_TABLES, MEDIA_TYPES
+from rollups import StatsRollup, query_history
+from retention import RetentionManager
+from analytics import PacketWindow
+from packets import PacketRecord, decode_ip, encode_ip
+from reputation import ReputationDB
+from geoip import GeoEnricher
+from statstream import StatsStream, MIN_REFRESH
+from health import HealthProber
+from rules import merge_counters, profile_report
+from scheduler import PacketScheduler, LANES
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Packets beyond this many waiting for analysis are dropped rather than slowing producers
+PACKET_QUEUE_SIZE = 10000
+# Broadcast events kept for clients resuming after a disconnect; older gaps get a fresh snapshot
+REPLAY_BUFFER_SIZE = 5000
+# Most recent events per topic included in a new client's snapshot
+SNAPSHOT_TOPICS = {"packet_log": 50, "threat_alert": 50}
+
 class ConnectionManager:
+    """Fans broadcast events out to dashboard clients"""
+    
     def __init__(self):
         self.active_connections: List[WebSocket] = []
-        self.packet_queue = asyncio.Queue()
+        self.pending: Dict[WebSocket, List[str]] = {}
+        self.packet_queue = PacketScheduler(PACKET_QUEUE_SIZE, on_evict=self._packet_evicted)
+        # Seq numbers restart with the process, so a resume is only honored for the same epoch
+        self.epoch = uuid.uuid4().hex
+        self.seq = 0
+        self.replay: deque = deque(maxlen=REPLAY_BUFFER_SIZE)
+        self.recent: Dict[str, deque] = {topic: deque(maxlen=size) for topic, size in SNAPSHOT_TOPICS.items()}
+        self.snapshot_extras = lambda: {}
+        self.stats_stream = StatsStream()
         self.stats = {
             "packets_analyzed": 0,
+            "packets_dropped": 0,
             "threats_detected": 0,
+            "scans_truncated": 0,
             "active_connections": 0,
+            "snapshots_sent": 0,
+            "resumes": 0,
             "uptime_start": datetime.now()
         }
-
-    async def connect(self, websocket: WebSocket):
+    
+    async def connect(self, websocket: WebSocket, since: Optional[int] = None, epoch: Optional[str] = None):
+        """Accept a client and bring it up to date: the missed events if `since` is still buffered, else a snapshot"""
         await websocket.accept()
+        await self.catch_up(websocket, since, epoch)
         self.active_connections.append(websocket)
+        self.stats_stream.subscribe(websocket)
         self.stats["active_connections"] = len(self.active_connections)
         logger.info(f"Client connected. Total connections: {len(self.active_connections)}")
-
+    
+    async def resume(self, websocket: WebSocket, since: Optional[int], epoch: Optional[str]):
+        """Re-sync a connected client; it is taken off the broadcast list until the gap has been sent"""
+        if websocket in self.active_connections:
+            self.active_connections.remove(websocket)
+        await self.catch_up(websocket, since, epoch)
+        self.active_connections.append(websocket)
+    
+    async def catch_up(self, websocket: WebSocket, since: Optional[int], epoch: Optional[str]):
+        """Send the gap or a snapshot, then whatever was broadcast meanwhile, in seq order"""
+        self.pending[websocket] = []
+        try:
+            gap = self.replay_since(since, epoch) if since is not None else None
+            if gap is not None:
+                self.stats["resumes"] += 1
+                for text in gap:
+                    await websocket.send_text(text)
+            else:
+                self.stats["snapshots_sent"] += 1
+                await websocket.send_text(json.dumps(self.snapshot(), default=str))
+            held = self.pending[websocket]
+            while held:
+                await websocket.send_text(held.pop(0))
+        finally:
+            del self.pending[websocket]
+    
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        if websocket in self.active_connections:
+            self.active_connections.remove(websocket)
+        self.stats_stream.unsubscribe(websocket)
         self.stats["active_connections"] = len(self.active_connections)
         logger.info(f"Client disconnected. Total connections: {len(self.active_connections)}")
-
+    
+    def replay_since(self, since: int, epoch: Optional[str] = None) -> Optional[List[str]]:
+        """Buffered events after `since`, or None if some have been evicted or `since` is from another server run"""
+        if epoch != self.epoch or since > self.seq or since < 0:
+            return None
+        first = self.replay[0][0] if self.replay else self.seq + 1
+        if since < first - 1:
+            return None
+        return [text for _, text in islice(self.replay, since - first + 1, None)]
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Current state for a client that has nothing to resume from"""
+        data = {topic: list(events) for topic, events in self.recent.items()}
+        data.update(self.snapshot_extras())
+        return {"type": "snapshot", "epoch": self.epoch, "seq": self.seq, "data": data}
+    
     async def broadcast(self, message: dict):
-        for connection in self.active_connections:
+        self.seq += 1
+        message["epoch"] = self.epoch
+        message["seq"] = self.seq
+        text = json.dumps(message, default=str)
+        self.replay.append((self.seq, text))
+        if message["type"] in self.recent:
+            self.recent[message["type"]].append(message["data"])
+        for held in self.pending.values():
+            held.append(text)
+        for connection in list(self.active_connections):
             try:
-                await connection.send_json(message)
+                await connection.send_text(text)
             except Exception as e:
                 logger.error(f"Error broadcasting message: {e}")
-
+    
+    def _packet_evicted(self, packet: PacketRecord):
+        self.count_dropped(1)
+    
+    def count_dropped(self, count: int):
+        """Packets accepted for analysis that will never get a verdict"""
+        self.stats["packets_dropped"] += count
+    
     async def send_personal_message(self, message: dict, websocket: WebSocket):
         await websocket.send_json(message)
 
 manager = ConnectionManager()
+incidents = IncidentAggregator(window_seconds=60)
+recorder = PersistenceWriter()
+rollup = StatsRollup()
+retention = RetentionManager()
+packet_window = PacketWindow(capacity=1_000_000)
+reputation = ReputationDB()
+manager.packet_queue.reputation = reputation.lookup
+geo = GeoEnricher()
+prober = HealthProber()
+# Set while detection runs in worker processes
+shard_pool: Optional[DetectionShardPool] = None
+
+# Pause after each packet so the dashboard can animate the agent DAG.
+# The benchmark sets this to 0.
+PROCESSOR_PACING = 0.5
+# Most packets threat_processor takes off the queue and analyzes at once
+PROCESSOR_BATCH_SIZE = 64
+
+# Minimum interval between incident_update broadcasts
+INCIDENT_FLUSH_INTERVAL = 1.0
+
+# How often server health is broadcast and persisted; probes run on their own per-target intervals
+HEALTH_BROADCAST_INTERVAL = 5.0
+
+# How often login attempts are handed to the recorder and login alerts published
+LOGIN_DRAIN_INTERVAL = 1.0
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    global shard_pool
     await init_db()
+    await asyncio.to_thread(reputation.reload)
+    geo.open()
     
     # Disable fake packet generation - only real packets from dummy site
     # asyncio.create_task(packet_monitor())
-    asyncio.create_task(threat_processor())
+    if DETECTION_SHARDS > 0:
+        shard_pool = DetectionShardPool(DETECTION_SHARDS, on_drop=manager.count_dropped)
+        shard_pool.start()
+        asyncio.create_task(shard_dispatcher(shard_pool))
+        for shard_id in range(DETECTION_SHARDS):
+            asyncio.create_task(shard_verdict_reader(shard_pool, shard_id))
+    else:
+        asyncio.create_task(threat_processor())
+    asyncio.create_task(incident_broadcaster())
+    asyncio.create_task(login_alert_publisher())
+    asyncio.create_task(recorder.run())
+    asyncio.create_task(stats_recorder())
+    asyncio.create_task(retention.run())
+    asyncio.create_task(reputation.run())
+    asyncio.create_task(block_table.run())
     asyncio.create_task(stats_broadcaster())
+    asyncio.create_task(prober.run())
+    asyncio.create_task(health_broadcaster())
     asyncio.create_task(create_dummy_site(manager))
     
     yield
     
     logger.info("Shutting down...")
+    recorder.add_login_attempts(login_monitor.drain()[0])
+    await recorder.flush()
+    await rollup.write(None)
+    if shard_pool:
+        shard_pool.stop()
 
 app = FastAPI(title="NetSentinel Backend", lifespan=lifespan)
 
@@ -92,170 +240,318 @@ async def packet_monitor():
             packets = await capture.capture_packets(interface="lo", count=10)
             
             for packet_data in packets:
-                await manager.packet_queue.put(packet_data)
+                await manager.packet_queue.put(PacketRecord.from_dict(packet_data))
                 manager.stats["packets_analyzed"] += 1
                 
-                packet_log = {
-                    "id": str(uuid.uuid4()),
-                    "timestamp": datetime.now().isoformat(),
-                    "source_ip": packet_data.get("src_ip", "unknown"),
-                    "dest_ip": packet_data.get("dst_ip", "unknown"),
-                    "protocol": packet_data.get("protocol", "unknown"),
-                    "size": packet_data.get("size", 0),
-                    "payload": packet_data.get("payload", "")[:200]
-                }
-                
-                await manager.broadcast({
-                    "type": "packet_log",
-                    "data": packet_log
-                })
-                
             await asyncio.sleep(2)
             
         except Exception as e:
             logger.error(f"Error in packet monitor: {e}")
             await asyncio.sleep(5)
 
+def packet_log_message(packet: PacketRecord) -> Dict[str, Any]:
+    """Dashboard packet_log event for a packet taken off the queue"""
+    return {
+        "type": "packet_log",
+        "data": {
+            "id": packet.id or str(uuid.uuid4()),
+            "timestamp": packet.timestamp,
+            "source_ip": packet.source_ip or "unknown",
+            "dest_ip": packet.dest_ip or "unknown",
+            "protocol": packet.protocol or "unknown",
+            "size": packet.size,
+            "payload": packet.payload[:200],
+            "threat": packet.threat_hint is not None
+        }
+    }
+
+def build_agent_statuses() -> List[Dict[str, Any]]:
+    """Initial dashboard state for each agent while a packet is being analyzed"""
+    return [
+        {
+            "name": "XSS Agent",
+            "status": "analyzing",
+            "finding": "Scanning for cross-site scripting patterns...",
+            "confidence": 0,
+            "color": "cyan",
+            "icon": "👤"
+        },
+        {
+            "name": "SQL Injection Agent",
+            "status": "analyzing",
+            "finding": "Checking for SQL injection patterns...",
+            "confidence": 0,
+            "color": "purple",
+            "icon": "🗄️"
+        },
+        {
+            "name": "Payload Agent",
+            "status": "analyzing",
+            "finding": "Deep packet inspection in progress...",
+            "confidence": 0,
+            "color": "orange",
+            "icon": "📦"
+        },
+        {
+            "name": "Anomaly Agent",
+            "status": "analyzing",
+            "finding": "Comparing traffic against port/path baselines...",
+            "confidence": 0,
+            "color": "green",
+            "icon": "📈"
+        },
+        {
+            "name": "Reputation Agent",
+            "status": "analyzing",
+            "finding": "Checking source against blocklists...",
+            "confidence": 0,
+            "color": "red",
+            "icon": "🚫"
+        }
+    ]
+
+async def publish_verdict(packet: PacketRecord, agent_statuses: List[Dict[str, Any]], verdict: Dict[str, Any]):
+    """Broadcast agent results and, for threats, a threat alert"""
+    for i, result in enumerate(verdict["results"]):
+        if result.get("skipped"):
+            agent_statuses[i]["status"] = "idle"
+            agent_statuses[i]["finding"] = result["finding"]
+            agent_statuses[i]["confidence"] = 0
+        elif result["threat_detected"]:
+            agent_statuses[i]["status"] = "threat"
+            agent_statuses[i]["finding"] = result["finding"]
+            agent_statuses[i]["confidence"] = result["confidence"]
+        else:
+            agent_statuses[i]["status"] = "clear"
+            agent_statuses[i]["finding"] = result["finding"] if result.get("scan_truncated") else "No threats detected"
+            agent_statuses[i]["confidence"] = 0
+    
+    final_threat = verdict["synthesis"]
+    if final_threat.get("scan_truncated"):
+        manager.stats["scans_truncated"] += 1
+    recorder.add_packet(packet)
+    rollup.record_packet(packet.size)
+    try:
+        packet_window.append(packet, final_threat["is_threat"])
+    except Exception as e:
+        # Analytics are best effort; the verdict still goes out
+        logger.error(f"Error adding packet to analytics window: {e}")
+    
+    if final_threat["is_threat"]:
+        threat_alert = {
+            "id": str(uuid.uuid4()),
+            "timestamp": datetime.now().isoformat(),
+            "severity": final_threat["severity"],
+            "type": final_threat["threat_type"],
+            "description": final_threat["description"],
+            "source_ip": packet.source_ip or "unknown",
+            "packet_id": packet.id,
+            "confidence": final_threat["confidence"],
+            "remediation": final_threat["remediation"],
+            "origin": geo.enrich(packet.src_ip)
+        }
+        await publish_threat(threat_alert, packet.dest_ip, [r for r in verdict["results"] if r["threat_detected"]])
+    
+    await manager.broadcast({
+        "type": "agent_analysis_complete",
+        "data": {
+            "agents": agent_statuses,
+            "synthesis": final_threat,
+            "packet_id": packet.id
+        }
+    })
+
+async def publish_threat(threat_alert: Dict[str, Any], dest_ip: Optional[str], agent_findings: List[Dict[str, Any]]):
+    """Count, persist, enforce and broadcast one threat alert, whichever detector raised it"""
+    manager.stats["threats_detected"] += 1
+    manager.packet_queue.mark_flow(encode_ip(threat_alert["source_ip"]))
+    rollup.record_threat()
+    recorder.add_threat(threat_alert, dest_ip, agent_findings)
+    
+    block = block_table.apply_verdict(threat_alert["source_ip"], {
+        "severity": threat_alert["severity"],
+        "threat_type": threat_alert["type"]
+    })
+    if block:
+        await manager.broadcast({
+            "type": "source_blocked",
+            "data": block
+        })
+    
+    # Repeats of an open incident are folded in and sent by incident_broadcaster
+    incident, is_new = incidents.record(threat_alert, dest_ip or "unknown")
+    if is_new:
+        threat_alert["incident_id"] = incident.id
+        await manager.broadcast({
+            "type": "threat_alert",
+            "data": threat_alert
+        })
+
+async def login_alert_publisher():
+    """Batch login attempts into the recorder and raise brute-force/spraying alerts"""
+    while True:
+        try:
+            attempts, alerts = login_monitor.drain()
+            recorder.add_login_attempts(attempts)
+            for alert in alerts:
+                alert["origin"] = geo.enrich(encode_ip(alert["source_ip"]))
+                findings = [{"agent": "Login", "indicator": alert.pop("indicator"), "subject": alert.pop("subject"),
+                             "finding": alert["description"]}]
+                await publish_threat(alert, decode_ip(SITE_IP), findings)
+            
+            await asyncio.sleep(LOGIN_DRAIN_INTERVAL)
+            
+        except Exception as e:
+            logger.error(f"Error in login alert publisher: {e}")
+            await asyncio.sleep(5)
+
 async def threat_processor():
     """Process packets through multi-agent threat detection"""
-    xss_agent = XSSAgent()
-    sql_agent = SQLInjectionAgent()
-    payload_agent = PayloadAgent()
-    synthesizer = ThreatSynthesizer()
+    analyzer = ThreatAnalyzer(reputation)
     
     while True:
         try:
-            if not manager.packet_queue.empty():
-                packet_data = await manager.packet_queue.get()
-                
-                agent_statuses = []
-                
-                xss_status = {
-                    "name": "XSS Agent",
-                    "status": "analyzing",
-                    "finding": "Scanning for cross-site scripting patterns...",
-                    "confidence": 0,
-                    "color": "cyan",
-                    "icon": "👤"
-                }
-                agent_statuses.append(xss_status)
-                
-                sql_status = {
-                    "name": "SQL Injection Agent",
-                    "status": "analyzing",
-                    "finding": "Checking for SQL injection patterns...",
-                    "confidence": 0,
-                    "color": "purple",
-                    "icon": "🗄️"
-                }
-                agent_statuses.append(sql_status)
+            batch = [await manager.packet_queue.get()]
+            while len(batch) < PROCESSOR_BATCH_SIZE and not manager.packet_queue.empty():
+                batch.append(manager.packet_queue.get_nowait())
+            
+            statuses = []
+            for packet in batch:
+                await manager.broadcast(packet_log_message(packet))
                 
-                payload_status = {
-                    "name": "Payload Agent",
-                    "status": "analyzing",
-                    "finding": "Deep packet inspection in progress...",
-                    "confidence": 0,
-                    "color": "orange",
-                    "icon": "📦"
-                }
-                agent_statuses.append(payload_status)
+                agent_statuses = build_agent_statuses()
+                statuses.append(agent_statuses)
                 
                 await manager.broadcast({
                     "type": "agent_analysis",
                     "data": {
                         "agents": agent_statuses,
-                        "packet_id": packet_data.get("id")
-                    }
-                })
-                
-                results = await asyncio.gather(
-                    xss_agent.analyze(packet_data),
-                    sql_agent.analyze(packet_data),
-                    payload_agent.analyze(packet_data)
-                )
-                
-                for i, result in enumerate(results):
-                    if result["threat_detected"]:
-                        agent_statuses[i]["status"] = "threat"
-                        agent_statuses[i]["finding"] = result["finding"]
-                        agent_statuses[i]["confidence"] = result["confidence"]
-                    else:
-                        agent_statuses[i]["status"] = "clear"
-                        agent_statuses[i]["finding"] = "No threats detected"
-                        agent_statuses[i]["confidence"] = 0
-                
-                final_threat = await synthesizer.synthesize(results)
-                
-                if final_threat["is_threat"]:
-                    manager.stats["threats_detected"] += 1
-                    
-                    threat_alert = {
-                        "id": str(uuid.uuid4()),
-                        "timestamp": datetime.now().isoformat(),
-                        "severity": final_threat["severity"],
-                        "type": final_threat["threat_type"],
-                        "description": final_threat["description"],
-                        "source_ip": packet_data.get("src_ip", "unknown"),
-                        "confidence": final_threat["confidence"],
-                        "remediation": final_threat["remediation"]
-                    }
-                    
-                    await manager.broadcast({
-                        "type": "threat_alert",
-                        "data": threat_alert
-                    })
-                
-                await manager.broadcast({
-                    "type": "agent_analysis_complete",
-                    "data": {
-                        "agents": agent_statuses,
-                        "synthesis": final_threat
+                        "packet_id": packet.id
                     }
                 })
+            
+            # Analyzed together so the anomaly agent scores the whole batch in one pass
+            started = time.perf_counter()
+            verdicts = await asyncio.gather(*(analyzer.analyze(packet) for packet in batch), return_exceptions=True)
+            latency = time.perf_counter() - started
+            
+            for packet, agent_statuses, verdict in zip(batch, statuses, verdicts):
+                if isinstance(verdict, Exception):
+                    logger.error(f"Error analyzing packet {packet.id}: {verdict}")
+                    continue
+                rollup.record_latency(latency)
+                await publish_verdict(packet, agent_statuses, verdict)
                 
-            await asyncio.sleep(0.5)
+                if PROCESSOR_PACING:
+                    await asyncio.sleep(PROCESSOR_PACING)
             
         except Exception as e:
             logger.error(f"Error in threat processor: {e}")
             await asyncio.sleep(2)
 
+async def shard_dispatcher(pool: DetectionShardPool):
+    """Drain the packet queue in batches and route them to detection shards"""
+    while True:
+        try:
+            batch = [await manager.packet_queue.get()]
+            while len(batch) < SHARD_BATCH_SIZE and not manager.packet_queue.empty():
+                batch.append(manager.packet_queue.get_nowait())
+            pool.submit(batch)
+            
+        except Exception as e:
+            logger.error(f"Error in shard dispatcher: {e}")
+            await asyncio.sleep(2)
+
+async def shard_verdict_reader(pool: DetectionShardPool, shard_id: int):
+    """Publish verdicts streamed back from one detection shard"""
+    async for packet, verdict in pool.verdicts(shard_id):
+        try:
+            await manager.broadcast(packet_log_message(packet))
+            await publish_verdict(packet, build_agent_statuses(), verdict)
+        except Exception as e:
+            logger.error(f"Error publishing verdict from shard {shard_id}: {e}")
+
+async def incident_broadcaster():
+    """Broadcast aggregated incident updates at a throttled rate"""
+    while True:
+        try:
+            updates = incidents.flush()
+            if updates:
+                await manager.broadcast({
+                    "type": "incident_update",
+                    "data": updates
+                })
+            incidents.expire()
+            
+            await asyncio.sleep(INCIDENT_FLUSH_INTERVAL)
+            
+        except Exception as e:
+            logger.error(f"Error in incident broadcaster: {e}")
+            await asyncio.sleep(5)
+
+async def stats_recorder():
+    """Sample pipeline stats once a second and persist them with 1m/1h rollups"""
+    while True:
+        try:
+            await asyncio.sleep(1 - time.time() % 1)
+            closed_minute = rollup.sample(manager.stats["active_connections"])
+            if closed_minute or len(rollup.raw_samples) >= 60:
+                await rollup.write(closed_minute)
+            
+        except Exception as e:
+            logger.error(f"Error in stats recorder: {e}")
+            await asyncio.sleep(5)
+
 async def stats_broadcaster():
-    """Broadcast network statistics periodically"""
-    last_packets = 0
+    """Send each client the network stats that changed since its last frame, at the client's refresh rate"""
+    stream = manager.stats_stream
     while True:
         try:
             uptime = datetime.now() - manager.stats["uptime_start"]
             hours = int(uptime.total_seconds() // 3600)
             minutes = int((uptime.total_seconds() % 3600) // 60)
             
-            # Only send stats update if there's been activity
             current_packets = manager.stats["packets_analyzed"]
-            if current_packets != last_packets:
-                stats = {
-                    "packets_analyzed": manager.stats["packets_analyzed"],
-                    "threats_detected": manager.stats["threats_detected"],
-                    "active_connections": manager.stats["active_connections"],
-                    "uptime": f"{hours}h {minutes}m",
-                    "cpu_usage": 15 + min(35, current_packets % 20),  # CPU based on activity
-                    "memory_usage": f"{2.5 + (current_packets % 10) * 0.2:.1f}/8 GB",
-                    "bandwidth_in": 100 + (current_packets * 50),
-                    "bandwidth_out": 50 + (current_packets * 25),
-                    "latency": max(5, 25 - current_packets)
-                }
-                
-                await manager.broadcast({
-                    "type": "network_stats",
-                    "data": stats
-                })
-                
-                last_packets = current_packets
+            stream.update({
+                "packets_analyzed": manager.stats["packets_analyzed"],
+                "threats_detected": manager.stats["threats_detected"],
+                "active_connections": manager.stats["active_connections"],
+                "uptime": f"{hours}h {minutes}m",
+                "cpu_usage": 15 + min(35, current_packets % 20),  # CPU based on activity
+                "memory_usage": f"{2.5 + (current_packets % 10) * 0.2:.1f}/8 GB",
+                "bandwidth_in": 100 + (current_packets * 50),
+                "bandwidth_out": 50 + (current_packets * 25),
+                "latency": max(5, 25 - current_packets)
+            })
             
-            await asyncio.sleep(2)
+            for websocket, frame in stream.due():
+                try:
+                    await websocket.send_text(frame)
+                except Exception as e:
+                    logger.error(f"Error sending stats: {e}")
+            
+            await asyncio.sleep(MIN_REFRESH)
             
         except Exception as e:
             logger.error(f"Error in stats broadcaster: {e}")
             await asyncio.sleep(5)
 
+async def health_broadcaster():
+    """Broadcast and persist the prober's rolling view of each target"""
+    while True:
+        try:
+            await asyncio.sleep(HEALTH_BROADCAST_INTERVAL)
+            snapshot = prober.snapshot()
+            recorder.add_server_health(prober.rows(snapshot))
+            await manager.broadcast({
+                "type": "server_health",
+                "data": snapshot
+            })
+            
+        except Exception as e:
+            logger.error(f"Error in health broadcaster: {e}")
+            await asyncio.sleep(5)
+
 @app.get("/")
 async def root():
     return {
@@ -264,9 +560,31 @@ async def root():
         "version": "1.0.0"
     }
 
+def snapshot_state() -> Dict[str, Any]:
+    """Open incidents and current stats for a new client's snapshot"""
+    return {
+        "incidents": incidents.active(),
+        "stats": {
+            "packets_analyzed": manager.stats["packets_analyzed"],
+            "threats_detected": manager.stats["threats_detected"],
+            "active_connections": manager.stats["active_connections"],
+            "requests_blocked": block_table.requests_blocked,
+            "active_blocks": len(block_table.blocks)
+        }
+    }
+
+manager.snapshot_extras = snapshot_state
+
 @app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+async def websocket_endpoint(websocket: WebSocket, since: Optional[int] = None, epoch: Optional[str] = None):
+    """Live event stream; pass the last `epoch` and `seq` seen to resume instead of starting from a snapshot"""
+    try:
+        await manager.connect(websocket, since, epoch)
+    except WebSocketDisconnect:
+        return
+    except Exception as e:
+        logger.error(f"WebSocket error during connect: {e}")
+        return
     try:
         while True:
             data = await websocket.receive_json()
@@ -284,6 +602,16 @@ async def websocket_endpoint(websocket: WebSocket):
                     "type": "search_results",
                     "data": results
                 }, websocket)
+            
+            elif data.get("type") == "stats_subscribe":
+                interval = manager.stats_stream.subscribe(websocket, float(data.get("interval_ms", 2000)) / 1000)
+                await manager.send_personal_message({
+                    "type": "stats_subscribed",
+                    "interval_ms": int(interval * 1000)
+                }, websocket)
+            
+            elif data.get("type") == "resume":
+                await manager.resume(websocket, int(data.get("since", -1)), data.get("epoch"))
                 
     except WebSocketDisconnect:
         manager.disconnect(websocket)
@@ -315,19 +643,264 @@ async def search_packets(query: str) -> List[Dict]:
 async def get_stats():
     return {
         "packets_analyzed": manager.stats["packets_analyzed"],
+        "packets_dropped": manager.stats["packets_dropped"],
         "threats_detected": manager.stats["threats_detected"],
-        "active_connections": manager.stats["active_connections"]
+        "scans_truncated": manager.stats["scans_truncated"],
+        "active_connections": manager.stats["active_connections"],
+        "requests_blocked": block_table.requests_blocked,
+        "active_blocks": len(block_table.blocks)
     }
 
+@app.get("/api/queue")
+async def get_queue():
+    """Analysis queue depth, throughput and wait times per priority lane"""
+    return manager.packet_queue.stats()
+
+@app.get("/api/storage")
+async def get_storage():
+    storage = await asyncio.to_thread(retention.storage_metrics)
+    storage["queries"] = query_timer.snapshot()
+    storage["geoip"] = geo.stats()
+    return storage
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of pipeline and storage metrics"""
+    storage = await asyncio.to_thread(retention.storage_metrics)
+    lines = [
+        "# TYPE netsentinel_packets_analyzed_total counter",
+        f"netsentinel_packets_analyzed_total {manager.stats['packets_analyzed']}",
+        "# TYPE netsentinel_packets_dropped_total counter",
+        f"netsentinel_packets_dropped_total {manager.stats['packets_dropped']}",
+        "# TYPE netsentinel_threats_detected_total counter",
+        f"netsentinel_threats_detected_total {manager.stats['threats_detected']}",
+        "# TYPE netsentinel_scans_truncated_total counter",
+        f"netsentinel_scans_truncated_total {manager.stats['scans_truncated']}",
+        "# TYPE netsentinel_websocket_clients gauge",
+        f"netsentinel_websocket_clients {manager.stats['active_connections']}",
+        "# TYPE netsentinel_requests_blocked_total counter",
+        f"netsentinel_requests_blocked_total {block_table.requests_blocked}",
+        "# TYPE netsentinel_active_blocks gauge",
+        f"netsentinel_active_blocks {len(block_table.blocks)}",
+        "# TYPE netsentinel_packet_queue_depth gauge",
+        f"netsentinel_packet_queue_depth {manager.packet_queue.qsize()}",
+        "# TYPE netsentinel_packets_evicted_total counter",
+        f"netsentinel_packets_evicted_total {manager.packet_queue.evicted}",
+        "# TYPE netsentinel_database_bytes gauge",
+        f"netsentinel_database_bytes {storage['database_bytes']}",
+        "# TYPE netsentinel_database_free_bytes gauge",
+        f"netsentinel_database_free_bytes {storage['free_bytes']}",
+        "# TYPE netsentinel_archive_bytes gauge",
+        f"netsentinel_archive_bytes {storage['archive_bytes']}"
+    ]
+    queue = manager.packet_queue.stats()
+    lines.append("# TYPE netsentinel_lane_depth gauge")
+    for lane in LANES:
+        lines.append(f'netsentinel_lane_depth{{lane="{lane}"}} {queue["lanes"][lane]["depth"]}')
+    lines.append("# TYPE netsentinel_lane_served_total counter")
+    for lane in LANES:
+        lines.append(f'netsentinel_lane_served_total{{lane="{lane}"}} {queue["lanes"][lane]["served"]}')
+    lines.append("# TYPE netsentinel_lane_wait_ms gauge")
+    for lane in LANES:
+        if queue["lanes"][lane]["wait_p95_ms"] is not None:
+            lines.append(f'netsentinel_lane_wait_ms{{lane="{lane}",quantile="p95"}} {queue["lanes"][lane]["wait_p95_ms"]}')
+    lines.append("# TYPE netsentinel_table_rows gauge")
+    for table, count in storage["table_rows"].items():
+        if count is not None:
+            lines.append(f'netsentinel_table_rows{{table="{table}"}} {count}')
+    lines.append("# TYPE netsentinel_archived_rows_total counter")
+    for table, count in storage["archived_rows"].items():
+        lines.append(f'netsentinel_archived_rows_total{{table="{table}"}} {count}')
+    health = prober.snapshot()
+    lines.append("# TYPE netsentinel_target_up gauge")
+    for target in health:
+        lines.append(f'netsentinel_target_up{{target="{target["server_id"]}"}} {int(target["status"] in ("up", "degraded"))}')
+    lines.append("# TYPE netsentinel_target_latency_ms gauge")
+    for target in health:
+        for quantile in ("p50", "p95", "p99"):
+            if target[f"latency_{quantile}"] is not None:
+                lines.append(f'netsentinel_target_latency_ms{{target="{target["server_id"]}",quantile="{quantile}"}} '
+                             f'{target[f"latency_{quantile}"]}')
+    profiles = rule_profiles()
+    for name, field, metric_type in (("evaluations", "evaluations", "counter"), ("hits", "hits", "counter"),
+                                     ("truncated", "truncated", "counter"),
+                                     ("scan_seconds", "est_seconds", "counter"), ("scan_bytes", "est_bytes", "counter"),
+                                     ("max_scan_us", "max_us", "gauge")):
+        suffix = "_total" if metric_type == "counter" else ""
+        lines.append(f"# TYPE netsentinel_rule_{name}{suffix} {metric_type}")
+        for agent, profile in profiles.items():
+            for rule in profile["rules"]:
+                label = rule["rule"].replace("\\", "\\\\").replace('"', '\\"')
+                lines.append(f'netsentinel_rule_{name}{suffix}{{agent="{agent}",rule="{label}"}} {rule[field]}')
+    queries = query_timer.snapshot()
+    lines += [
+        "# TYPE netsentinel_db_queries_total counter",
+        f"netsentinel_db_queries_total {queries['queries']}",
+        "# TYPE netsentinel_db_query_seconds_total counter",
+        f"netsentinel_db_query_seconds_total {queries['total_seconds']:.6f}",
+        "# TYPE netsentinel_db_slow_queries_total counter",
+        f"netsentinel_db_slow_queries_total {queries['slow_queries']}"
+    ]
+    return "\n".join(lines) + "\n"
+
+def rule_profiles() -> Dict[str, Dict[str, Any]]:
+    """Per-rule profile of each agent's rule set, summed over detection shards when they run"""
+    profiles = {}
+    for agent, rules in RULE_SETS.items():
+        copies = [rules.counters()]
+        if shard_pool:
+            copies += [shard[agent] for shard in shard_pool.rule_profiles.values()]
+        profiles[agent] = profile_report(merge_counters(copies))
+    return profiles
+
+@app.get("/api/rules/profile")
+async def get_rule_profile(sort: str = "est_seconds"):
+    """Evaluations, hits and sampled scan cost of every detection rule, costliest first"""
+    if sort not in ("est_seconds", "max_us", "avg_us", "hits", "evaluations"):
+        raise HTTPException(status_code=400, detail="sort must be est_seconds, max_us, avg_us, hits or evaluations")
+    profiles = rule_profiles()
+    for profile in profiles.values():
+        profile["rules"].sort(key=lambda rule: rule[sort] or 0, reverse=True)
+    return profiles
+
+@app.get("/api/analytics")
+async def get_analytics(window: float = Query(300, gt=0), top: int = Query(10, ge=1, le=100)):
+    """Protocol, port, size and per-source aggregates over recent packets"""
+    return await asyncio.to_thread(packet_window.summary, window, top)
+
+@app.get("/api/reputation")
+async def get_reputation():
+    """Loaded blocklists and lookup table sizes"""
+    return reputation.stats()
+
+@app.get("/api/reputation/{ip}")
+async def lookup_reputation(ip: str):
+    """Blocklist entry covering an address, if any"""
+    return {"ip": ip, "listing": reputation.lookup(encode_ip(ip))}
+
+@app.post("/api/reputation/reload")
+async def reload_reputation():
+    """Re-read the list files now instead of waiting for the next change check"""
+    await asyncio.to_thread(reputation.reload)
+    return reputation.stats()
+
+@app.get("/api/blocks")
+async def get_blocks():
+    """Sources currently blocked at the monitored app"""
+    return {"blocks": block_table.active(), "requests_blocked": block_table.requests_blocked}
+
+@app.post("/api/blocks")
+async def add_block(ip: str, seconds: float = Query(0, ge=0), reason: str = "manual"):
+    """Block a source; seconds=0 blocks until it is removed"""
+    return block_table.block(ip, seconds, reason)
+
+@app.delete("/api/blocks/{ip}")
+async def remove_block(ip: str):
+    if not block_table.unblock(ip):
+        raise HTTPException(status_code=404, detail="Not blocked")
+    return {"ip": ip, "unblocked": True}
+
+@app.get("/api/health/servers")
+async def get_server_health():
+    """Latest status, latency percentiles, error rate and uptime of each probed target"""
+    return prober.snapshot()
+
+@app.get("/api/logins")
+async def get_login_monitor():
+    """Login attempt counters tracked by the brute-force detector"""
+    return login_monitor.stats()
+
+@app.get("/api/stats/history")
+async def get_stats_history(
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    step: Optional[int] = Query(None, ge=1)
+):
+    """Network stats over a time range, downsampled to `step` seconds per point"""
+    end = end or datetime.now()
+    start = start or end - timedelta(hours=1)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="from must be before to")
+    return await query_history(start, end, step)
+
+@app.post("/api/ingest")
+async def ingest_packets(request: Request):
+    """Bulk-ingest newline-delimited JSON packet records, optionally gzip-encoded"""
+    gzip = "gzip" in request.headers.get("content-encoding", "").lower()
+    counts = {"accepted": 0, "dropped": 0, "invalid": 0}
+    
+    try:
+        async for packet in parse_ndjson(request.stream(), gzip=gzip, counts=counts):
+            try:
+                manager.packet_queue.put_nowait(packet)
+                counts["accepted"] += 1
+            except asyncio.QueueFull:
+                counts["dropped"] += 1
+    except zlib.error as e:
+        raise HTTPException(status_code=400, detail=f"Invalid gzip body: {e}")
+    finally:
+        manager.stats["packets_analyzed"] += counts["accepted"]
+        manager.stats["packets_dropped"] += counts["dropped"]
+    
+    return counts
+
+@app.get("/api/incidents")
+async def get_incidents():
+    return incidents.active()
+
 @app.get("/api/threats")
-async def get_threats(db: orm.Session = Depends(get_db)):
-    threats = db.query(ThreatDetection).order_by(ThreatDetection.timestamp.desc()).limit(100).all()
-    return [threat.to_dict() for threat in threats]
+async def get_threats(limit: int = Query(100, ge=1, le=1000), source_ip: Optional[str] = None, threat_type: Optional[str] = None):
+    return await recent_threats(limit, source_ip, threat_type)
+
+@app.get("/api/threats/origins")
+async def get_threat_origins(hours: float = Query(24, gt=0, le=24 * 365), limit: int = Query(50, ge=1, le=1000)):
+    """Threats grouped by source country and ASN"""
+    return await threat_origins(datetime.now() - timedelta(hours=hours), limit)
 
 @app.get("/api/packets")
-async def get_packets(db: orm.Session = Depends(get_db)):
-    packets = db.query(PacketLog).order_by(PacketLog.timestamp.desc()).limit(100).all()
-    return [packet.to_dict() for packet in packets]
+async def get_packets(limit: int = Query(100, ge=1, le=1000), source_ip: Optional[str] = None):
+    return await recent_packets(limit, source_ip)
+
+@app.get("/api/export/{table}")
+async def export_table(
+    table: str,
+    format: str = "ndjson",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    source_ip: Optional[str] = None,
+    dest_ip: Optional[str] = None,
+    protocol: Optional[str] = None,
+    dest_port: Optional[int] = None,
+    threat_type: Optional[str] = None,
+    severity: Optional[str] = None,
+    limit: Optional[int] = None,
+    gzip: bool = False
+):
+    """Stream packets or threats over a time range as NDJSON or CSV"""
+    if table not in EXPORT_TABLES:
+        raise HTTPException(status_code=404, detail=f"Unknown export table: {table}")
+    if format not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+    
+    requested = {
+        "source_ip": source_ip,
+        "dest_ip": dest_ip,
+        "protocol": protocol,
+        "dest_port": dest_port,
+        "threat_type": threat_type,
+        "severity": severity
+    }
+    filters = {name: requested[name] for name in EXPORT_TABLES[table]["filters"]}
+    
+    headers = {"Content-Disposition": f'attachment; filename="{table}.{format}{".gz" if gzip else ""}"'}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    
+    return StreamingResponse(
+        export_rows(table, format, start, end, filters, limit, gzip),
+        media_type=MEDIA_TYPES[format],
+        headers=headers
+    )
 
 if __name__ == "__main__":
     import uvicorn
@@ -8,7 +8,7 @@ class PacketLog(Base):
     __tablename__ = "packet_logs"
     
     id = Column(Integer, primary_key=True, index=True)
-    timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    timestamp = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     source_ip = Column(String(45), index=True)
     dest_ip = Column(String(45), index=True)
     source_port = Column(Integer)
@@ -36,7 +36,7 @@ class ThreatDetection(Base):
     __tablename__ = "threat_detections"
     
     id = Column(Integer, primary_key=True, index=True)
-    timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    timestamp = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     packet_id = Column(Integer)
     threat_type = Column(String(50), index=True)
     severity = Column(String(20))
@@ -46,6 +46,9 @@ class ThreatDetection(Base):
     dest_ip = Column(String(45))
     remediation = Column(Text)
     agent_findings = Column(JSON)
+    source_country = Column(String(2), index=True)
+    source_asn = Column(Integer, index=True)
+    source_org = Column(String(255))
     
     def to_dict(self):
         return {
@@ -59,14 +62,17 @@ class ThreatDetection(Base):
             "source_ip": self.source_ip,
             "dest_ip": self.dest_ip,
             "remediation": self.remediation,
-            "agent_findings": self.agent_findings
+            "agent_findings": self.agent_findings,
+            "source_country": self.source_country,
+            "source_asn": self.source_asn,
+            "source_org": self.source_org
         }
 
 class NetworkStats(Base):
     __tablename__ = "network_stats"
     
     id = Column(Integer, primary_key=True, index=True)
-    timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    timestamp = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     packets_analyzed = Column(Integer, default=0)
     threats_detected = Column(Integer, default=0)
     bandwidth_in = Column(Float)
@@ -74,6 +80,7 @@ class NetworkStats(Base):
     active_connections = Column(Integer)
     cpu_usage = Column(Float)
     memory_usage = Column(Float)
+    latency = Column(Float)
     
     def to_dict(self):
         return {
@@ -85,9 +92,46 @@ class NetworkStats(Base):
             "bandwidth_out": self.bandwidth_out,
             "active_connections": self.active_connections,
             "cpu_usage": self.cpu_usage,
-            "memory_usage": self.memory_usage
+            "memory_usage": self.memory_usage,
+            "latency": self.latency
         }
 
+class StatsRollupColumns:
+    """Columns shared by the downsampled network_stats tables"""
+    
+    bucket_start = Column(Integer, primary_key=True)
+    samples = Column(Integer, default=0)
+    packets_min = Column(Integer)
+    packets_max = Column(Integer)
+    packets_sum = Column(Integer)
+    threats_min = Column(Integer)
+    threats_max = Column(Integer)
+    threats_sum = Column(Integer)
+    bandwidth_min = Column(Float)
+    bandwidth_max = Column(Float)
+    bandwidth_sum = Column(Float)
+    latency_min = Column(Float)
+    latency_max = Column(Float)
+    latency_sum = Column(Float)
+    latency_samples = Column(Integer, default=0)
+    
+    def to_dict(self):
+        return {
+            "bucket_start": self.bucket_start,
+            "samples": self.samples,
+            "packets": {"min": self.packets_min, "max": self.packets_max, "sum": self.packets_sum},
+            "threats": {"min": self.threats_min, "max": self.threats_max, "sum": self.threats_sum},
+            "bandwidth": {"min": self.bandwidth_min, "max": self.bandwidth_max, "sum": self.bandwidth_sum},
+            "latency": {"min": self.latency_min, "max": self.latency_max, "sum": self.latency_sum,
+                        "samples": self.latency_samples}
+        }
+
+class NetworkStatsMinute(StatsRollupColumns, Base):
+    __tablename__ = "network_stats_1m"
+
+class NetworkStatsHour(StatsRollupColumns, Base):
+    __tablename__ = "network_stats_1h"
+
 class ServerHealth(Base):
     __tablename__ = "server_health"
     
@@ -96,7 +140,7 @@ class ServerHealth(Base):
     server_name = Column(String(100))
     status = Column(String(20))
     latency = Column(Float)
-    last_check = Column(DateTime(timezone=True), server_default=func.now())
+    last_check = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     uptime = Column(Float)
     error_rate = Column(Float)
     
@@ -116,7 +160,7 @@ class LoginAttempt(Base):
     __tablename__ = "login_attempts"
     
     id = Column(Integer, primary_key=True, index=True)
-    timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    timestamp = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     username = Column(String(100))
     source_ip = Column(String(45), index=True)
     user_agent = Column(Text)
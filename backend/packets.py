@@ -0,0 +1,159 @@
+import socket
+import sys
+import time
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple, Union
+
+# IPv6 addresses are stored as ints with this bit set so they never collide with IPv4
+IPV6_FLAG = 1 << 128
+NS_PER_SECOND = 1_000_000_000
+
+# Keys the record stores as slots; anything else a packet carries rides along in `extra`
+CORE_FIELDS = ("id", "src_ip", "dst_ip", "src_port", "dst_port", "protocol", "size", "payload", "timestamp")
+OPTIONAL_FIELDS = ("method", "path", "threat_hint")
+
+def encode_ip(value: Optional[str]) -> Union[int, str, None]:
+    """IPv4/IPv6 text as an int; anything that wouldn't format back identically stays a string"""
+    if not isinstance(value, str):
+        return value
+    return _encode_text(value)
+
+# Sources repeat heavily, so most packets skip parsing entirely
+@lru_cache(maxsize=65536)
+def _encode_text(value: str) -> Union[int, str]:
+    if ":" not in value:
+        # inet_pton only accepts canonical dotted quads (no leading zeros or short forms), so no round-trip is needed
+        try:
+            return int.from_bytes(socket.inet_pton(socket.AF_INET, value), "big")
+        except OSError:
+            return value
+    try:
+        packed = socket.inet_pton(socket.AF_INET6, value)
+    except OSError:
+        return value
+    # IPv6 has many spellings of one address; only the canonical one is encoded
+    if socket.inet_ntop(socket.AF_INET6, packed) != value:
+        return value
+    return int.from_bytes(packed, "big") | IPV6_FLAG
+
+def decode_ip(value: Union[int, str, None]) -> Optional[str]:
+    if not isinstance(value, int):
+        return value
+    if value & IPV6_FLAG:
+        return socket.inet_ntop(socket.AF_INET6, (value ^ IPV6_FLAG).to_bytes(16, "big"))
+    return socket.inet_ntop(socket.AF_INET, value.to_bytes(4, "big"))
+
+def ipv4_int(value: Union[int, str, None]) -> int:
+    """Encoded address as a 32-bit int for columnar storage; 0 for IPv6 and non-addresses"""
+    return value if isinstance(value, int) and not value & IPV6_FLAG else 0
+
+def format_timestamp(timestamp_ns: int) -> str:
+    seconds, ns = divmod(timestamp_ns, NS_PER_SECOND)
+    return datetime.fromtimestamp(seconds).replace(microsecond=ns // 1000).isoformat()
+
+def parse_timestamp_ns(value: str) -> Optional[int]:
+    """Naive ISO timestamp as epoch-ns, or None if it wouldn't format back identically"""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    timestamp_ns = int(parsed.replace(microsecond=0).timestamp()) * NS_PER_SECOND + parsed.microsecond * 1000
+    return timestamp_ns if format_timestamp(timestamp_ns) == value else None
+
+class PacketRecord:
+    """Compact packet as it moves through the queue, the agents and publishing"""
+
+    __slots__ = ("id", "src_ip", "dst_ip", "src_port", "dst_port", "protocol", "size", "payload",
+                 "timestamp_ns", "method", "path", "threat_hint", "extra", "body_scan")
+
+    def __init__(self, id: str, src_ip: Union[int, str, None], dst_ip: Union[int, str, None],
+                 src_port: Optional[int], dst_port: Optional[int], protocol: Optional[str], payload: str,
+                 size: Optional[int] = None, timestamp_ns: Optional[int] = None, method: Optional[str] = None,
+                 path: Optional[str] = None, threat_hint: Optional[str] = None,
+                 extra: Optional[Dict[str, Any]] = None):
+        self.id = id
+        self.src_ip = src_ip
+        self.dst_ip = dst_ip
+        self.src_port = src_port
+        self.dst_port = dst_port
+        self.protocol = sys.intern(protocol) if isinstance(protocol, str) else protocol
+        self.payload = payload
+        self.size = len(payload) if size is None else size
+        self.timestamp_ns = time.time_ns() if timestamp_ns is None else timestamp_ns
+        self.method = method
+        self.path = path
+        self.threat_hint = threat_hint
+        self.extra = extra
+        # Per-agent rule matches from a capture-time stream scan, for bodies too large to keep in `payload`;
+        # an agent missing from it had its scan skipped
+        self.body_scan: Optional[Dict[str, Tuple[Optional[int], Optional[str], int]]] = None
+
+    @property
+    def source_ip(self) -> Optional[str]:
+        return decode_ip(self.src_ip)
+
+    @property
+    def dest_ip(self) -> Optional[str]:
+        return decode_ip(self.dst_ip)
+
+    @property
+    def timestamp(self) -> str:
+        return format_timestamp(self.timestamp_ns)
+
+    @property
+    def captured_at(self) -> datetime:
+        seconds, ns = divmod(self.timestamp_ns, NS_PER_SECOND)
+        return datetime.fromtimestamp(seconds).replace(microsecond=ns // 1000)
+
+    @classmethod
+    def from_dict(cls, packet_data: Dict[str, Any]) -> "PacketRecord":
+        """Build a record from the pipeline dict shape; `to_dict` gives the same dict back"""
+        extra = {key: value for key, value in packet_data.items()
+                 if key not in CORE_FIELDS and key not in OPTIONAL_FIELDS}
+        timestamp = packet_data.get("timestamp")
+        timestamp_ns = parse_timestamp_ns(timestamp) if timestamp is not None else time.time_ns()
+        if timestamp_ns is None:
+            # Unparseable or non-canonical timestamps are kept verbatim
+            extra["timestamp"] = timestamp
+            timestamp_ns = time.time_ns()
+        return cls(
+            id=packet_data.get("id"),
+            src_ip=encode_ip(packet_data.get("src_ip")),
+            dst_ip=encode_ip(packet_data.get("dst_ip")),
+            src_port=packet_data.get("src_port"),
+            dst_port=packet_data.get("dst_port"),
+            protocol=packet_data.get("protocol"),
+            payload=packet_data.get("payload", ""),
+            size=packet_data.get("size"),
+            timestamp_ns=timestamp_ns,
+            method=packet_data.get("method"),
+            path=packet_data.get("path"),
+            threat_hint=packet_data.get("threat_hint"),
+            extra=extra or None
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The packet as the dict the API, exports and dashboards expect"""
+        packet_data = {
+            "id": self.id,
+            "src_ip": self.source_ip,
+            "dst_ip": self.dest_ip,
+            "src_port": self.src_port,
+            "dst_port": self.dst_port,
+            "protocol": self.protocol,
+            "payload": self.payload,
+            "size": self.size,
+            "timestamp": self.timestamp
+        }
+        for field in OPTIONAL_FIELDS:
+            value = getattr(self, field)
+            if value is not None:
+                packet_data[field] = value
+        if self.extra:
+            packet_data.update(self.extra)
+        return packet_data
+
+def as_record(packet: Union[PacketRecord, Dict[str, Any]]) -> PacketRecord:
+    """Accept either form at API boundaries"""
+    return packet if isinstance(packet, PacketRecord) else PacketRecord.from_dict(packet)
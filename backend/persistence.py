@@ -0,0 +1,112 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from database import engine
+from models import LoginAttempt, PacketLog, ServerHealth, ThreatDetection
+from packets import PacketRecord
+
+logger = logging.getLogger(__name__)
+
+def parse_timestamp(value: Any) -> datetime:
+    """Packet timestamps arrive as ISO strings; fall back to now for anything else"""
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return datetime.now()
+
+class PersistenceWriter:
+    """Buffers packet, threat, login attempt and server health rows and writes them in batches off the hot path"""
+
+    def __init__(self, batch_size: int = 500, flush_interval: float = 1.0, max_buffer: int = 50000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.packets: List[Dict[str, Any]] = []
+        self.threats: List[Dict[str, Any]] = []
+        self.logins: List[Dict[str, Any]] = []
+        self.health: List[Dict[str, Any]] = []
+        self.dropped = 0
+
+    def add_packet(self, packet: PacketRecord):
+        if len(self.packets) >= self.max_buffer:
+            self.dropped += 1
+            return
+        self.packets.append({
+            "timestamp": packet.captured_at,
+            "source_ip": packet.source_ip,
+            "dest_ip": packet.dest_ip,
+            "source_port": packet.src_port,
+            "dest_port": packet.dst_port,
+            "protocol": packet.protocol,
+            "packet_size": packet.size,
+            "payload": packet.payload,
+            "flags": packet.extra.get("flags") if packet.extra else None
+        })
+
+    def add_threat(self, threat_alert: Dict[str, Any], dest_ip: Optional[str], agent_findings: List[Dict[str, Any]]):
+        if len(self.threats) >= self.max_buffer:
+            self.dropped += 1
+            return
+        origin = threat_alert.get("origin") or {}
+        self.threats.append({
+            "timestamp": parse_timestamp(threat_alert.get("timestamp")),
+            "threat_type": threat_alert["type"][:50],
+            "severity": threat_alert["severity"],
+            "confidence": threat_alert["confidence"],
+            "description": threat_alert["description"],
+            "source_ip": threat_alert["source_ip"],
+            "dest_ip": dest_ip,
+            "remediation": threat_alert["remediation"],
+            "agent_findings": agent_findings,
+            "source_country": origin.get("country"),
+            "source_asn": origin.get("asn"),
+            "source_org": origin.get("as_org")
+        })
+
+    def add_login_attempts(self, attempts: List[Dict[str, Any]]):
+        """Rows already shaped for `login_attempts`, as drained from the login monitor"""
+        room = self.max_buffer - len(self.logins)
+        self.logins.extend(attempts[:room])
+        self.dropped += max(0, len(attempts) - room)
+
+    def add_server_health(self, rows: List[Dict[str, Any]]):
+        room = self.max_buffer - len(self.health)
+        self.health.extend(rows[:room])
+        self.dropped += max(0, len(rows) - room)
+
+    async def flush(self):
+        """Write everything buffered so far in one transaction"""
+        packets, self.packets = self.packets, []
+        threats, self.threats = self.threats, []
+        logins, self.logins = self.logins, []
+        health, self.health = self.health, []
+        if not packets and not threats and not logins and not health:
+            return
+
+        async with engine.begin() as conn:
+            if packets:
+                await conn.execute(PacketLog.__table__.insert(), packets)
+            if threats:
+                await conn.execute(ThreatDetection.__table__.insert(), threats)
+            if logins:
+                await conn.execute(LoginAttempt.__table__.insert(), logins)
+            if health:
+                await conn.execute(ServerHealth.__table__.insert(), health)
+
+    async def run(self):
+        """Flush on an interval, or sooner once a batch fills up"""
+        while True:
+            try:
+                waited = 0.0
+                while waited < self.flush_interval and len(self.packets) + len(self.logins) < self.batch_size:
+                    await asyncio.sleep(0.1)
+                    waited += 0.1
+                await self.flush()
+
+            except Exception as e:
+                logger.error(f"Error persisting batch: {e}")
+                await asyncio.sleep(5)
@@ -0,0 +1,55 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func, select
+
+from database import AsyncSessionLocal
+from models import PacketLog, ThreatDetection
+
+# Longest payload returned by list endpoints, matching PacketLog.to_dict
+PAYLOAD_PREVIEW = 200
+
+def _serialize(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value.isoformat() if isinstance(value, datetime) else value for key, value in row.items()}
+
+async def fetch_dicts(query) -> List[Dict[str, Any]]:
+    """Run a Core select on a pooled async session and return plain dicts, skipping ORM identity mapping"""
+    async with AsyncSessionLocal() as session:
+        result = await session.execute(query)
+        return [_serialize(dict(row)) for row in result.mappings()]
+
+async def recent_packets(limit: int = 100, source_ip: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Most recent packet logs in PacketLog.to_dict shape"""
+    table = PacketLog.__table__
+    query = select(*table.columns).order_by(table.c.timestamp.desc()).limit(limit)
+    if source_ip:
+        query = query.where(table.c.source_ip == source_ip)
+
+    rows = await fetch_dicts(query)
+    for row in rows:
+        row["payload"] = (row["payload"] or "")[:PAYLOAD_PREVIEW]
+    return rows
+
+async def recent_threats(limit: int = 100, source_ip: Optional[str] = None,
+                         threat_type: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Most recent threat detections in ThreatDetection.to_dict shape"""
+    table = ThreatDetection.__table__
+    query = select(*table.columns).order_by(table.c.timestamp.desc()).limit(limit)
+    if source_ip:
+        query = query.where(table.c.source_ip == source_ip)
+    if threat_type:
+        query = query.where(table.c.threat_type == threat_type)
+    return await fetch_dicts(query)
+
+async def threat_origins(since: datetime, limit: int = 50) -> List[Dict[str, Any]]:
+    """Threat counts grouped by source country and ASN since a point in time"""
+    table = ThreatDetection.__table__
+    count = func.count().label("threats")
+    query = (select(table.c.source_country.label("country"), table.c.source_asn.label("asn"),
+                    func.max(table.c.source_org).label("as_org"), count,
+                    func.count(table.c.source_ip.distinct()).label("sources"))
+             .where(table.c.timestamp >= since)
+             .group_by(table.c.source_country, table.c.source_asn)
+             .order_by(count.desc())
+             .limit(limit))
+    return await fetch_dicts(query)
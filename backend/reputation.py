@@ -0,0 +1,245 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+from array import array
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from packets import IPV6_FLAG, PacketRecord, decode_ip
+
+logger = logging.getLogger(__name__)
+
+REPUTATION_DIR = os.getenv("NETSENTINEL_REPUTATION_DIR", "./reputation")
+LIST_SUFFIXES = (".txt", ".list", ".netset")
+# Confidence of a listing when the file doesn't declare one
+DEFAULT_CONFIDENCE = 60.0
+# How often list files are checked for changes
+RELOAD_INTERVAL = 30
+
+def parse_cidr(text: str) -> Optional[Tuple[int, int, int]]:
+    """'a.b.c.d/n' or an IPv6 prefix as (first, last, prefix length) in PacketRecord's int encoding"""
+    address, _, length = text.partition("/")
+    family = socket.AF_INET6 if ":" in address else socket.AF_INET
+    bits = 128 if family == socket.AF_INET6 else 32
+    try:
+        network = int.from_bytes(socket.inet_pton(family, address), "big")
+        prefix = int(length) if length else bits
+    except (OSError, ValueError):
+        return None
+    if not 0 <= prefix <= bits:
+        return None
+    host_mask = (1 << (bits - prefix)) - 1
+    first, last = network & ~host_mask, network | host_mask
+    if family == socket.AF_INET6:
+        first, last = first | IPV6_FLAG, last | IPV6_FLAG
+    return first, last, prefix
+
+class PrefixTable:
+    """Longest-prefix match over sorted, non-overlapping address intervals"""
+
+    def __init__(self, starts, ends, labels: array):
+        self.starts = starts
+        self.ends = ends
+        self.labels = labels
+
+    @classmethod
+    def build(cls, prefixes: List[Tuple[int, int, int, int]], compact: bool) -> "PrefixTable":
+        """Flatten (first, last, priority, label) prefixes; `compact` stores 32-bit arrays for IPv4"""
+        # Outer blocks sort before the blocks they contain; equal blocks by ascending priority
+        prefixes.sort(key=lambda p: (p[0], p[0] - p[1], p[2]))
+        starts, ends, labels = [], [], []
+
+        def emit(first: int, last: int, label: int):
+            if first <= last:
+                starts.append(first)
+                ends.append(last)
+                labels.append(label)
+
+        stack: List[Tuple[int, int]] = []
+        cursor = 0
+        for first, last, _, label in prefixes:
+            while stack and stack[-1][0] < first:
+                end, outer = stack.pop()
+                emit(cursor, end, outer)
+                cursor = max(cursor, end + 1)
+            if stack:
+                emit(cursor, first - 1, stack[-1][1])
+            cursor = first
+            stack.append((last, label))
+        while stack:
+            end, outer = stack.pop()
+            emit(cursor, end, outer)
+            cursor = max(cursor, end + 1)
+
+        if compact:
+            return cls(array("I", starts), array("I", ends), array("I", labels))
+        return cls(starts, ends, array("I", labels))
+
+    def lookup(self, address: int) -> Optional[int]:
+        index = bisect_right(self.starts, address) - 1
+        if index >= 0 and address <= self.ends[index]:
+            return self.labels[index]
+        return None
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+class ReputationSnapshot:
+    """One immutable load of every list file; replaced wholesale on reload"""
+
+    def __init__(self, lists: List[Dict[str, Any]], prefixes: List[Tuple[int, int, int, int]]):
+        self.lists = lists
+        # Per-prefix metadata, indexed by the label stored in the tables
+        self.prefix_list = array("H", (p[3] for p in prefixes))
+        self.prefix_length = array("B", (p[2] for p in prefixes))
+        labelled = [(first, last, lists[list_id]["confidence"], i)
+                    for i, (first, last, _, list_id) in enumerate(prefixes)]
+        self.v4 = PrefixTable.build([p for p in labelled if p[0] < IPV6_FLAG], compact=True)
+        self.v6 = PrefixTable.build([p for p in labelled if p[0] >= IPV6_FLAG], compact=False)
+
+    def lookup(self, address: int) -> Optional[Dict[str, Any]]:
+        table = self.v6 if address >= IPV6_FLAG else self.v4
+        label = table.lookup(address)
+        if label is None:
+            return None
+        listing = self.lists[self.prefix_list[label]]
+        length = self.prefix_length[label]
+        network = address & ~((1 << ((128 if address >= IPV6_FLAG else 32) - length)) - 1)
+        return {
+            "list": listing["name"],
+            "cidr": f"{decode_ip(network)}/{length}",
+            "confidence": listing["confidence"],
+            "fast_track": listing["fast_track"]
+        }
+
+class ReputationDB:
+    """CIDR blocklists loaded from a directory of list files"""
+
+    def __init__(self, directory: str = REPUTATION_DIR):
+        self.directory = directory
+        self.snapshot = ReputationSnapshot([], [])
+        self.loaded_at: Optional[float] = None
+        self.load_seconds = 0.0
+        self.invalid_lines = 0
+        self._signature: Optional[Tuple] = None
+
+    def _list_files(self) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                      if name.endswith(LIST_SUFFIXES))
+
+    def _signature_of(self, files: List[str]) -> Tuple:
+        return tuple((path, os.path.getmtime(path), os.path.getsize(path)) for path in files)
+
+    def _load_file(self, path: str, list_id: int, prefixes: List[Tuple[int, int, int, int]]) -> Dict[str, Any]:
+        listing = {
+            "name": os.path.splitext(os.path.basename(path))[0],
+            "confidence": DEFAULT_CONFIDENCE,
+            "fast_track": False,
+            "prefixes": 0
+        }
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith("#"):
+                    key, _, value = line[1:].partition(":")
+                    key, value = key.strip().lower(), value.strip().lower()
+                    if key == "confidence":
+                        listing["confidence"] = float(value)
+                    elif key == "fast-track":
+                        listing["fast_track"] = value in ("1", "true", "yes")
+                    continue
+                line = line.split("#", 1)[0].split()[0] if line else ""
+                if not line:
+                    continue
+                prefix = parse_cidr(line)
+                if prefix is None:
+                    self.invalid_lines += 1
+                    continue
+                prefixes.append((prefix[0], prefix[1], prefix[2], list_id))
+                listing["prefixes"] += 1
+        return listing
+
+    def reload(self) -> bool:
+        """Rebuild from the list files and swap the result in; blocking, so run it off the event loop"""
+        started = time.perf_counter()
+        files = self._list_files()
+        signature = self._signature_of(files)
+        self.invalid_lines = 0
+        lists, prefixes = [], []
+        for path in files:
+            try:
+                lists.append(self._load_file(path, len(lists), prefixes))
+            except (OSError, ValueError) as e:
+                logger.error(f"Error loading reputation list {path}: {e}")
+
+        self.snapshot = ReputationSnapshot(lists, prefixes)
+        self._signature = signature
+        self.loaded_at = time.time()
+        self.load_seconds = time.perf_counter() - started
+        logger.info(f"Loaded {len(prefixes)} reputation prefixes from {len(lists)} lists in {self.load_seconds:.2f}s")
+        return True
+
+    def reload_if_changed(self) -> bool:
+        if self._signature == self._signature_of(self._list_files()):
+            return False
+        return self.reload()
+
+    def lookup(self, address: Union[int, str, None]) -> Optional[Dict[str, Any]]:
+        """Listing for an address in PacketRecord encoding, or None"""
+        if not isinstance(address, int):
+            return None
+        return self.snapshot.lookup(address)
+
+    async def run(self):
+        """Pick up edited list files without a restart"""
+        while True:
+            try:
+                await asyncio.to_thread(self.reload_if_changed)
+                await asyncio.sleep(RELOAD_INTERVAL)
+
+            except Exception as e:
+                logger.error(f"Error reloading reputation lists: {e}")
+                await asyncio.sleep(RELOAD_INTERVAL)
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self.snapshot
+        return {
+            "lists": [dict(listing) for listing in snapshot.lists],
+            "ipv4_segments": len(snapshot.v4),
+            "ipv6_segments": len(snapshot.v6),
+            "invalid_lines": self.invalid_lines,
+            "loaded_at": self.loaded_at,
+            "load_seconds": self.load_seconds
+        }
+
+class ReputationAgent:
+    """Agent specialized in known-bad source addresses"""
+
+    def __init__(self, db: Optional[ReputationDB] = None):
+        self.db = db or ReputationDB()
+
+    def check(self, packet: PacketRecord) -> Dict[str, Any]:
+        listing = self.db.lookup(packet.src_ip)
+        if listing is None:
+            return {
+                "agent": "Reputation",
+                "threat_detected": False,
+                "confidence": 0,
+                "finding": "Source not on any blocklist",
+                "listing": None
+            }
+        return {
+            "agent": "Reputation",
+            "threat_detected": True,
+            "confidence": listing["confidence"],
+            "finding": f"Source {packet.source_ip} is in {listing['cidr']} on list {listing['list']}",
+            "listing": listing
+        }
+
+    async def analyze(self, packet: PacketRecord) -> Dict[str, Any]:
+        """Look up the packet's source in the loaded blocklists"""
+        return self.check(packet)
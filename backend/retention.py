@@ -0,0 +1,201 @@
+import asyncio
+import gzip
+import json
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+
+from database import sync_engine
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DIR = os.getenv("NETSENTINEL_ARCHIVE_DIR", "./archive")
+
+# table -> (time column, whether that column holds epoch seconds, TTL in seconds or None to keep forever)
+RETENTION_POLICIES = {
+    "packet_logs": ("timestamp", False, 24 * 3600),
+    "threat_detections": ("timestamp", False, 30 * 24 * 3600),
+    "network_stats": ("timestamp", False, 2 * 24 * 3600),
+    "network_stats_1m": ("bucket_start", True, 30 * 24 * 3600),
+    "network_stats_1h": ("bucket_start", True, None),
+    "server_health": ("last_check", False, 7 * 24 * 3600),
+    "login_attempts": ("timestamp", False, 30 * 24 * 3600),
+}
+
+# Rows moved per transaction; small so writers are never locked out for long
+BATCH_SIZE = 1000
+# Pause between batches to let the pipeline's writers in
+BATCH_PAUSE = 0.05
+# Start a new archive segment once the current one reaches this size
+SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+# Free pages returned to the OS per incremental vacuum step
+VACUUM_PAGES = 2000
+
+class RetentionManager:
+    """Moves expired rows into compressed, date-partitioned archive segments and keeps the hot DB small"""
+
+    def __init__(self, policies: Dict[str, tuple] = None, archive_dir: str = ARCHIVE_DIR, interval: float = 300):
+        self.policies = policies or RETENTION_POLICIES
+        self.archive_dir = archive_dir
+        self.interval = interval
+        self.archived: Dict[str, int] = {table: 0 for table in self.policies}
+        self.last_run: Optional[float] = None
+        self.last_duration = 0.0
+        # Row counts and archive size are full scans, so they are taken once per retention pass and served cached
+        self.table_rows: Dict[str, Optional[int]] = {}
+        self.archive_bytes = 0
+        self.counted_at: Optional[float] = None
+        self.vacuum_warned = False
+
+    def _segment_path(self, table: str, day: str) -> str:
+        """Current segment file for a table and day, rolling over once it is full"""
+        directory = os.path.join(self.archive_dir, table, day)
+        os.makedirs(directory, exist_ok=True)
+        segments = sorted(name for name in os.listdir(directory) if name.endswith(".ndjson.gz"))
+        if segments:
+            latest = os.path.join(directory, segments[-1])
+            if os.path.getsize(latest) < SEGMENT_MAX_BYTES:
+                return latest
+        return os.path.join(directory, f"segment-{len(segments) + 1:05d}.ndjson.gz")
+
+    def _write_segments(self, table: str, time_column: str, epoch: bool, rows: List[Dict[str, Any]]):
+        by_day: Dict[str, List[str]] = {}
+        for row in rows:
+            value = row[time_column]
+            if epoch:
+                value = datetime.fromtimestamp(value)
+            elif isinstance(value, str):
+                value = datetime.fromisoformat(value)
+            day = value.strftime("%Y-%m-%d") if value else "undated"
+            by_day.setdefault(day, []).append(json.dumps(row, default=str))
+
+        for day, lines in by_day.items():
+            # Appending a new gzip member keeps each segment a valid .gz file
+            with gzip.open(self._segment_path(table, day), "ab") as segment:
+                segment.write(("\n".join(lines) + "\n").encode())
+                segment.flush()
+                os.fsync(segment.fileobj.fileno())
+
+    def _archive_batch(self, table: str, time_column: str, epoch: bool, cutoff: float) -> int:
+        """Archive and delete one batch of expired rows; returns how many were moved"""
+        bound = int(cutoff) if epoch else datetime.fromtimestamp(cutoff)
+        with sync_engine.begin() as conn:
+            result = conn.execute(
+                text(f"SELECT * FROM {table} WHERE {time_column} < :cutoff ORDER BY {time_column} LIMIT :limit"),
+                {"cutoff": bound, "limit": BATCH_SIZE}
+            )
+            rows = [dict(row._mapping) for row in result]
+            if not rows:
+                return 0
+
+            # Archive first: a crash before the delete only means the batch is archived twice
+            self._write_segments(table, time_column, epoch, rows)
+
+            key = "bucket_start" if epoch else "id"
+            keys = ",".join(str(int(row[key])) for row in rows)
+            conn.execute(text(f"DELETE FROM {table} WHERE {key} IN ({keys})"))
+        return len(rows)
+
+    def _prune_table(self, table: str) -> int:
+        time_column, epoch, ttl = self.policies[table]
+        if ttl is None:
+            return 0
+        cutoff = time.time() - ttl
+        moved = 0
+        while True:
+            count = self._archive_batch(table, time_column, epoch, cutoff)
+            moved += count
+            if count < BATCH_SIZE:
+                return moved
+            time.sleep(BATCH_PAUSE)
+
+    def _incremental_vacuum(self):
+        with sync_engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            mode = conn.exec_driver_sql("PRAGMA auto_vacuum").scalar()
+            if mode != 2:
+                # Converting takes a full VACUUM, which can't run under the pipeline's writers on this engine
+                if not self.vacuum_warned:
+                    logger.warning("auto_vacuum is not INCREMENTAL; run VACUUM manually during a quiet period")
+                    self.vacuum_warned = True
+                return
+            # Each step of this pragma frees one page, so drain it on the raw cursor
+            cursor = conn.connection.cursor()
+            cursor.execute(f"PRAGMA incremental_vacuum({VACUUM_PAGES})")
+            cursor.fetchall()
+            cursor.close()
+
+    def run_once(self) -> Dict[str, int]:
+        """One retention pass over every table; blocking, so call it from a worker thread"""
+        started = time.time()
+        moved = {}
+        for table in self.policies:
+            try:
+                moved[table] = self._prune_table(table)
+                self.archived[table] += moved[table]
+            except Exception as e:
+                logger.error(f"Error pruning {table}: {e}")
+        try:
+            self._incremental_vacuum()
+        except Exception as e:
+            logger.error(f"Error vacuuming database: {e}")
+        self._count_rows()
+        self.last_run = started
+        self.last_duration = time.time() - started
+        if any(moved.values()):
+            logger.info(f"Retention archived rows: {moved}")
+        return moved
+
+    async def run(self):
+        """Run retention passes in a worker thread on an interval"""
+        while True:
+            try:
+                await asyncio.to_thread(self.run_once)
+                await asyncio.sleep(self.interval)
+
+            except Exception as e:
+                logger.error(f"Error in retention manager: {e}")
+                await asyncio.sleep(self.interval)
+
+    def _archive_bytes(self) -> int:
+        total = 0
+        for root, _, files in os.walk(self.archive_dir):
+            for name in files:
+                total += os.path.getsize(os.path.join(root, name))
+        return total
+
+    def _count_rows(self):
+        rows = {}
+        with sync_engine.connect() as conn:
+            for table in self.policies:
+                try:
+                    rows[table] = conn.exec_driver_sql(f"SELECT COUNT(*) FROM {table}").scalar()
+                except Exception:
+                    rows[table] = None
+        self.table_rows = rows
+        self.archive_bytes = self._archive_bytes()
+        self.counted_at = time.time()
+
+    @staticmethod
+    def _database_sizes(conn) -> Dict[str, int]:
+        page_size = conn.exec_driver_sql("PRAGMA page_size").scalar()
+        page_count = conn.exec_driver_sql("PRAGMA page_count").scalar()
+        freelist = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+        return {"database_bytes": page_size * page_count, "free_bytes": page_size * freelist, "page_size": page_size}
+
+    def storage_metrics(self) -> Dict[str, Any]:
+        """Database and archive sizes plus per-table row counts as of the last retention pass"""
+        with sync_engine.connect() as conn:
+            sizes = self._database_sizes(conn)
+        return {
+            **sizes,
+            "archive_bytes": self.archive_bytes,
+            "table_rows": dict(self.table_rows),
+            "rows_counted_at": datetime.fromtimestamp(self.counted_at).isoformat() if self.counted_at else None,
+            "archived_rows": dict(self.archived),
+            "last_run": datetime.fromtimestamp(self.last_run).isoformat() if self.last_run else None,
+            "last_run_seconds": self.last_duration
+        }
@@ -0,0 +1,210 @@
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from database import engine
+from models import NetworkStats, NetworkStatsMinute, NetworkStatsHour
+
+logger = logging.getLogger(__name__)
+
+METRICS = ("packets", "threats", "bandwidth", "latency")
+# Raw per-second rows are only read for ranges shorter than this
+MAX_RAW_RANGE_SECONDS = 6 * 3600
+# Default number of points returned when no step is given
+DEFAULT_POINTS = 300
+
+class RollupBucket:
+    """Running min/max/sum of per-second samples for one rollup interval"""
+
+    def __init__(self, start: int):
+        self.start = start
+        self.samples = 0
+        self.latency_samples = 0
+        self.values: Dict[str, List[float]] = {}
+
+    def add(self, sample: Dict[str, Any]):
+        self.samples += 1
+        for metric in METRICS:
+            value = sample[metric]
+            if value is None:
+                continue
+            if metric == "latency":
+                self.latency_samples += 1
+            current = self.values.get(metric)
+            if current is None:
+                self.values[metric] = [value, value, value]
+            else:
+                current[0] = min(current[0], value)
+                current[1] = max(current[1], value)
+                current[2] += value
+
+    def to_row(self) -> Dict[str, Any]:
+        row = {"bucket_start": self.start, "samples": self.samples, "latency_samples": self.latency_samples}
+        for metric in METRICS:
+            low, high, total = self.values.get(metric, (None, None, None))
+            row[f"{metric}_min"] = low
+            row[f"{metric}_max"] = high
+            row[f"{metric}_sum"] = total
+        return row
+
+class StatsRollup:
+    """Collects per-second pipeline samples and downsamples them into 1m and 1h rollups"""
+
+    def __init__(self):
+        self.packets = 0
+        self.threats = 0
+        self.bytes = 0
+        self.latency_total = 0.0
+        self.latency_count = 0
+        self.minute: Optional[RollupBucket] = None
+        self.raw_samples: List[Dict[str, Any]] = []
+
+    def record_packet(self, size: int):
+        self.packets += 1
+        self.bytes += size or 0
+
+    def record_threat(self):
+        self.threats += 1
+
+    def record_latency(self, seconds: float):
+        self.latency_total += seconds * 1000
+        self.latency_count += 1
+
+    def sample(self, active_connections: int, now: Optional[float] = None) -> Optional[RollupBucket]:
+        """Take this second's sample; returns the finished minute bucket when one closes"""
+        now = now if now is not None else time.time()
+        sample = {
+            "packets": self.packets,
+            "threats": self.threats,
+            "bandwidth": float(self.bytes),
+            "latency": self.latency_total / self.latency_count if self.latency_count else None
+        }
+        self.packets = self.threats = self.bytes = self.latency_count = 0
+        self.latency_total = 0.0
+
+        self.raw_samples.append({
+            "timestamp": datetime.fromtimestamp(now),
+            "packets_analyzed": sample["packets"],
+            "threats_detected": sample["threats"],
+            "bandwidth_in": sample["bandwidth"],
+            "active_connections": active_connections,
+            "latency": sample["latency"]
+        })
+
+        minute_start = int(now) // 60 * 60
+        closed = None
+        if self.minute is not None and self.minute.start != minute_start:
+            closed = self.minute
+            self.minute = None
+        if self.minute is None:
+            self.minute = RollupBucket(minute_start)
+        self.minute.add(sample)
+        return closed
+
+    async def write(self, minute: Optional[RollupBucket]):
+        """Persist buffered raw samples and merge a finished minute into both rollup tables"""
+        raw, self.raw_samples = self.raw_samples, []
+        async with engine.begin() as conn:
+            if raw:
+                await conn.execute(NetworkStats.__table__.insert(), raw)
+            if minute and minute.samples:
+                row = minute.to_row()
+                await conn.execute(_merge_rollup(NetworkStatsMinute, row))
+                await conn.execute(_merge_rollup(NetworkStatsHour, dict(row, bucket_start=minute.start // 3600 * 3600)))
+
+def _merge_rollup(model, row: Dict[str, Any]):
+    """Upsert that folds a bucket into any existing row for the same interval"""
+    table = model.__table__
+    insert = sqlite_insert(table).values(**row)
+    excluded = insert.excluded
+    updates = {
+        "samples": table.c.samples + excluded.samples,
+        "latency_samples": table.c.latency_samples + excluded.latency_samples
+    }
+    for metric in METRICS:
+        low, high, total = (f"{metric}_min", f"{metric}_max", f"{metric}_sum")
+        updates[low] = func.coalesce(func.min(table.c[low], excluded[low]), table.c[low], excluded[low])
+        updates[high] = func.coalesce(func.max(table.c[high], excluded[high]), table.c[high], excluded[high])
+        updates[total] = func.coalesce(table.c[total], 0) + func.coalesce(excluded[total], 0)
+    return insert.on_conflict_do_update(index_elements=[table.c.bucket_start], set_=updates)
+
+def _summary(samples: int, latency_samples: int, values: Dict[str, tuple]) -> Dict[str, Any]:
+    point = {}
+    for metric in METRICS:
+        low, high, total = values[metric]
+        count = latency_samples if metric == "latency" else samples
+        point[metric] = {
+            "min": low,
+            "max": high,
+            "avg": total / count if count and total is not None else None,
+            "sum": total
+        }
+    return point
+
+async def query_history(start: datetime, end: datetime, step: Optional[int] = None) -> Dict[str, Any]:
+    """Stats between start and end grouped into `step`-second points, read from the coarsest table that fits"""
+    start_ts, end_ts = int(start.timestamp()), int(end.timestamp())
+    span = max(1, end_ts - start_ts)
+    step = step or max(1, span // DEFAULT_POINTS)
+    if step < 60 and span > MAX_RAW_RANGE_SECONDS:
+        step = 60
+
+    if step >= 3600:
+        return await _query_rollup(NetworkStatsHour, start_ts, end_ts, step // 3600 * 3600)
+    if step >= 60:
+        return await _query_rollup(NetworkStatsMinute, start_ts, end_ts, step // 60 * 60)
+    return await _query_raw(start, end, step)
+
+async def _query_rollup(model, start_ts: int, end_ts: int, step: int) -> Dict[str, Any]:
+    table = model.__table__
+    bucket = ((table.c.bucket_start // step) * step).label("bucket")
+    columns = [bucket, func.sum(table.c.samples), func.sum(table.c.latency_samples)]
+    for metric in METRICS:
+        columns += [func.min(table.c[f"{metric}_min"]), func.max(table.c[f"{metric}_max"]),
+                    func.sum(table.c[f"{metric}_sum"])]
+    query = (select(*columns)
+             .where(table.c.bucket_start >= start_ts // step * step, table.c.bucket_start < end_ts)
+             .group_by(bucket)
+             .order_by(bucket))
+
+    async with engine.connect() as conn:
+        rows = (await conn.execute(query)).all()
+
+    points = []
+    for row in rows:
+        values = {metric: tuple(row[3 + i * 3:6 + i * 3]) for i, metric in enumerate(METRICS)}
+        point = _summary(row[1], row[2], values)
+        point["timestamp"] = datetime.fromtimestamp(row[0]).isoformat()
+        points.append(point)
+    return {"source": table.name, "step": step, "points": points}
+
+async def _query_raw(start: datetime, end: datetime, step: int) -> Dict[str, Any]:
+    table = NetworkStats.__table__
+    query = (select(table.c.timestamp, table.c.packets_analyzed, table.c.threats_detected,
+                    table.c.bandwidth_in, table.c.latency)
+             .where(table.c.timestamp >= start, table.c.timestamp < end)
+             .order_by(table.c.timestamp))
+
+    async with engine.connect() as conn:
+        rows = (await conn.execute(query)).all()
+
+    buckets: Dict[int, RollupBucket] = {}
+    for timestamp, packets, threats, bandwidth, latency in rows:
+        bucket_start = int(timestamp.timestamp()) // step * step
+        bucket = buckets.get(bucket_start)
+        if bucket is None:
+            bucket = buckets[bucket_start] = RollupBucket(bucket_start)
+        bucket.add({"packets": packets, "threats": threats, "bandwidth": bandwidth, "latency": latency})
+
+    points = []
+    for bucket_start in sorted(buckets):
+        bucket = buckets[bucket_start]
+        values = {metric: tuple(bucket.values.get(metric, (None, None, None))) for metric in METRICS}
+        point = _summary(bucket.samples, bucket.latency_samples, values)
+        point["timestamp"] = datetime.fromtimestamp(bucket_start).isoformat()
+        points.append(point)
+    return {"source": table.name, "step": step, "points": points}
@@ -0,0 +1,366 @@
+import codecs
+import os
+import re
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Payload bytes any one rule examines; anything past this is reported as a truncated scan
+MAX_SCAN_BYTES = 256 * 1024
+# Rules scan this much at a time and check their time budget in between
+SCAN_WINDOW = 16 * 1024
+# CPU time one rule may spend on one payload before it is abandoned as truncated
+RULE_BUDGET_SECONDS = 0.005
+# CPU time a whole rule set may spend on one payload; rules not reached by then count as truncated
+PAYLOAD_BUDGET_SECONDS = 0.02
+# Longest text a single stage is expected to match; consecutive windows overlap by this much
+DEFAULT_SPAN = 256
+# Body bytes a streaming scan follows; anything past this is reported as a truncated scan
+STREAM_MAX_BYTES = 4 * 1024 * 1024
+# CPU time one rule, and a whole rule set, may spend on one streamed body; a set scans ordinary text at up to
+# ~175 ms per MB with its costliest rule at ~60, so a full-size body fits with room for a slower host
+STREAM_RULE_BUDGET_SECONDS = 0.6
+STREAM_BUDGET_SECONDS = 1.5
+# Evaluations and hits are always counted; scan time and bytes are timed on one payload in this many (0 disables)
+PROFILE_SAMPLE_EVERY = int(os.getenv("NETSENTINEL_RULE_PROFILE_SAMPLE", "16"))
+
+# Raw per-rule counters; these add up across rule set copies in different processes
+PROFILE_COUNTERS = ("evaluations", "hits", "truncated", "sampled", "seconds", "max_seconds", "bytes")
+
+class Rule:
+    """A detection rule as regex stages that must match in order"""
+
+    __slots__ = ("name", "stages", "barriers", "lead", "span")
+
+    def __init__(self, name: str, stages: Sequence[str], barriers: Sequence[Optional[str]] = (),
+                 lead: Optional[str] = None, span: int = DEFAULT_SPAN):
+        self.name = name
+        self.stages = [re.compile(stage, re.IGNORECASE) for stage in stages]
+        self.barriers = [re.compile(b) if b else None for b in barriers]
+        self.barriers += [None] * (len(self.stages) - 1 - len(self.barriers))
+        self.lead = re.compile(lead) if lead else None
+        self.span = span
+
+class RuleState:
+    """Progress of one rule through a payload, carried from window to window"""
+
+    __slots__ = ("ends", "clear", "leading", "parts", "pending", "cursor", "tail", "elapsed")
+
+    def __init__(self):
+        # The per-stage lists are only set up once the first stage matches, which most text never does
+        self.ends: Optional[List[Optional[int]]] = None
+        self.tail = ""
+        self.elapsed = 0.0
+
+    def begin(self, count: int):
+        # Per stage: where the latest partial match through it ended (None once its gap hit a barrier), where that
+        # gap's barrier starts to apply, and whether the gap's lead run may go on into the next window
+        self.ends = [None] * count
+        self.clear = [0] * count
+        self.leading = [False] * count
+        self.parts: List[Tuple[str, ...]] = [()] * count
+        self.pending: List[List[Tuple[int, Tuple[str, ...]]]] = [[] for _ in range(count)]
+        self.cursor = [0] * count
+
+def _search(cache: list, k: int, pattern: "re.Pattern", text: str, pos: int) -> Optional["re.Match"]:
+    """First match of `pattern` starting at or after `pos`, reusing the last search while it still answers"""
+    pos = max(pos, 0)
+    hit = cache[k]
+    if hit is None or hit[0] > pos or (hit[1] is not None and hit[1].start() < pos):
+        hit = cache[k] = (pos, pattern.search(text, pos))
+    return hit[1]
+
+def advance(rule: Rule, state: RuleState, window: str, final: bool = False) -> Optional[str]:
+    """Feed the next window of text; returns the matched text once every stage has matched in order"""
+    text = state.tail + window
+    stages = rule.stages
+    last = len(stages) - 1
+    if not last:
+        match = stages[0].search(text)
+        if match is not None:
+            return match.group()
+        state.tail = text[max(0, len(text) - rule.span + 1):]
+        return None
+    horizon = len(text) if final else max(0, len(text) - rule.span + 1)
+    found: list = [None] * (last + 1)
+    if state.ends is None:
+        first = stages[0].search(text)
+        if first is None or final and stages[last].search(text, first.end()) is None:
+            state.tail = text[horizon:]
+            return None
+        state.begin(last + 1)
+        found[0] = (0, first)
+    ends, clear, leading, parts, pending, cursor = (state.ends, state.clear, state.leading, state.parts,
+                                                    state.pending, state.cursor)
+    for k in range(last):
+        if leading[k] and ends[k] is not None:
+            clear[k] = rule.lead.match(text, max(clear[k], 0)).end()
+            leading[k] = clear[k] == len(text) and not final
+    blocked: list = [None] * (last + 1)
+    while True:
+        # Next event as (position, order, stage, match): at one position a partial match is adopted
+        # before a stage may start from it, and a stage may start at a barrier itself
+        event = None
+        for k in range(last + 1):
+            if pending[k] and (event is None or pending[k][0][0] < event[0]):
+                event = (pending[k][0][0], 0, k, None)
+            if k and ends[k - 1] is None:
+                continue
+            match = _search(found, k, stages[k], text, max(ends[k - 1], cursor[k]) if k else cursor[0])
+            if match is not None and (event is None or (match.start(), 1) < event[:2]):
+                event = (match.start(), 1, k, match)
+            barrier = rule.barriers[k - 1] if k else None
+            if barrier is not None:
+                hit = _search(blocked, k, barrier, text, clear[k - 1])
+                if hit is not None and (event is None or (hit.start(), 2) < event[:2]):
+                    event = (hit.start(), 2, k, None)
+        if event is None or event[0] >= horizon:
+            break
+        position, order, k, match = event
+        if order == 0:
+            ends[k], parts[k] = pending[k].pop(0)
+            clear[k] = ends[k]
+            if rule.lead is not None:
+                clear[k] = rule.lead.match(text, ends[k]).end()
+                leading[k] = clear[k] == len(text) and not final
+        elif order == 1:
+            matched = (parts[k - 1] if k else ()) + (match.group(),)
+            if k == last:
+                return " ... ".join(matched)
+            pending[k].append((match.end(), matched))
+            # The next match of this stage may begin on the whitespace this one ends with, as two
+            # matches of `\s+FROM\s` do in "a FROM FROM", so it can start before this one is adopted
+            cursor[k] = match.start() + max(1, len(match.group().rstrip()))
+        else:
+            ends[k - 1] = None
+    # Everything before the horizon has been taken; keep the rest for the next window
+    state.tail = text[horizon:]
+    for k in range(last + 1):
+        cursor[k] -= horizon
+        if ends[k] is not None:
+            ends[k] -= horizon
+            clear[k] -= horizon
+        pending[k] = [(end - horizon, matched) for end, matched in pending[k]]
+    return None
+
+class RuleProfile:
+    """Hit and cost counters for one rule"""
+
+    __slots__ = PROFILE_COUNTERS
+
+    def __init__(self):
+        self.evaluations = 0
+        self.hits = 0
+        self.truncated = 0
+        self.sampled = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.bytes = 0
+
+class RuleSet:
+    """Ordered rules with byte and time budgets per rule and per payload"""
+
+    def __init__(self, rules: List[Rule], max_bytes: int = MAX_SCAN_BYTES, budget: float = RULE_BUDGET_SECONDS,
+                 payload_budget: float = PAYLOAD_BUDGET_SECONDS, window: int = SCAN_WINDOW,
+                 sample_every: int = PROFILE_SAMPLE_EVERY):
+        self.rules = rules
+        self.max_bytes = max_bytes
+        self.budget = budget
+        self.payload_budget = payload_budget
+        self.window = window
+        self.sample_every = sample_every
+        self.truncated = 0
+        self.payloads = 0
+        self.profiles = [RuleProfile() for _ in rules]
+
+    def match_rule(self, rule: Rule, payload: str) -> Tuple[Optional[str], bool]:
+        """(matched text or None, whether the scan was cut short by a budget)"""
+        state = RuleState()
+        end = min(len(payload), self.max_bytes)
+        for start in range(0, end, self.window):
+            stop = min(end, start + self.window)
+            started = time.thread_time()
+            found = advance(rule, state, payload[start:stop], final=stop == end)
+            state.elapsed += time.thread_time() - started
+            if found is not None:
+                return found, False
+            if state.elapsed > self.budget and start + self.window < end:
+                return None, True
+        return None, len(payload) > self.max_bytes
+
+    def first_match(self, payload: str) -> Tuple[Optional[Rule], Optional[str], int]:
+        """First rule that matches, its matched text, and how many rules were truncated before it"""
+        truncated = 0
+        self.payloads += 1
+        sampled = self.sample_every and self.payloads % self.sample_every == 0
+        scanned = min(len(payload), self.max_bytes)
+        deadline = time.thread_time() + self.payload_budget
+        for i, rule in enumerate(self.rules):
+            if time.thread_time() > deadline:
+                truncated += len(self.rules) - i
+                break
+            profile = self.profiles[i]
+            profile.evaluations += 1
+            if sampled:
+                started = time.thread_time()
+                found, cut = self.match_rule(rule, payload)
+                elapsed = time.thread_time() - started
+                profile.sampled += 1
+                profile.seconds += elapsed
+                profile.bytes += scanned
+                if elapsed > profile.max_seconds:
+                    profile.max_seconds = elapsed
+            else:
+                found, cut = self.match_rule(rule, payload)
+            if found is not None:
+                profile.hits += 1
+                self.truncated += truncated
+                return rule, found, truncated
+            profile.truncated += cut
+            truncated += cut
+        self.truncated += truncated
+        return None, None, truncated
+
+    def stream(self, **kwargs) -> "StreamScan":
+        """A scan of one body fed in chunks; see StreamScan"""
+        return StreamScan(self, **kwargs)
+
+    def counters(self) -> Dict[str, Any]:
+        """Raw profile counters, picklable so detection shards can report theirs"""
+        return {
+            "payloads": self.payloads,
+            "sample_every": self.sample_every,
+            "rules": [dict(rule=rule.name, **{name: getattr(profile, name) for name in PROFILE_COUNTERS})
+                      for rule, profile in zip(self.rules, self.profiles)]
+        }
+
+class StreamScan:
+    """A rule set matched against a body that arrives in chunks, without keeping the body"""
+
+    def __init__(self, rule_set: RuleSet, max_bytes: int = STREAM_MAX_BYTES,
+                 budget: float = STREAM_RULE_BUDGET_SECONDS, stream_budget: float = STREAM_BUDGET_SECONDS):
+        self.rule_set = rule_set
+        self.max_bytes = max_bytes
+        self.budget = budget
+        self.stream_budget = stream_budget
+        self.states = [RuleState() for _ in rule_set.rules]
+        self.active = list(range(len(rule_set.rules)))
+        self.cut: List[int] = []
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self.bytes = 0
+        self.elapsed = 0.0
+        self.match: Optional[Tuple[int, str]] = None
+        self.result: Optional[Tuple[Optional[int], Optional[str], int]] = None
+
+    @property
+    def decided(self) -> bool:
+        """True once more input can't change the outcome"""
+        return self.match is not None or not self.active
+
+    def feed(self, chunk: bytes, final: bool = False) -> bool:
+        """Scan the next chunk of the body; returns `decided`"""
+        if self.decided:
+            return True
+        overflow = len(chunk) > self.max_bytes - self.bytes
+        if overflow:
+            chunk = chunk[:self.max_bytes - self.bytes]
+            final = True
+        self.bytes += len(chunk)
+        text = self.decoder.decode(chunk, final)
+        rules = self.rule_set.rules
+        size = self.rule_set.window
+        # The final call still runs once on no text, to take what the rules held back for more
+        for start in range(0, len(text) or final, size):
+            window = text[start:start + size]
+            last = final and start + size >= len(text)
+            hits = []
+            for i in list(self.active):
+                state = self.states[i]
+                started = time.thread_time()
+                found = advance(rules[i], state, window, last)
+                elapsed = time.thread_time() - started
+                state.elapsed += elapsed
+                self.elapsed += elapsed
+                if found is not None:
+                    hits.append((i, found))
+                elif state.elapsed > self.budget:
+                    self._truncate([i])
+                if self.elapsed > self.stream_budget:
+                    break
+            if hits:
+                # The earliest rule matching in this window, which may not be the first to match the whole body
+                self.match = min(hits)
+                return True
+            if self.elapsed > self.stream_budget:
+                self._truncate(list(self.active))
+                return True
+        if overflow and self.active:
+            # The body runs past max_bytes: rules still looking never saw the rest
+            self._truncate(list(self.active))
+        return self.decided
+
+    def _truncate(self, indexes: List[int]):
+        for i in indexes:
+            self.active.remove(i)
+            self.cut.append(i)
+
+    def close(self) -> Tuple[Optional[int], Optional[str], int]:
+        """(index of the matching rule or None, matched text, rules truncated before it); records the profile once"""
+        if self.result is not None:
+            return self.result
+        self.feed(b"", final=True)
+        index, matched = self.match if self.match is not None else (None, None)
+        truncated = sum(1 for i in self.cut if index is None or i < index)
+        rule_set = self.rule_set
+        rule_set.payloads += 1
+        rule_set.truncated += truncated
+        # Streamed bodies are rare and already timed for the budget, so every one is profiled
+        for i, (state, profile) in enumerate(zip(self.states, rule_set.profiles)):
+            profile.evaluations += 1
+            profile.sampled += 1
+            profile.seconds += state.elapsed
+            profile.max_seconds = max(profile.max_seconds, state.elapsed)
+            profile.bytes += self.bytes
+            profile.truncated += i in self.cut
+        if index is not None:
+            rule_set.profiles[index].hits += 1
+        self.result = (index, matched, truncated)
+        return self.result
+
+def merge_counters(copies: Iterable[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Add up the counters of copies of one rule set, e.g. one per detection shard"""
+    merged = None
+    for copy in copies:
+        if merged is None:
+            merged = {"payloads": 0, "sample_every": copy["sample_every"],
+                      "rules": [dict(rule=rule["rule"], **{name: 0 for name in PROFILE_COUNTERS})
+                                for rule in copy["rules"]]}
+        merged["payloads"] += copy["payloads"]
+        for total, rule in zip(merged["rules"], copy["rules"]):
+            for name in PROFILE_COUNTERS:
+                if name == "max_seconds":
+                    total[name] = max(total[name], rule[name])
+                else:
+                    total[name] += rule[name]
+    return merged
+
+def profile_report(counters: Dict[str, Any]) -> Dict[str, Any]:
+    """Per-rule hit rate and cost, with sampled time and bytes scaled up to every evaluation"""
+    rules = []
+    for rule in counters["rules"]:
+        scale = rule["evaluations"] / rule["sampled"] if rule["sampled"] else 0.0
+        rules.append({
+            "rule": rule["rule"],
+            "evaluations": rule["evaluations"],
+            "hits": rule["hits"],
+            "hit_rate": round(rule["hits"] / rule["evaluations"], 6) if rule["evaluations"] else 0.0,
+            "truncated": rule["truncated"],
+            "sampled": rule["sampled"],
+            "avg_us": round(1e6 * rule["seconds"] / rule["sampled"], 2) if rule["sampled"] else None,
+            "max_us": round(1e6 * rule["max_seconds"], 2),
+            "est_seconds": round(rule["seconds"] * scale, 6),
+            "est_bytes": int(rule["bytes"] * scale)
+        })
+    return {"payloads": counters["payloads"], "sample_every": counters["sample_every"], "rules": rules}
+
+def truncated_finding(truncated: int) -> str:
+    return f"Scan truncated: {truncated} rule{'s' if truncated != 1 else ''} hit the scan size or time budget"
@@ -0,0 +1,230 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import time
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SCENARIO_DIR = os.getenv("NETSENTINEL_SCENARIO_DIR", "./scenarios")
+
+# Scheduling resolution: events due within one tick are sent together
+DEFAULT_TICK = 0.05
+# Pre-serialized variants per event kind and phase; events are drawn from these pools
+POOL_SIZE = 512
+# Frames built ahead of the send schedule, in seconds, so generation never sits on the send path
+LOOKAHEAD_SECONDS = 1.0
+# Hard ceiling on a phase's rate, in events per second
+MAX_RATE = 100000
+
+# Event kinds a phase's mix can weight, and the WebSocketServer generator for each
+EVENT_GENERATORS = {
+    "normal": "generate_normal_traffic",
+    "sql_injection": "generate_sql_injection",
+    "xss": "generate_xss_attack",
+    "ddos": "generate_ddos_packet"
+}
+
+def rate_curve(spec: Dict[str, Any], duration: float) -> Callable[[float], float]:
+    """Events per second at `t` seconds into a phase"""
+    curve = spec.get("curve", "constant")
+    if curve == "constant":
+        rate = float(spec["rate"])
+        return lambda t: rate
+    if curve == "ramp":
+        start, end = float(spec["from"]), float(spec["to"])
+        return lambda t: start + (end - start) * min(1.0, t / duration) if duration else end
+    if curve == "step":
+        steps = sorted((float(at), float(rate)) for at, rate in spec["steps"])
+        starts = [at for at, _ in steps]
+        return lambda t: steps[max(0, bisect_right(starts, t) - 1)][1]
+    if curve == "sine":
+        base, amplitude, period = float(spec["base"]), float(spec["amplitude"]), float(spec["period"])
+        phase = float(spec.get("phase", 0))
+        return lambda t: base + amplitude * math.sin(2 * math.pi * (t / period + phase))
+    raise ValueError(f"Unknown rate curve {curve}")
+
+class Scenario:
+    """A timeline of phases, each with a duration, a rate curve and a traffic mix"""
+
+    def __init__(self, spec: Dict[str, Any], seed: Optional[int] = None):
+        self.name = spec.get("name", "scenario")
+        self.seed = seed if seed is not None else spec.get("seed", 0)
+        self.tick = spec.get("tick_ms", DEFAULT_TICK * 1000) / 1000
+        self.loop = spec.get("loop", False)
+        self.phases = []
+        for phase in spec["phases"]:
+            mix = {kind: float(weight) for kind, weight in phase.get("mix", {"normal": 1}).items() if weight}
+            unknown = set(mix) - set(EVENT_GENERATORS)
+            if unknown:
+                raise ValueError(f"Unknown event kinds in phase {phase.get('name')}: {sorted(unknown)}")
+            duration = float(phase["duration"])
+            self.phases.append({
+                "name": phase.get("name", f"phase{len(self.phases) + 1}"),
+                "duration": duration,
+                "rate": rate_curve(phase["rate"], duration),
+                "mix": mix
+            })
+        if not self.phases:
+            raise ValueError("A scenario needs at least one phase")
+        self.duration = sum(phase["duration"] for phase in self.phases)
+
+    @classmethod
+    def load(cls, name_or_path: str, seed: Optional[int] = None) -> "Scenario":
+        """Load a scenario by file path or by name from SCENARIO_DIR"""
+        path = name_or_path
+        if not os.path.exists(path):
+            path = os.path.join(SCENARIO_DIR, f"{name_or_path}.json")
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f), seed)
+
+def available_scenarios() -> List[str]:
+    if not os.path.isdir(SCENARIO_DIR):
+        return []
+    return sorted(name[:-5] for name in os.listdir(SCENARIO_DIR) if name.endswith(".json"))
+
+class ScenarioEngine:
+    """Plays a scenario against a WebSocketServer at the scripted rates"""
+
+    def __init__(self, server, scenario: Scenario, batch: bool = True):
+        self.server = server
+        self.scenario = scenario
+        self.batch = batch
+        self.rng = random.Random(scenario.seed)
+        self._pools: Dict[Tuple[int, str], List[Tuple[str, str]]] = {}
+        self._carry = 0.0
+        self._event_id = 0
+        self.events_sent = 0
+        self.ticks_sent = 0
+        self.max_lag = 0.0
+        self.phase_name: Optional[str] = None
+        self.running = False
+
+    def _pool(self, phase_index: int, kind: str) -> List[Tuple[str, str]]:
+        """(message prefix, body) variants for an event kind; id and timestamp are filled in per event"""
+        key = (phase_index, kind)
+        if key not in self._pools:
+            generator = getattr(self.server, EVENT_GENERATORS[kind])
+            pool = []
+            for _ in range(POOL_SIZE):
+                message = generator(self.rng)
+                data = {k: v for k, v in message["data"].items() if k not in ("id", "timestamp")}
+                pool.append((f'{{"type":"{message["type"]}","data":{{"id":', json.dumps(data, separators=(",", ":"))[1:]))
+            self._pools[key] = pool
+        return self._pools[key]
+
+    def _locate(self, t: float) -> Optional[Tuple[int, float]]:
+        """(phase index, seconds into the phase) at scenario time t"""
+        if self.scenario.loop:
+            t %= self.scenario.duration
+        for index, phase in enumerate(self.scenario.phases):
+            if t < phase["duration"]:
+                return index, t
+            t -= phase["duration"]
+        return None
+
+    def build_tick(self, tick: int, started_at: datetime) -> Optional[Tuple[int, List[str]]]:
+        """Messages for one tick as (phase index, serialized messages), or None once the scenario has ended"""
+        located = self._locate(tick * self.scenario.tick)
+        if located is None:
+            return None
+        index, offset = located
+        phase = self.scenario.phases[index]
+        rate = min(MAX_RATE, max(0.0, phase["rate"](offset)))
+        expected = rate * self.scenario.tick + self._carry
+        count = int(expected)
+        self._carry = expected - count
+        if not count:
+            return index, []
+
+        kinds = list(phase["mix"])
+        chosen = self.rng.choices(kinds, weights=[phase["mix"][kind] for kind in kinds], k=count)
+        variants = self.rng.choices(range(POOL_SIZE), k=count)
+        timestamp = (started_at + timedelta(seconds=tick * self.scenario.tick)).isoformat()
+        pools = {kind: self._pool(index, kind) for kind in kinds}
+        messages = []
+        for kind, variant in zip(chosen, variants):
+            self._event_id += 1
+            prefix, body = pools[kind][variant]
+            messages.append(f'{prefix}{self._event_id},"timestamp":"{timestamp}",{body}}}')
+        return index, messages
+
+    def _build_chunk(self, first_tick: int, ticks: int, started_at: datetime) -> List[Tuple[int, int, List[str]]]:
+        """Frames for a run of ticks; shorter than `ticks` once the scenario has ended"""
+        frames = []
+        for tick in range(first_tick, first_tick + ticks):
+            built = self.build_tick(tick, started_at)
+            if built is None:
+                break
+            frames.append((tick, built[0], built[1]))
+        return frames
+
+    def _frame_text(self, messages: List[str]) -> List[str]:
+        if not self.batch:
+            return messages
+        return ['{"type":"batch","data":[' + ",".join(messages) + "]}"]
+
+    async def _produce(self, queue: asyncio.Queue, chunk: int, started_at: datetime):
+        tick = 0
+        try:
+            while self.running:
+                frames = await asyncio.to_thread(self._build_chunk, tick, chunk, started_at)
+                for frame in frames:
+                    await queue.put(frame)
+                if len(frames) < chunk:
+                    break
+                tick += chunk
+        finally:
+            await queue.put(None)
+
+    async def run(self):
+        """Play the scenario to its end, or until stopped for looping scenarios"""
+        self.running = True
+        tick_seconds = self.scenario.tick
+        chunk = max(1, int(LOOKAHEAD_SECONDS / tick_seconds))
+        # Bounded so the producer stays at most two chunks ahead of the schedule
+        queue: asyncio.Queue = asyncio.Queue(maxsize=2 * chunk)
+        producer = asyncio.create_task(self._produce(queue, chunk, datetime.now()))
+        logger.info(f"Playing scenario {self.scenario.name} (seed {self.scenario.seed}, {self.scenario.duration:.0f}s)")
+        start = time.perf_counter()
+        try:
+            while self.running:
+                frame = await queue.get()
+                if frame is None:
+                    break
+                tick, phase_index, messages = frame
+                delay = start + tick * tick_seconds - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    self.max_lag = max(self.max_lag, -delay)
+                self.phase_name = self.scenario.phases[phase_index]["name"]
+                if messages:
+                    for text in self._frame_text(messages):
+                        await self.server.broadcast_text(text)
+                self.events_sent += len(messages)
+                self.ticks_sent += 1
+        finally:
+            self.running = False
+            producer.cancel()
+            logger.info(f"Scenario {self.scenario.name} finished: {self.events_sent} events, "
+                        f"max lag {self.max_lag * 1000:.1f} ms")
+
+    def stop(self):
+        self.running = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "scenario": self.scenario.name,
+            "seed": self.scenario.seed,
+            "phase": self.phase_name,
+            "running": self.running,
+            "events_sent": self.events_sent,
+            "ticks_sent": self.ticks_sent,
+            "max_lag_ms": round(self.max_lag * 1000, 2)
+        }
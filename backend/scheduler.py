@@ -0,0 +1,178 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from packets import PacketRecord
+
+# Lanes from most to least urgent
+LANES = ("high", "elevated", "normal")
+# Once a lane's oldest packet has waited this long, the lane is guaranteed one of every LANE_SHARE packets served
+LANE_MAX_WAIT = (0.0, 1.0, 2.0)
+LANE_SHARE = (1, 4, 8)
+
+# Pre-score weights: the monitored app's own assessment, an attack token in the payload head,
+# a source with a recent threat verdict, and a source on a blocklist
+HINT_SCORE = 50
+PREFILTER_SCORE = 30
+FLOW_SCORE = 25
+REPUTATION_SCORE = 20
+# Lowest score for each lane above normal
+LANE_SCORES = (50, 20)
+
+# Only this much of a payload is searched for prefilter tokens
+PREFILTER_CHARS = 1024
+# Lowercase literals cut from the agents' rules; a hit only raises priority, detection still runs every rule
+PREFILTER_TOKENS = (
+    "<script", "javascript:", "onerror", "onload", "<iframe", "alert(", "document.cookie", "eval(",
+    "' or", "'or", "union select", "drop table", "delete from", "1=1", "waitfor delay", "benchmark(", "sleep(",
+    "../", "/etc/passwd", "/etc/shadow", "cmd.exe", "powershell", "/bin/sh", "bash -i", "nc -e", "wget http",
+    "curl http", "base64 -d", "python -c", "system(", "exec("
+)
+
+# Sources with a threat verdict in this long keep their later packets prioritized
+FLOW_TTL_SECONDS = 300
+MAX_TRACKED_FLOWS = 50000
+# Queue waits kept per lane for percentiles
+WAIT_SAMPLES = 1000
+
+def prefilter(payload: str) -> bool:
+    """Whether the head of a payload contains any attack token"""
+    if not payload:
+        return False
+    head = payload[:PREFILTER_CHARS].lower()
+    return any(token in head for token in PREFILTER_TOKENS)
+
+class PacketScheduler:
+    """Packet queue for analysis that serves likely attacks first"""
+
+    def __init__(self, maxsize: int, on_evict: Optional[Callable[[PacketRecord], None]] = None):
+        self.maxsize = maxsize
+        self.on_evict = on_evict
+        # Set once the reputation DB exists: encoded address -> listing or None
+        self.reputation: Optional[Callable[[Any], Optional[Dict[str, Any]]]] = None
+        self.lanes: List[Deque[Tuple[float, PacketRecord]]] = [deque() for _ in LANES]
+        self.flows: "OrderedDict[Any, float]" = OrderedDict()
+        self.size = 0
+        self.enqueued = [0] * len(LANES)
+        self.served = [0] * len(LANES)
+        self.aged = [0] * len(LANES)
+        self.since_served = [0] * len(LANES)
+        self.evicted = 0
+        self.waits: List[Deque[float]] = [deque(maxlen=WAIT_SAMPLES) for _ in LANES]
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+
+    def mark_flow(self, src_ip: Any, now: Optional[float] = None):
+        """Prioritize a source's packets for a while after it produced a threat verdict"""
+        now = now if now is not None else time.monotonic()
+        self.flows[src_ip] = now + FLOW_TTL_SECONDS
+        self.flows.move_to_end(src_ip)
+        while len(self.flows) > MAX_TRACKED_FLOWS:
+            self.flows.popitem(last=False)
+
+    def score(self, packet: PacketRecord, now: float) -> int:
+        score = 0
+        if packet.threat_hint:
+            score += HINT_SCORE
+        if prefilter(packet.payload):
+            score += PREFILTER_SCORE
+        expires = self.flows.get(packet.src_ip)
+        if expires is not None:
+            if expires > now:
+                score += FLOW_SCORE
+            else:
+                del self.flows[packet.src_ip]
+        if self.reputation and self.reputation(packet.src_ip):
+            score += REPUTATION_SCORE
+        return score
+
+    def lane_for(self, score: int) -> int:
+        for lane, minimum in enumerate(LANE_SCORES):
+            if score >= minimum:
+                return lane
+        return len(LANES) - 1
+
+    def put_nowait(self, packet: PacketRecord):
+        now = time.monotonic()
+        lane = self.lane_for(self.score(packet, now))
+        if self.size >= self.maxsize:
+            victim = next((i for i in range(len(LANES) - 1, lane, -1) if self.lanes[i]), None)
+            if victim is None:
+                raise asyncio.QueueFull
+            _, evicted = self.lanes[victim].pop()
+            self.size -= 1
+            self.evicted += 1
+            if self.on_evict:
+                self.on_evict(evicted)
+        self.lanes[lane].append((now, packet))
+        self.enqueued[lane] += 1
+        self.size += 1
+        self._not_empty.set()
+        if self.size >= self.maxsize:
+            self._not_full.clear()
+
+    async def put(self, packet: PacketRecord):
+        while True:
+            try:
+                return self.put_nowait(packet)
+            except asyncio.QueueFull:
+                self._not_full.clear()
+                await self._not_full.wait()
+
+    def _pick(self, now: float) -> int:
+        """Lane to serve next: a starved lane that is owed its share, else the most urgent non-empty one"""
+        urgent = next(lane for lane in range(len(LANES)) if self.lanes[lane])
+        for lane in range(len(LANES) - 1, urgent, -1):
+            queued = self.lanes[lane]
+            if (queued and self.since_served[lane] >= LANE_SHARE[lane] - 1
+                    and now - queued[0][0] > LANE_MAX_WAIT[lane]):
+                self.aged[lane] += 1
+                return lane
+        return urgent
+
+    def get_nowait(self) -> PacketRecord:
+        if not self.size:
+            raise asyncio.QueueEmpty
+        now = time.monotonic()
+        lane = self._pick(now)
+        enqueued_at, packet = self.lanes[lane].popleft()
+        self.size -= 1
+        self.served[lane] += 1
+        for other in range(len(LANES)):
+            self.since_served[other] = 0 if other == lane else self.since_served[other] + 1
+        self.waits[lane].append(now - enqueued_at)
+        if not self.size:
+            self._not_empty.clear()
+        self._not_full.set()
+        return packet
+
+    async def get(self) -> PacketRecord:
+        while not self.size:
+            await self._not_empty.wait()
+        return self.get_nowait()
+
+    def empty(self) -> bool:
+        return not self.size
+
+    def full(self) -> bool:
+        return self.size >= self.maxsize
+
+    def qsize(self) -> int:
+        return self.size
+
+    def stats(self) -> Dict[str, Any]:
+        lanes = {}
+        for i, name in enumerate(LANES):
+            waits = sorted(self.waits[i])
+            lanes[name] = {
+                "depth": len(self.lanes[i]),
+                "enqueued": self.enqueued[i],
+                "served": self.served[i],
+                "served_aged": self.aged[i],
+                "wait_p50_ms": round(waits[len(waits) // 2] * 1000, 2) if waits else None,
+                "wait_p95_ms": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 2) if waits else None
+            }
+        return {"depth": self.size, "capacity": self.maxsize, "evicted": self.evicted,
+                "tracked_flows": len(self.flows), "lanes": lanes}
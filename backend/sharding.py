@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple, Union
+
+from packets import PacketRecord
+
+logger = logging.getLogger(__name__)
+
+# Number of detection worker processes. 0 keeps detection on the main event loop.
+DETECTION_SHARDS = int(os.getenv("NETSENTINEL_DETECTION_SHARDS", "0"))
+SHARD_BATCH_SIZE = 64
+# Batches waiting to be written to one worker's pipe; past this, new batches for that worker are dropped
+MAX_PENDING_BATCHES = 64
+# How often each worker reports its rule profile counters to the parent
+PROFILE_REPORT_INTERVAL = 5.0
+
+def shard_for(src_ip: Union[int, str, None], shard_count: int) -> int:
+    """Map a source IP to a shard so all packets from one source land on the same worker"""
+    if isinstance(src_ip, int):
+        return zlib.crc32(src_ip.to_bytes(17, "big")) % shard_count
+    return zlib.crc32(str(src_ip).encode()) % shard_count
+
+def _shard_worker(shard_id: int, conn):
+    """Worker process entry point: analyze packet batches and send verdicts back"""
+    # Imported here so the parent process does not need the agents loaded to route packets
+    import agents
+    from agents import RULE_SETS, ThreatAnalyzer
+    from reputation import RELOAD_INTERVAL
+
+    # Shards exist for throughput, so skip the demo inference delay
+    agents.SIMULATE_LATENCY = False
+
+    loop = asyncio.new_event_loop()
+    analyzer = ThreatAnalyzer()
+    reputation = analyzer.reputation_agent.db
+    reputation.reload()
+    next_reload_check = time.monotonic() + RELOAD_INTERVAL
+    next_profile_report = time.monotonic() + PROFILE_REPORT_INTERVAL
+
+    async def analyze_batch(batch: List[PacketRecord]):
+        """(packet, verdict) pairs, and the ids of packets whose analysis raised"""
+        results = await asyncio.gather(*(analyzer.analyze(p) for p in batch), return_exceptions=True)
+        verdicts, failed = [], []
+        for packet, result in zip(batch, results):
+            if isinstance(result, Exception):
+                logger.error(f"Shard {shard_id} failed to analyze packet {packet.id}: {result}")
+                failed.append(packet.id)
+            else:
+                verdicts.append((packet, result))
+        return verdicts, failed
+
+    while True:
+        try:
+            batch = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if batch is None:
+            break
+        try:
+            # Each worker holds its own copy of the lists
+            if time.monotonic() >= next_reload_check:
+                reputation.reload_if_changed()
+                next_reload_check = time.monotonic() + RELOAD_INTERVAL
+            verdicts, failed = loop.run_until_complete(analyze_batch(batch))
+            conn.send(verdicts)
+            if failed:
+                # Sent as a tuple so the parent can count them as dropped
+                conn.send(("failed", failed))
+            if time.monotonic() >= next_profile_report:
+                # Sent as a dict so the reader can tell it apart from a list of verdicts
+                conn.send({name: rules.counters() for name, rules in RULE_SETS.items()})
+                next_profile_report = time.monotonic() + PROFILE_REPORT_INTERVAL
+        except Exception as e:
+            logger.error(f"Shard {shard_id} failed to analyze batch: {e}")
+            try:
+                conn.send(("failed", [packet.id for packet in batch]))
+            except OSError:
+                break
+
+    loop.close()
+    conn.close()
+
+class DetectionShardPool:
+    """Partitions packets by source IP across detection worker processes"""
+
+    def __init__(self, shard_count: int, on_drop: Optional[Callable[[int], None]] = None):
+        self.shard_count = shard_count
+        self.on_drop = on_drop
+        self.processes = []
+        self.connections = []
+        self.pending = [0] * shard_count
+        self.dropped = 0
+        # Latest rule profile counters reported by each worker
+        self.rule_profiles: Dict[int, Dict[str, Any]] = {}
+        # One reader thread per shard so a slow worker never blocks the others
+        self._executor = ThreadPoolExecutor(max_workers=shard_count, thread_name_prefix="shard-reader")
+        # And one sender thread per shard: Connection.send blocks once a worker's pipe buffer is full
+        self._senders = [ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"shard-sender-{shard_id}")
+                         for shard_id in range(shard_count)]
+
+    def start(self):
+        """Spawn the worker processes, each connected over its own Unix socket pair"""
+        ctx = multiprocessing.get_context("spawn")
+        for shard_id in range(self.shard_count):
+            parent_conn, child_conn = ctx.Pipe(duplex=True)
+            process = ctx.Process(
+                target=_shard_worker,
+                args=(shard_id, child_conn),
+                name=f"detection-shard-{shard_id}",
+                daemon=True
+            )
+            process.start()
+            child_conn.close()
+            self.processes.append(process)
+            self.connections.append(parent_conn)
+        logger.info(f"Started {self.shard_count} detection shards")
+
+    def submit(self, packets: List[PacketRecord]):
+        """Route a batch of packets to their shards without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        batches: Dict[int, List[PacketRecord]] = {}
+        for packet in packets:
+            shard_id = shard_for(packet.src_ip, self.shard_count)
+            batches.setdefault(shard_id, []).append(packet)
+
+        for shard_id, batch in batches.items():
+            if self.pending[shard_id] >= MAX_PENDING_BATCHES:
+                logger.warning(f"Detection shard {shard_id} is backed up, dropping {len(batch)} packets")
+                self._drop(len(batch))
+                continue
+            self.pending[shard_id] += 1
+            sent = loop.run_in_executor(self._senders[shard_id], self.connections[shard_id].send, batch)
+            sent.add_done_callback(partial(self._sent, shard_id, len(batch)))
+
+    def _sent(self, shard_id: int, count: int, sent: asyncio.Future):
+        self.pending[shard_id] -= 1
+        if sent.cancelled() or sent.exception() is not None:
+            logger.error(f"Failed to send {count} packets to detection shard {shard_id}: "
+                         f"{None if sent.cancelled() else sent.exception()}")
+            self._drop(count)
+
+    def _drop(self, count: int):
+        self.dropped += count
+        if self.on_drop:
+            self.on_drop(count)
+
+    async def verdicts(self, shard_id: int) -> AsyncIterator[Tuple[PacketRecord, Dict[str, Any]]]:
+        """Yield (packet, verdict) pairs as a shard finishes them"""
+        loop = asyncio.get_running_loop()
+        conn = self.connections[shard_id]
+
+        while True:
+            try:
+                results = await loop.run_in_executor(self._executor, conn.recv)
+            except (EOFError, OSError):
+                logger.warning(f"Detection shard {shard_id} closed its connection")
+                return
+            if isinstance(results, dict):
+                self.rule_profiles[shard_id] = results
+                continue
+            if isinstance(results, tuple):
+                _, failed = results
+                logger.warning(f"Detection shard {shard_id} dropped {len(failed)} packets: {', '.join(map(str, failed[:10]))}"
+                               f"{' ...' if len(failed) > 10 else ''}")
+                self._drop(len(failed))
+                continue
+            for packet, verdict in results:
+                yield packet, verdict
+
+    def stop(self):
+        """Ask workers to exit and wait briefly for them"""
+        for conn in self.connections:
+            try:
+                conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self.processes:
+            process.join(timeout=2)
+            if process.is_alive():
+                process.terminate()
+        for conn in self.connections:
+            conn.close()
+        self._executor.shutdown(wait=False)
+        for sender in self._senders:
+            sender.shutdown(wait=False)
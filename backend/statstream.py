@@ -0,0 +1,94 @@
+import json
+import time
+from typing import Any, Dict, Optional
+
+# Refresh rates a client may ask for, in seconds
+MIN_REFRESH = 0.25
+MAX_REFRESH = 60.0
+DEFAULT_REFRESH = 2.0
+# Every client gets a full frame at least this often, so a dropped delta can't leave it stale for long
+KEYFRAME_INTERVAL = 30.0
+
+class ClientStats:
+    """What one client has been sent and when it is next due"""
+
+    __slots__ = ("interval", "version", "next_due", "next_keyframe")
+
+    def __init__(self, interval: float = DEFAULT_REFRESH):
+        self.interval = interval
+        self.version = 0
+        self.next_due = 0.0
+        self.next_keyframe = 0.0
+
+class StatsStream:
+    """Stats published as per-field versions so each client gets only what changed since its last frame"""
+
+    def __init__(self, keyframe_interval: float = KEYFRAME_INTERVAL):
+        self.keyframe_interval = keyframe_interval
+        self.version = 0
+        self.values: Dict[str, Any] = {}
+        self.changed: Dict[str, int] = {}
+        self.clients: Dict[Any, ClientStats] = {}
+        self._frames: Dict[int, Optional[str]] = {}
+        self.frames_sent = 0
+        self.keyframes_sent = 0
+
+    def update(self, values: Dict[str, Any]) -> bool:
+        """Fold in the latest values; returns whether anything changed"""
+        changed = [field for field, value in values.items() if self.values.get(field, self) != value]
+        if not changed:
+            return False
+        self.version += 1
+        for field in changed:
+            self.values[field] = values[field]
+            self.changed[field] = self.version
+        self._frames = {}
+        return True
+
+    def subscribe(self, client: Any, interval: float = DEFAULT_REFRESH) -> float:
+        """Register a client or change its refresh rate; returns the clamped interval"""
+        interval = min(MAX_REFRESH, max(MIN_REFRESH, interval))
+        state = self.clients.get(client)
+        if state is None:
+            self.clients[client] = ClientStats(interval)
+        else:
+            state.interval = interval
+            state.next_due = min(state.next_due, time.monotonic() + interval)
+        return interval
+
+    def unsubscribe(self, client: Any):
+        self.clients.pop(client, None)
+
+    def _frame(self, base: int) -> Optional[str]:
+        """Serialized delta from `base` to now (a keyframe when base is 0), or None if nothing changed"""
+        if base in self._frames:
+            return self._frames[base]
+        if base >= self.version:
+            frame = None
+        elif base == 0:
+            frame = json.dumps({"type": "network_stats", "keyframe": True, "version": self.version,
+                                "data": self.values}, default=str)
+        else:
+            frame = json.dumps({"type": "network_stats_delta", "base": base, "version": self.version,
+                                "data": {field: self.values[field] for field, version in self.changed.items()
+                                         if version > base}}, default=str)
+        self._frames[base] = frame
+        return frame
+
+    def due(self, now: Optional[float] = None):
+        """Yield (client, frame) for every client whose refresh interval has elapsed and has something new"""
+        now = now if now is not None else time.monotonic()
+        for client, state in list(self.clients.items()):
+            if state.next_due > now:
+                continue
+            state.next_due = now + state.interval
+            keyframe = now >= state.next_keyframe
+            frame = self._frame(0 if keyframe else state.version)
+            if frame is None:
+                continue
+            if keyframe:
+                state.next_keyframe = now + self.keyframe_interval
+                self.keyframes_sent += 1
+            state.version = self.version
+            self.frames_sent += 1
+            yield client, frame
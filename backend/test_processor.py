@@ -0,0 +1,39 @@
+import asyncio
+import os
+
+os.environ["NETSENTINEL_SIMULATE_LATENCY"] = "0"
+
+import main
+from anomaly import AnomalyAgent
+from packets import PacketRecord
+
+def test_threat_processor_scores_queued_packets_as_one_batch(monkeypatch):
+    batches = []
+    published = []
+    score_batch = AnomalyAgent.score_batch
+
+    def recording_score_batch(self, packets):
+        batches.append(len(packets))
+        return score_batch(self, packets)
+
+    async def record_verdict(packet, agent_statuses, verdict):
+        published.append(packet.id)
+
+    monkeypatch.setattr(AnomalyAgent, "score_batch", recording_score_batch)
+    monkeypatch.setattr(main, "publish_verdict", record_verdict)
+    monkeypatch.setattr(main, "PROCESSOR_PACING", 0)
+
+    async def run():
+        for i in range(20):
+            main.manager.packet_queue.put_nowait(
+                PacketRecord(f"batch-{i}", "198.51.100.7", "10.0.0.5", 40000 + i, 80, "HTTP", "GET /index.html"))
+        processor = asyncio.create_task(main.threat_processor())
+        for _ in range(500):
+            if len(published) == 20:
+                break
+            await asyncio.sleep(0.01)
+        processor.cancel()
+
+    asyncio.run(run())
+    assert published == [f"batch-{i}" for i in range(20)]
+    assert max(batches) > 1
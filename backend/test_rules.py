@@ -0,0 +1,130 @@
+import asyncio
+import os
+import random
+import re
+import time
+
+os.environ["NETSENTINEL_SIMULATE_LATENCY"] = "0"
+
+from agents import RULE_SETS, SQLInjectionAgent, ThreatSynthesizer, XSSAgent
+from packets import PacketRecord
+from rules import DEFAULT_SPAN, SCAN_WINDOW, Rule, RuleSet
+
+# Fragments of every rule plus the characters gaps care about, so random strings often come close to matching
+TOKENS = [
+    "<script", "<script>", "</script>", ">", "<img", "<svg", "<body", "<iframe", "onerror", "onload", "onclick",
+    "on", "x", "=", "(", "alert", "eval", "javascript:", "document.cookie",
+    "SELECT", "select", "FROM", "WHERE", "*", "users", "UNION", "COUNT(*)", "'", "OR", "1", ";", "--", "admin",
+    "EXEC", "DROP", "TABLE", "DELETE", "SLEEP", "WAITFOR", "DELAY",
+    "curl", "http", "|", "sh", "wget", "../", "/etc/passwd", "system", "exec", "nc", "-e", "<%",
+    " ", " ", " ", "\n", "\n", "\t", "\r", "a", "b", "_", "é"
+]
+
+# Narrow alphabets for the multi-stage rules, which the mixed tokens rarely complete
+FAMILIES = [
+    ["SELECT", "FROM", "WHERE", " ", " ", "\n", "\n", "\t", "x", "*"],
+    ["<script", "<script>", ">", "</script>", " ", "\n", "x"],
+    ["<img", "<svg", "<body", "<iframe", "onerror", "onload", "=", ">", " ", "\n", "x"],
+    ["curl", "http", "|", "sh", " ", "\n", "x"],
+    ["on", "o", "n", "x", "=", " ", "\n", "-"],
+]
+
+# Texts where newlines, repeated stages or a long word decide the match
+EDGE_CASES = [
+    "<b>hi</b><script>x=1<script\n>document.write(1)</script>",
+    "SELECT *\nFROM users\n\nWHERE id=1",
+    "SELECT name\n  FROM users\n  \n  WHERE 1",
+    "SELECT a FROM b\nFROM c WHERE d",
+    "SELECT \nFROM t WHERE",
+    "curl http x\ncurl\nhttp | sh",
+    "o" + "n" + "a" * 40 + " =",
+]
+
+def original(rule: Rule, text: str) -> bool:
+    return re.search(rule.name, text, re.IGNORECASE) is not None
+
+def fuzz(seed: int, count: int, length: int):
+    rng = random.Random(seed)
+    for i in range(count):
+        tokens = TOKENS if i % 2 else FAMILIES[i // 2 % len(FAMILIES)]
+        yield "".join(rng.choice(tokens) for _ in range(rng.randint(0, length)))
+
+def small_windows(rule_set: RuleSet) -> RuleSet:
+    """The same rules with a short span and window, so matches straddle windows"""
+    rules = [Rule(rule.name, [stage.pattern for stage in rule.stages],
+                  [barrier.pattern if barrier else None for barrier in rule.barriers],
+                  rule.lead.pattern if rule.lead else None, span=48)
+             for rule in rule_set.rules]
+    return RuleSet(rules, window=16, sample_every=0)
+
+def test_matches_agree_with_re_search():
+    texts = EDGE_CASES + list(fuzz(1, 20000, 24))
+    for rule_set in RULE_SETS.values():
+        windowed = small_windows(rule_set)
+        for text in texts:
+            for rule, small in zip(rule_set.rules, windowed.rules):
+                expected = original(rule, text)
+                assert (rule_set.match_rule(rule, text)[0] is not None) == expected, (rule.name, text)
+                assert (windowed.match_rule(small, text)[0] is not None) == expected, (rule.name, text)
+
+def test_first_match_names_the_first_original_match():
+    for rule_set in RULE_SETS.values():
+        for text in EDGE_CASES + list(fuzz(2, 5000, 24)):
+            expected = next((rule for rule in rule_set.rules if original(rule, text)), None)
+            assert rule_set.first_match(text)[0] is expected, text
+
+def test_stream_scan_agrees_with_original_expressions():
+    rng = random.Random(3)
+    for rule_set in RULE_SETS.values():
+        for text in EDGE_CASES + list(fuzz(4, 2000, 60)):
+            data = text.encode("utf-8")
+            scan = rule_set.stream()
+            cut = 0
+            while cut < len(data):
+                step = rng.randint(1, 40)
+                scan.feed(data[cut:cut + step])
+                cut += step
+            index, _, truncated = scan.close()
+            assert not truncated
+            assert (index is not None) == any(original(rule, text) for rule in rule_set.rules), text
+
+def test_long_runs_straddling_a_scan_window_are_matched():
+    # Runs longer than a span, placed so they cross the first window boundary at full size
+    runs = [" " * (DEFAULT_SPAN + 40), "\n" + " " * (DEFAULT_SPAN + 40), "x" * (DEFAULT_SPAN + 40),
+            "on" + "x" * (DEFAULT_SPAN + 40)]
+    rng = random.Random(5)
+    unbudgeted = {name: RuleSet(rule_set.rules, budget=60, payload_budget=60, sample_every=0)
+                  for name, rule_set in RULE_SETS.items()}
+    for body in fuzz(6, 1500, 10):
+        at = rng.randint(0, len(body))
+        body = body[:at] + rng.choice(runs) + body[at:]
+        text = "." * (SCAN_WINDOW - rng.randint(0, len(body))) + body
+        for rule_set in unbudgeted.values():
+            for rule in rule_set.rules:
+                found, cut = rule_set.match_rule(rule, text)
+                assert not cut
+                assert (found is not None) == original(rule, text), (rule.name, body)
+
+def test_known_attacks_are_detected():
+    assert XSSAgent.XSS_RULES.first_match(EDGE_CASES[0])[0] is not None
+    for text in EDGE_CASES[1:3]:
+        assert SQLInjectionAgent.SQL_RULES.first_match(text)[0] is not None
+
+def test_truncated_scan_is_reported_but_not_a_threat():
+    packet = PacketRecord("pad", "198.51.100.7", "10.0.0.5", 40000, 80, "TCP", "a" * (300 * 1024) + "' OR 1=1 --")
+    result = asyncio.run(SQLInjectionAgent().analyze(packet))
+    assert result["scan_truncated"]
+    assert not result["threat_detected"]
+    synthesis = asyncio.run(ThreatSynthesizer().synthesize([result]))
+    assert not synthesis["is_threat"]
+    assert synthesis["scan_truncated"] == result["scan_truncated"]
+
+def test_crafted_payloads_scan_in_linear_time():
+    for text in ("on" * 100000, "<img " * 40000, "SELECT " * 30000 + "\n", "<script>" * 25000 + "\n",
+                 "SELECT a FROM b\n" * 12000, "curl http " * 20000 + "\n", "onx" + " " * 200000 + "x",
+                 "' OR 1 = " * 20000):
+        for rule_set in RULE_SETS.values():
+            unbudgeted = RuleSet(rule_set.rules, budget=60, payload_budget=60, sample_every=0)
+            started = time.perf_counter()
+            unbudgeted.first_match(text)
+            assert time.perf_counter() - started < 2.0, (text[:20], len(text))
@@ -1,4 +1,5 @@
 #!/usr/bin/env python3
+import argparse
 import asyncio
 import websockets
 import json
@@ -7,7 +8,7 @@ import time
 from datetime import datetime
 import string
 import base64
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Tuple
 
 class TrafficSimulator:
     def __init__(self, ws_url: str = "ws://localhost:8765"):
@@ -370,11 +371,315 @@ class TrafficSimulator:
                 print(f"Unexpected error: {e}")
                 await asyncio.sleep(5)
 
+class LatencyHistogram:
+    """HDR-style log-linear histogram of microsecond latencies (~1% relative precision)"""
+    
+    SUB_BUCKET_BITS = 7
+    
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.total = 0
+        self.max_value = 0
+    
+    def _index(self, value: int) -> int:
+        if value < (1 << self.SUB_BUCKET_BITS):
+            return value
+        shift = value.bit_length() - self.SUB_BUCKET_BITS
+        return (shift << self.SUB_BUCKET_BITS) + (value >> shift)
+    
+    def _value(self, index: int) -> int:
+        shift = index >> self.SUB_BUCKET_BITS
+        return (index & ((1 << self.SUB_BUCKET_BITS) - 1)) << shift
+    
+    def record(self, seconds: float):
+        value = max(0, int(seconds * 1_000_000))
+        index = self._index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.total += 1
+        self.max_value = max(self.max_value, value)
+    
+    def merge(self, other: "LatencyHistogram"):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += other.total
+        self.max_value = max(self.max_value, other.max_value)
+    
+    def percentile(self, pct: float) -> float:
+        """Latency in milliseconds at the given percentile"""
+        if not self.total:
+            return 0.0
+        threshold = pct / 100 * self.total
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= threshold:
+                return self._value(index) / 1000
+        return self.max_value / 1000
+    
+    def summary(self) -> str:
+        return (f"p50={self.percentile(50):.1f}ms p90={self.percentile(90):.1f}ms "
+                f"p99={self.percentile(99):.1f}ms p99.9={self.percentile(99.9):.1f}ms "
+                f"max={self.max_value / 1000:.1f}ms n={self.total}")
+
+class LoadGenerator:
+    """Open-loop, rate-controlled load against a websocket sink or the dummy_site endpoints"""
+    
+    DEFAULT_MIX = {"normal": 50, "sql_injection": 20, "xss": 20, "malware": 10}
+    
+    def __init__(self, target: str = "http", ws_url: str = "ws://localhost:8765",
+                 http_url: str = "http://localhost:8080", monitor_url: str = "ws://localhost:8000/ws",
+                 connections: int = 10, mix: Dict[str, int] = None, report_interval: float = 5.0,
+                 max_in_flight: int = 10000, verdict_timeout: float = 30.0):
+        self.target = target
+        self.ws_url = ws_url
+        self.http_url = http_url
+        self.monitor_url = monitor_url
+        self.connections = connections
+        self.mix = mix or dict(self.DEFAULT_MIX)
+        self.report_interval = report_interval
+        self.max_in_flight = max_in_flight
+        self.verdict_timeout = verdict_timeout
+        self.simulator = TrafficSimulator(ws_url)
+        
+        self.sockets: List[Any] = []
+        self.http_client = None
+        self.pending: Dict[str, Tuple[float, str]] = {}
+        self.in_flight = 0
+        self.sent = 0
+        self.errors = 0
+        self.dropped = 0
+        self.lost = 0
+        self.send_histogram = LatencyHistogram()
+        self.verdict_histograms: Dict[str, LatencyHistogram] = {}
+        self._interval_send = LatencyHistogram()
+        self._interval_verdict = LatencyHistogram()
+        self._sequence = 0
+        self.running = False
+    
+    def _next_id(self) -> str:
+        self._sequence += 1
+        return f"lg_{id(self):x}_{self._sequence}"
+    
+    def _http_request(self, kind: str) -> Tuple[str, str, Dict[str, str]]:
+        """Map a traffic class to a dummy_site request"""
+        if kind == "sql_injection":
+            payload = self.simulator.generate_sql_injection_attack()["payload"]
+            if random.random() < 0.5:
+                return "POST", "/login", {"username": payload, "password": "x"}
+            return "GET", "/search", {"q": payload}
+        if kind == "xss":
+            payload = self.simulator.generate_xss_attack()["payload"]
+            return "POST", "/comment", {"name": "guest", "comment": payload}
+        if kind == "malware":
+            return "GET", "/view", {"file": random.choice(["../../etc/passwd", "../../../etc/shadow",
+                                                             "..\\..\\windows\\system32\\config\\sam"])}
+        return random.choice([
+            ("GET", "/search", {"q": random.choice(["products", "laptop", "shoes"])}),
+            ("GET", "/view", {"file": "readme.txt"}),
+            ("POST", "/comment", {"name": "alice", "comment": "Great product!"}),
+            ("POST", "/login", {"username": "john", "password": "secure123"}),
+        ])
+    
+    def _ws_packet(self, kind: str) -> Dict[str, Any]:
+        generators = {
+            "sql_injection": self.simulator.generate_sql_injection_attack,
+            "xss": self.simulator.generate_xss_attack,
+            "malware": self.simulator.generate_malware_payload,
+            "port_scan": lambda: self.simulator.generate_port_scan()[0],
+            "ddos": lambda: self.simulator.generate_ddos_pattern()[0],
+        }
+        return generators.get(kind, self.simulator.generate_normal_traffic)()
+    
+    async def _send(self, kind: str, scheduled: float):
+        loop = asyncio.get_running_loop()
+        request_id = self._next_id()
+        try:
+            if self.target == "http":
+                method, path, params = self._http_request(kind)
+                self.pending[request_id] = (scheduled, kind)
+                headers = {"X-Request-ID": request_id}
+                if method == "GET":
+                    response = await self.http_client.get(path, params=params, headers=headers)
+                else:
+                    response = await self.http_client.post(path, data=params, headers=headers)
+                if response.status_code >= 500:
+                    self.errors += 1
+            else:
+                packet = self._ws_packet(kind)
+                websocket = self.sockets[self.sent % len(self.sockets)]
+                await websocket.send(json.dumps({"type": "packet", "data": packet}))
+            elapsed = loop.time() - scheduled
+            self.send_histogram.record(elapsed)
+            self._interval_send.record(elapsed)
+            self.sent += 1
+        except Exception:
+            self.errors += 1
+            self.pending.pop(request_id, None)
+        finally:
+            self.in_flight -= 1
+    
+    async def _monitor_verdicts(self):
+        """Match agent verdicts on the backend websocket to the requests that caused them"""
+        loop = asyncio.get_running_loop()
+        while self.running:
+            try:
+                async with websockets.connect(self.monitor_url, max_size=None) as websocket:
+                    async for raw in websocket:
+                        message = json.loads(raw)
+                        if message.get("type") != "agent_analysis_complete":
+                            continue
+                        entry = self.pending.pop(message["data"].get("packet_id"), None)
+                        if entry is None:
+                            continue
+                        scheduled, kind = entry
+                        elapsed = loop.time() - scheduled
+                        self.verdict_histograms.setdefault(kind, LatencyHistogram()).record(elapsed)
+                        self._interval_verdict.record(elapsed)
+            except Exception as e:
+                print(f"Verdict monitor disconnected: {e}")
+                await asyncio.sleep(1)
+    
+    def _expire_pending(self):
+        cutoff = asyncio.get_running_loop().time() - self.verdict_timeout
+        expired = [rid for rid, (scheduled, _) in self.pending.items() if scheduled < cutoff]
+        for rid in expired:
+            del self.pending[rid]
+        self.lost += len(expired)
+    
+    async def _reporter(self, rate: float):
+        last_sent = self.sent
+        while self.running:
+            await asyncio.sleep(self.report_interval)
+            self._expire_pending()
+            achieved = (self.sent - last_sent) / self.report_interval
+            last_sent = self.sent
+            line = (f"[{datetime.now().strftime('%H:%M:%S')}] target={rate:.0f}/s achieved={achieved:.0f}/s "
+                    f"in_flight={self.in_flight} errors={self.errors} dropped={self.dropped} "
+                    f"send[{self._interval_send.summary()}]")
+            if self.target == "http":
+                line += f" verdict[{self._interval_verdict.summary()}] lost={self.lost}"
+            print(line)
+            self._interval_send = LatencyHistogram()
+            self._interval_verdict = LatencyHistogram()
+    
+    async def run_phase(self, rate: float, duration: float):
+        """Send at `rate` packets/s for `duration` seconds on an open-loop schedule"""
+        loop = asyncio.get_running_loop()
+        kinds = list(self.mix)
+        weights = [self.mix[k] for k in kinds]
+        interval = 1.0 / rate
+        start = loop.time()
+        count = 0
+        
+        reporter = asyncio.create_task(self._reporter(rate))
+        try:
+            while loop.time() - start < duration:
+                scheduled = start + count * interval
+                delay = scheduled - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                elif count % 100 == 0:
+                    await asyncio.sleep(0)
+                count += 1
+                if self.in_flight >= self.max_in_flight:
+                    self.dropped += 1
+                    continue
+                self.in_flight += 1
+                asyncio.create_task(self._send(random.choices(kinds, weights=weights)[0], scheduled))
+        finally:
+            reporter.cancel()
+    
+    async def run(self, rates: List[float], duration: float):
+        """Step through each target rate and print a summary table to locate the knee"""
+        self.running = True
+        monitor = None
+        if self.target == "http":
+            import httpx
+            limits = httpx.Limits(max_connections=self.connections, max_keepalive_connections=self.connections)
+            self.http_client = httpx.AsyncClient(base_url=self.http_url, limits=limits, timeout=30.0)
+            monitor = asyncio.create_task(self._monitor_verdicts())
+        else:
+            self.sockets = [await websockets.connect(self.ws_url) for _ in range(self.connections)]
+        
+        rows = []
+        try:
+            for rate in rates:
+                self.send_histogram = LatencyHistogram()
+                self.verdict_histograms = {}
+                sent_before, errors_before = self.sent, self.errors
+                await self.run_phase(rate, duration)
+                await asyncio.sleep(min(self.verdict_timeout, 2.0))
+                verdicts = LatencyHistogram()
+                for histogram in self.verdict_histograms.values():
+                    verdicts.merge(histogram)
+                rows.append((rate, (self.sent - sent_before) / duration, self.errors - errors_before,
+                             self.send_histogram, verdicts))
+        finally:
+            self.running = False
+            if monitor:
+                monitor.cancel()
+            if self.http_client:
+                await self.http_client.aclose()
+            for websocket in self.sockets:
+                await websocket.close()
+        
+        print("\n  target/s  achieved/s  errors  send p50/p99 (ms)   verdict p50/p99 (ms)")
+        for rate, achieved, errors, sends, verdicts in rows:
+            print(f"  {rate:8.0f}  {achieved:10.0f}  {errors:6d}  {sends.percentile(50):8.1f}/{sends.percentile(99):<8.1f}"
+                  f"  {verdicts.percentile(50):9.1f}/{verdicts.percentile(99):<9.1f}")
+
+def parse_mix(spec: str) -> Dict[str, int]:
+    """Parse a traffic mix such as "normal=70,sql_injection=15,xss=15" """
+    mix = {}
+    for part in spec.split(","):
+        kind, _, weight = part.partition("=")
+        mix[kind.strip()] = int(weight or 1)
+    return mix
+
 async def main():
     simulator = TrafficSimulator("ws://localhost:8765")
     await simulator.connect_and_run()
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="NetSentinel traffic simulator")
+    parser.add_argument("--load", action="store_true",
+                        help="Run the open-loop load generator instead of the demo simulation")
+    parser.add_argument("--target", choices=["http", "ws"], default="http",
+                        help="Drive dummy_site over HTTP or send packets to a websocket sink")
+    parser.add_argument("--rate", default="100",
+                        help="Target packets/s; a comma-separated list steps through each rate")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds per rate step")
+    parser.add_argument("--connections", type=int, default=10)
+    parser.add_argument("--mix", default=None, help="Traffic mix, e.g. normal=70,sql_injection=15,xss=15")
+    parser.add_argument("--ws-url", default="ws://localhost:8765")
+    parser.add_argument("--http-url", default="http://localhost:8080")
+    parser.add_argument("--monitor-url", default="ws://localhost:8000/ws",
+                        help="Backend websocket used to time verdicts in http mode")
+    parser.add_argument("--report-interval", type=float, default=5.0)
+    return parser.parse_args()
+
+async def run_load(args):
+    generator = LoadGenerator(
+        target=args.target,
+        ws_url=args.ws_url,
+        http_url=args.http_url,
+        monitor_url=args.monitor_url,
+        connections=args.connections,
+        mix=parse_mix(args.mix) if args.mix else None,
+        report_interval=args.report_interval
+    )
+    rates = [float(rate) for rate in args.rate.split(",")]
+    await generator.run(rates, args.duration)
+
 if __name__ == "__main__":
+    args = parse_args()
+    if args.load:
+        try:
+            asyncio.run(run_load(args))
+        except KeyboardInterrupt:
+            print("\nLoad test stopped.")
+        raise SystemExit(0)
+    
     print("""
     ╔══════════════════════════════════════════╗
     ║     NetSentinel Traffic Simulator        ║
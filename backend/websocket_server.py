@@ -1,12 +1,15 @@
 #!/usr/bin/env python3
+import argparse
 import asyncio
 import websockets
 import json
 import random
 from datetime import datetime
-from typing import Set, Dict, Any
+from typing import Set, Dict, Any, Optional
 import logging
 
+from scenarios import Scenario, ScenarioEngine, available_scenarios
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -15,6 +18,8 @@ class WebSocketServer:
         self.clients: Set[websockets.WebSocketServerProtocol] = set()
         self.packet_id = 0
         self.is_simulating = False
+        self.scenario: Optional[ScenarioEngine] = None
+        self.scenario_task: Optional[asyncio.Task] = None
         
     async def register(self, websocket):
         """Register a new client"""
@@ -29,20 +34,23 @@ class WebSocketServer:
     async def broadcast(self, message: Dict[str, Any]):
         """Broadcast message to all connected clients"""
         if self.clients:
-            message_str = json.dumps(message)
-            disconnected = set()
+            await self.broadcast_text(json.dumps(message))
             
-            for client in self.clients:
-                try:
-                    await client.send(message_str)
-                except websockets.exceptions.ConnectionClosed:
-                    disconnected.add(client)
-                except Exception as e:
-                    logger.error(f"Error broadcasting to client: {e}")
-                    disconnected.add(client)
-            
-            # Remove disconnected clients
-            self.clients -= disconnected
+    async def broadcast_text(self, message_str: str):
+        """Broadcast an already serialized message to all connected clients"""
+        disconnected = set()
+        
+        for client in self.clients:
+            try:
+                await client.send(message_str)
+            except websockets.exceptions.ConnectionClosed:
+                disconnected.add(client)
+            except Exception as e:
+                logger.error(f"Error broadcasting to client: {e}")
+                disconnected.add(client)
+        
+        # Remove disconnected clients
+        self.clients -= disconnected
             
     async def handle_client(self, websocket, path):
         """Handle client connection"""
@@ -74,6 +82,31 @@ class WebSocketServer:
             elif action == "trigger_attack":
                 attack_type = data.get("attack_type")
                 await self.trigger_specific_attack(attack_type)
+            elif action == "start_scenario":
+                self.start_scenario(data.get("scenario", "demo"), data.get("seed"), data.get("batch", True))
+            elif action == "stop_scenario":
+                self.stop_scenario()
+            elif action == "scenario_status":
+                await websocket.send(json.dumps({
+                    "type": "scenario_status",
+                    "data": {
+                        "available": available_scenarios(),
+                        "current": self.scenario.stats() if self.scenario else None
+                    }
+                }))
+    
+    def start_scenario(self, name: str, seed: Optional[int] = None, batch: bool = True):
+        """Play a scenario file, replacing any scenario already running"""
+        self.stop_scenario()
+        self.scenario = ScenarioEngine(self, Scenario.load(name, seed), batch=batch)
+        self.scenario_task = asyncio.create_task(self.scenario.run())
+        
+    def stop_scenario(self):
+        if self.scenario:
+            self.scenario.stop()
+        if self.scenario_task:
+            self.scenario_task.cancel()
+            self.scenario_task = None
                 
     async def trigger_specific_attack(self, attack_type: str):
         """Trigger a specific attack type"""
@@ -103,7 +136,7 @@ class WebSocketServer:
                 await self.broadcast(packet)
                 await asyncio.sleep(0.2)
                 
-    def generate_normal_traffic(self) -> Dict[str, Any]:
+    def generate_normal_traffic(self, rng: random.Random = random) -> Dict[str, Any]:
         """Generate normal traffic packet"""
         self.packet_id += 1
         return {
@@ -111,18 +144,18 @@ class WebSocketServer:
             "data": {
                 "id": self.packet_id,
                 "timestamp": datetime.now().isoformat(),
-                "source": f"192.168.1.{random.randint(1, 254)}",
-                "destination": f"10.0.0.{random.randint(1, 254)}",
-                "protocol": random.choice(["HTTP", "HTTPS", "TCP"]),
-                "port": random.choice([80, 443, 8080]),
-                "size": random.randint(64, 1500),
+                "source": f"192.168.1.{rng.randint(1, 254)}",
+                "destination": f"10.0.0.{rng.randint(1, 254)}",
+                "protocol": rng.choice(["HTTP", "HTTPS", "TCP"]),
+                "port": rng.choice([80, 443, 8080]),
+                "size": rng.randint(64, 1500),
                 "threat_level": 0,
                 "status": "normal",
                 "payload": f"GET /api/data HTTP/1.1"
             }
         }
         
-    def generate_sql_injection(self) -> Dict[str, Any]:
+    def generate_sql_injection(self, rng: random.Random = random) -> Dict[str, Any]:
         """Generate SQL injection attack packet"""
         self.packet_id += 1
         payloads = [
@@ -136,20 +169,20 @@ class WebSocketServer:
             "data": {
                 "id": self.packet_id,
                 "timestamp": datetime.now().isoformat(),
-                "source": f"45.142.{random.randint(100, 200)}.{random.randint(1, 254)}",
+                "source": f"45.142.{rng.randint(100, 200)}.{rng.randint(1, 254)}",
                 "destination": "10.0.0.1",
                 "protocol": "HTTP",
                 "port": 80,
-                "size": random.randint(200, 500),
-                "threat_level": random.randint(7, 10),
+                "size": rng.randint(200, 500),
+                "threat_level": rng.randint(7, 10),
                 "status": "malicious",
                 "attack_type": "SQL Injection",
-                "payload": random.choice(payloads),
+                "payload": rng.choice(payloads),
                 "agent_detected": "sql_injection"
             }
         }
         
-    def generate_xss_attack(self) -> Dict[str, Any]:
+    def generate_xss_attack(self, rng: random.Random = random) -> Dict[str, Any]:
         """Generate XSS attack packet"""
         self.packet_id += 1
         payloads = [
@@ -163,20 +196,20 @@ class WebSocketServer:
             "data": {
                 "id": self.packet_id,
                 "timestamp": datetime.now().isoformat(),
-                "source": f"87.120.{random.randint(1, 254)}.{random.randint(1, 254)}",
+                "source": f"87.120.{rng.randint(1, 254)}.{rng.randint(1, 254)}",
                 "destination": "10.0.0.1",
                 "protocol": "HTTP",
                 "port": 80,
-                "size": random.randint(150, 400),
-                "threat_level": random.randint(6, 9),
+                "size": rng.randint(150, 400),
+                "threat_level": rng.randint(6, 9),
                 "status": "malicious",
                 "attack_type": "XSS",
-                "payload": random.choice(payloads),
+                "payload": rng.choice(payloads),
                 "agent_detected": "xss"
             }
         }
         
-    def generate_ddos_packet(self) -> Dict[str, Any]:
+    def generate_ddos_packet(self, rng: random.Random = random) -> Dict[str, Any]:
         """Generate DDoS attack packet"""
         self.packet_id += 1
         return {
@@ -184,7 +217,7 @@ class WebSocketServer:
             "data": {
                 "id": self.packet_id,
                 "timestamp": datetime.now().isoformat(),
-                "source": f"192.168.{random.randint(1, 254)}.{random.randint(1, 254)}",
+                "source": f"192.168.{rng.randint(1, 254)}.{rng.randint(1, 254)}",
                 "destination": "10.0.0.1",
                 "protocol": "TCP",
                 "port": 80,
@@ -220,7 +253,7 @@ class WebSocketServer:
                 
             await asyncio.sleep(random.uniform(0.5, 2.0))
 
-async def main():
+async def main(scenario: Optional[str] = None, seed: Optional[int] = None, batch: bool = True):
     server = WebSocketServer()
     
     # Start WebSocket server on port 8000
@@ -229,10 +262,19 @@ async def main():
         logger.info("WebSocket server started on ws://localhost:8000")
         logger.info("Waiting for connections...")
         
+        if scenario:
+            server.start_scenario(scenario, seed, batch)
+        
         # Run auto-simulation in background
         await server.auto_simulate()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="NetSentinel WebSocket traffic and threat stream")
+    parser.add_argument("--scenario", help="Scenario name from ./scenarios or a path to a timeline file")
+    parser.add_argument("--seed", type=int, help="Override the scenario's RNG seed")
+    parser.add_argument("--no-batch", action="store_true", help="Send one message per event instead of one batch per tick")
+    args = parser.parse_args()
+    
     print("""
     ╔══════════════════════════════════════════╗
     ║     NetSentinel WebSocket Server         ║
@@ -246,6 +288,6 @@ if __name__ == "__main__":
     """)
     
     try:
-        asyncio.run(main())
+        asyncio.run(main(args.scenario, args.seed, not args.no_batch))
     except KeyboardInterrupt:
         print("\nServer stopped.")
\ No newline at end of file
@@ -45,6 +45,22 @@ export function AgentAnalysis() {
         color: "orange",
         icon: "📦",
       },
+      {
+        name: "Anomaly Agent",
+        status: "idle",
+        finding: "Waiting for packets...",
+        confidence: 0,
+        color: "green",
+        icon: "📈",
+      },
+      {
+        name: "Reputation Agent",
+        status: "idle",
+        finding: "Waiting for packets...",
+        confidence: 0,
+        color: "red",
+        icon: "🚫",
+      },
     ]);
     
     // Connect to WebSocket
@@ -22,6 +22,10 @@ export function WebSocketProvider({ children }: { children: ReactNode }) {
   const [lastMessage, setLastMessage] = useState<any>(null);
   const reconnectTimeoutRef = useRef<NodeJS.Timeout>();
   const wsRef = useRef<WebSocket | null>(null);
+  // Last broadcast seq seen, so a reconnect only receives the events it missed
+  const lastSeqRef = useRef<number | null>(null);
+  // Server run the seq belongs to; after a backend restart the server answers with a snapshot
+  const epochRef = useRef<string | null>(null);
 
   const connect = () => {
     if (wsRef.current?.readyState === WebSocket.OPEN) {
@@ -29,7 +33,10 @@ export function WebSocketProvider({ children }: { children: ReactNode }) {
     }
 
     try {
-      const websocket = new WebSocket('ws://localhost:8000/ws');
+      const since = lastSeqRef.current !== null && epochRef.current !== null
+        ? `?since=${lastSeqRef.current}&epoch=${epochRef.current}`
+        : '';
+      const websocket = new WebSocket(`ws://localhost:8000/ws${since}`);
       wsRef.current = websocket;
 
       websocket.onopen = () => {
@@ -46,6 +53,10 @@ export function WebSocketProvider({ children }: { children: ReactNode }) {
       websocket.onmessage = (event) => {
         try {
           const data = JSON.parse(event.data);
+          if (typeof data.seq === 'number' && typeof data.epoch === 'string') {
+            lastSeqRef.current = data.seq;
+            epochRef.current = data.epoch;
+          }
           setLastMessage(data);
         } catch (error) {
           console.error('Error parsing WebSocket message:', error);